@@ -1,12 +1,18 @@
 # apps/bookings/admin.py
-from datetime import timedelta
+from decimal import Decimal
+
 from django.utils import timezone
 from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
+from django.db import transaction
+from apps.common import pricing
+from . import events
 from .models import Booking, BookingExtension
 
 PARTNER_GROUP = "Partners"
 REVEAL_STATUSES = ("confirmed", "issued", "completed", "paid")
+# брони, которые приносят деньги и попадают в отчёты
+MONEY_STATUSES = ("confirmed", "issued", "completed")
 
 
 def is_partner_admin(request) -> bool:
@@ -24,58 +30,52 @@ class BookingExtensionInline(admin.TabularInline):
     readonly_fields = ("created_at",)
 
 
-def _calc_total_sum(booking: Booking) -> float:
+def _calc_total_sum(booking: Booking) -> Decimal:
     """
     Пересчитать «теоретическую» стоимость аренды за весь период,
-    по нашему правилу будни/выходные.
+    по нашему правилу будни/выходные (apps.common.pricing).
+    Если сумма уже зафиксирована при подтверждении — берём её.
     Если вдруг нет машины или нет цен — вернём booking.price_quote как fallback.
     """
+    if booking.total_amount is not None:
+        return booking.total_amount
+
     car = getattr(booking, "car", None)
     if not car:
-        return float(booking.price_quote or 0)
-
-    price_wd = car.price_weekday or 0
-    price_we = car.price_weekend or 0
+        return Decimal(booking.price_quote or 0)
 
     start = booking.date_from
     end   = booking.date_to
     if not start or not end or end <= start:
-        return float(booking.price_quote or 0)
-
-    total = 0
-    cur = start
-    while cur < end:
-        # Сутки считаем по дате cur (локально по часовому поясу Ташкент,
-        # в админке просто по weekday()).
-        # weekday(): 0=Mon ... 5=Sat 6=Sun
-        if cur.weekday() in (5, 6):  # суббота/воскресенье
-            total += float(price_we)
-        else:
-            total += float(price_wd)
-        cur += timedelta(days=1)
+        return Decimal(booking.price_quote or 0)
 
-    return round(total, 2)
+    return pricing.quote(start, end, car.price_weekday, car.price_weekend)
 
 
-def _calc_commission(booking: Booking) -> float:
+def _calc_commission(booking: Booking, total: Decimal | None = None) -> Decimal:
     """
     Комиссия агрегатора = total_sum * (partner.commission_percent / 100)
     """
+    if booking.commission_amount is not None:
+        return booking.commission_amount
+
     partner = getattr(booking, "partner", None)
     if not partner:
-        return 0.0
-    pct = float(getattr(partner, "commission_percent", 0) or 0)
-    total = _calc_total_sum(booking)
-    return round(total * pct / 100.0, 2)
+        return Decimal("0")
+    if total is None:
+        total = _calc_total_sum(booking)
+    return pricing.commission(total, getattr(partner, "commission_percent", 0))
 
 
-def _calc_partner_net(booking: Booking) -> float:
+def _calc_partner_net(booking: Booking, total: Decimal | None = None) -> Decimal:
     """
     Сколько остаётся партнёру после комиссии.
     """
-    total = _calc_total_sum(booking)
-    fee   = _calc_commission(booking)
-    return round(total - fee, 2)
+    if booking.partner_net is not None:
+        return booking.partner_net
+    if total is None:
+        total = _calc_total_sum(booking)
+    return total - _calc_commission(booking, total)
 
 
 @admin.action(description="Отметить как оплачено (ручная проверка)")
@@ -95,7 +95,9 @@ def mark_as_paid(modeladmin, request, queryset):
         booking.status = "paid"
 
         booking.updated_at = timezone.now()
-        booking.save(update_fields=["payment_marker", "status", "updated_at"])
+        with transaction.atomic():
+            booking.save(update_fields=["payment_marker", "status", "updated_at"])
+            events.record_change(booking)
         updated += 1
 
     messages.success(request, f"Отмечено как оплачено: {updated} броней.")
@@ -230,6 +232,17 @@ class BookingAdmin(admin.ModelAdmin):
             ro.extend(["client", "client_phone"])
         return ro
 
+    def save_model(self, request, obj, form, change):
+        # подтверждённые вручную брони тоже получают финансовую разбивку
+        if obj.status in MONEY_STATUSES and obj.total_amount is None and obj.car_id and obj.partner_id:
+            obj.apply_pricing()
+        super().save_model(request, obj, form, change)
+        # админка сама оборачивает сохранение в транзакцию — событие попадёт в неё же
+        if change:
+            events.record_change(obj)
+        else:
+            events.record_event(obj, events.KIND_CREATED)
+
     def get_queryset(self, request):
         qs = super().get_queryset(request).select_related("car", "car__partner", "partner", "client")
         if is_partner_admin(request):
@@ -1,25 +1,36 @@
 # apps/bookings/api.py
-from datetime import timedelta
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
 
 from rest_framework import serializers, viewsets, status, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.db.models import Exists, OuterRef, Q
 from django.utils.translation import gettext_lazy as _
 
+from apps.common import pricing
 from apps.common.permissions import BotOnlyPermission
 from apps.common.overlaps import qs_overlaps, fresh_pending
 
+from . import events
+from .expiry import HOLD_MINUTES
 from .models import Booking
 from apps.cars.models import Car, CarCalendar
 from apps.partners.models import PartnerUser
 from apps.users.models import BotUser
 
-from apps.common.choices import BookingStatus, PaymentMarker
+from apps.common.choices import BookingStatus
 
-HOLD_MINUTES = 20  # TTL ожидания подтверждения
+
+# Лента /bookings/changes/
+CHANGES_MAX_LIMIT = 500
+CHANGES_LAG_SECONDS = 2
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
 
 
 # ---------- helpers ----------
@@ -28,18 +39,60 @@ def estimate_quote(car: Car, start, end) -> Decimal:
     Считает сумму аренды от start (включительно) до end (исключая end).
     Будни -> price_weekday, СБ/ВС -> price_weekend (если пусто — берём weekday).
     """
-    total = Decimal("0")
-    cur = start
-    pw = car.price_weekday or Decimal("0")
-    we = car.price_weekend or pw
-    while cur.date() < end.date():
-        total += we if cur.weekday() >= 5 else pw
-        cur += timedelta(days=1)
-    return total
+    return pricing.quote(start, end, car.price_weekday, car.price_weekend)
+
+
+def encode_cursor(ts, pk: int) -> str:
+    """Курсор ленты изменений: '<микросекунды от эпохи>-<id>' (безопасен для URL)."""
+    us = (ts - _EPOCH) // timezone.timedelta(microseconds=1)
+    return f"{us}-{pk}"
+
+
+def decode_cursor(cursor: str):
+    us, pk = cursor.split("-", 1)
+    return _EPOCH + timezone.timedelta(microseconds=int(us)), int(pk)
 
 
 # ---------- Serializers ----------
 
+class SlotConflict(APIException):
+    """409: машина занята или удерживается на эти даты (в т.ч. проигравшему в гонке параллельных броней)."""
+    status_code = 409
+    default_detail = _("Автомобиль занят на выбранные даты.")
+    default_code = "slot_conflict"
+
+
+def lock_car_with_conflicts(car_id, start, end, *, exclude_booking_id=None, with_holds=True) -> Car:
+    """
+    Одним запросом: SELECT ... FOR UPDATE строки машины и флаги пересечений
+    (EXISTS-подзапросы) — busy (CarCalendar), confirmed_overlap (confirmed/issued),
+    held (свежие pending, если with_holds).
+
+    Лок строки Car держится до конца транзакции и сериализует создание и
+    подтверждение броней по этой машине: второй параллельный запрос ждёт
+    и видит уже вставленную бронь. Вызывать внутри transaction.atomic().
+    """
+    bookings = Booking.objects.filter(car=OuterRef("pk"))
+    if exclude_booking_id:
+        bookings = bookings.exclude(pk=exclude_booking_id)
+    flags = {
+        "busy": Exists(qs_overlaps(CarCalendar.objects.filter(car=OuterRef("pk")), start, end)),
+        "confirmed_overlap": Exists(qs_overlaps(
+            bookings.filter(status__in=(BookingStatus.CONFIRMED, BookingStatus.ISSUED)), start, end,
+        )),
+    }
+    if with_holds:
+        flags["held"] = Exists(fresh_pending(
+            qs_overlaps(bookings.filter(status=BookingStatus.PENDING), start, end), minutes=HOLD_MINUTES,
+        ))
+    return (
+        Car.objects.select_related("partner")
+        .select_for_update(of=("self",))
+        .annotate(**flags)
+        .get(pk=car_id)
+    )
+
+
 class BookingCreateSerializer(serializers.ModelSerializer):
     car_id = serializers.IntegerField(write_only=True)
     client_tg_user_id = serializers.IntegerField(write_only=True)
@@ -67,7 +120,7 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated):
-        car = Car.objects.select_related("partner").get(pk=validated.pop("car_id"))
+        car_id = validated.pop("car_id")
         tg_id = validated.pop("client_tg_user_id")
 
         # не создаём клиента автоматически
@@ -85,21 +138,21 @@ class BookingCreateSerializer(serializers.ModelSerializer):
 
         start, end = validated["date_from"], validated["date_to"]
 
-        # проверки занятости
-        if qs_overlaps(CarCalendar.objects.filter(car=car), start, end).exists():
-            raise serializers.ValidationError(_("Автомобиль занят на выбранные даты."))
-        if qs_overlaps(Booking.objects.filter(car=car, status__in=("confirmed", "issued")), start, end).exists():
-            raise serializers.ValidationError(_("На эти даты уже есть подтверждённая бронь."))
-        fresh = fresh_pending(qs_overlaps(Booking.objects.filter(car=car, status="pending"), start, end),
-                              minutes=HOLD_MINUTES)
-        if fresh.exists():
-            raise serializers.ValidationError(_("Слот временно удерживается другим запросом, попробуйте позже."))
+        # лок машины + проверки занятости одним запросом; INSERT — под тем же локом
+        with transaction.atomic():
+            car = lock_car_with_conflicts(car_id, start, end)
+            if car.busy:
+                raise SlotConflict(_("Автомобиль занят на выбранные даты."))
+            if car.confirmed_overlap:
+                raise SlotConflict(_("На эти даты уже есть подтверждённая бронь."))
+            if car.held:
+                raise SlotConflict(_("Слот временно удерживается другим запросом, попробуйте позже."))
 
-        # если quote не передали — считаем сами
-        if validated.get("price_quote") in (None, ""):
-            validated["price_quote"] = estimate_quote(car, start, end)
+            # если quote не передали — считаем сами
+            if validated.get("price_quote") in (None, ""):
+                validated["price_quote"] = estimate_quote(car, start, end)
 
-        return Booking.objects.create(car=car, partner=car.partner, client=client, **validated)
+            return Booking.objects.create(car=car, partner=car.partner, client=client, **validated)
 
 
 class BookingSerializer(serializers.ModelSerializer):
@@ -108,7 +161,10 @@ class BookingSerializer(serializers.ModelSerializer):
     partner_phone = serializers.CharField(source="partner.phone", read_only=True)
     partner_address = serializers.CharField(source="partner.address", read_only=True)
     client_tg_user_id = serializers.IntegerField(source="client.tg_user_id", read_only=True)
+    client_language = serializers.CharField(source="client.language", read_only=True)
     client_selfie_url = serializers.SerializerMethodField()
+    client_selfie_rel = serializers.SerializerMethodField()
+    client_selfie_file_id = serializers.CharField(source="client.selfie_partner_file_id", read_only=True)
 
     # раскрываем для оплат/подсказок
     car_region = serializers.SerializerMethodField()
@@ -141,12 +197,13 @@ class BookingSerializer(serializers.ModelSerializer):
             "id",
             "car", "car_title", "car_class", "car_region", "car_color", "car_plate_number",
             "partner", "partner_name", "partner_phone", "partner_address",
-            "client", "client_tg_user_id", "client_first_name",
+            "client", "client_tg_user_id", "client_language", "client_first_name",
             "client_last_name", "client_username",
             "client_phone", "date_from", "date_to",
             "price_quote", "status", "payment_marker",
             "price_weekday", "price_weekend", "advance_amount",
-            "created_at", "updated_at", "client_selfie_url", "client_birth_date",
+            "created_at", "updated_at", "client_selfie_url", "client_selfie_rel", "client_selfie_file_id",
+            "client_birth_date",
             "client_drive_exp", "client_age_years",
         )
 
@@ -196,6 +253,11 @@ class BookingSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(url)
         return url
 
+    def get_client_selfie_rel(self, obj):
+        # путь относительно MEDIA_ROOT — партнёрский бот читает файл с диска
+        selfie = getattr(getattr(obj, "client", None), "selfie_image", None)
+        return selfie.name if selfie else None
+
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -229,45 +291,11 @@ class BookingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     def get_serializer_class(self):
         return BookingCreateSerializer if self.action == "create" else BookingSerializer
 
-    def _cleanup_expired_confirmed_unpaid(self):
-        """
-        Лениво отменяем подтверждённые, но не оплаченные брони,
-        старше HOLD_MINUTES, и освобождаем CarCalendar.
-        """
-        now = timezone.now()
-        cutoff = now - timezone.timedelta(minutes=HOLD_MINUTES)
-
-        stale = (
-            Booking.objects
-            .filter(
-                status=BookingStatus.CONFIRMED,
-                updated_at__lt=cutoff,
-            )
-            .exclude(payment_marker=PaymentMarker.PAID)
-        )
-
-        if not stale.exists():
-            return
-
-        for b in stale.select_related("car"):
-            CarCalendar.objects.filter(
-                car=b.car,
-                date_from=b.date_from,
-                date_to=b.date_to,
-            ).delete()
-
-        stale.update(status=BookingStatus.CANCELED, updated_at=now)
-
-    def get_queryset(self):
-        # сначала прибираемся
-        self._cleanup_expired_confirmed_unpaid()
-
-        qs = super().get_queryset()
+    def _filter_owner(self, qs):
+        """Фильтры по партнёру/клиенту из query params."""
         p_tg = self.request.query_params.get("partner_tg_user_id")
         p_username = self.request.query_params.get("partner_username")
         c_tg = self.request.query_params.get("client_tg_user_id")
-        status_q = self.request.query_params.get("status")
-        fresh_minutes = int(self.request.query_params.get("fresh_minutes", 0) or 0)
 
         if p_tg:
             qs = qs.filter(partner__users__tg_user_id=p_tg, partner__users__is_active=True)
@@ -275,6 +303,13 @@ class BookingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             qs = qs.filter(partner__users__username__iexact=p_username, partner__users__is_active=True)
         if c_tg:
             qs = qs.filter(client__tg_user_id=c_tg)
+        return qs
+
+    def get_queryset(self):
+        qs = self._filter_owner(super().get_queryset())
+        status_q = self.request.query_params.get("status")
+        fresh_minutes = int(self.request.query_params.get("fresh_minutes", 0) or 0)
+
         if status_q:
             qs = qs.filter(status=status_q)
         if fresh_minutes > 0 and status_q == BookingStatus.PENDING:
@@ -285,7 +320,9 @@ class BookingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     def create(self, request, *args, **kwargs):
         ser = self.get_serializer(data=request.data)
         ser.is_valid(raise_exception=True)
-        booking = ser.save()
+        with transaction.atomic():
+            booking = ser.save()
+            events.record_event(booking, events.KIND_CREATED)
         return Response(
             BookingSerializer(booking, context=self.get_serializer_context()).data,
             status=status.HTTP_201_CREATED,
@@ -314,20 +351,26 @@ class BookingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             return Response({"detail": _("Бронь не в статусе ожидания.")}, status=400)
         if booking.created_at < timezone.now() - timezone.timedelta(minutes=HOLD_MINUTES):
             booking.status = "expired"; booking.save(update_fields=["status", "updated_at"])
+            events.record_change(booking)
             return Response({"detail": _("Истекло время ожидания подтверждения.")}, status=409)
 
         start, end = booking.date_from, booking.date_to
-        if qs_overlaps(CarCalendar.objects.filter(car=booking.car), start, end).exists():
+        car = lock_car_with_conflicts(booking.car_id, start, end, exclude_booking_id=booking.pk, with_holds=False)
+        if car.busy:
             return Response({"detail": _("Авто уже занято на эти даты.")}, status=409)
-        if qs_overlaps(
-            Booking.objects.filter(car=booking.car, status__in=("confirmed", "issued")).exclude(pk=booking.pk),
-            start, end
-        ).exists():
+        if car.confirmed_overlap:
             return Response({"detail": _("Есть другая подтверждённая бронь в этот период.")}, status=409)
 
-        CarCalendar.objects.create(car=booking.car, date_from=start, date_to=end, status="busy")
-        booking.status = "confirmed"
-        booking.save(update_fields=["status", "updated_at"])
+        try:
+            # в range-режиме двойное бронирование отсекает EXCLUDE-ограничение БД
+            with transaction.atomic():
+                CarCalendar.objects.create(car=booking.car, booking=booking, date_from=start, date_to=end, status="busy")
+                booking.status = "confirmed"
+                pricing_fields = booking.apply_pricing()
+                booking.save(update_fields=["status", *pricing_fields, "updated_at"])
+                events.record_change(booking)
+        except IntegrityError:
+            return Response({"detail": _("Авто уже занято на эти даты.")}, status=409)
         return Response(BookingSerializer(booking, context=self.get_serializer_context()).data)
 
     @action(detail=True, methods=["post"])
@@ -347,8 +390,10 @@ class BookingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         if booking.status != "pending":
             return Response({"detail": _("Бронь уже обработана.")}, status=400)
 
-        booking.status = "rejected"
-        booking.save(update_fields=["status", "updated_at"])
+        with transaction.atomic():
+            booking.status = "rejected"
+            booking.save(update_fields=["status", "updated_at"])
+            events.record_change(booking)
         ser = BookingSerializer(
             booking,
             context={**self.get_serializer_context(), "redact_client": True},
@@ -364,30 +409,100 @@ class BookingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
 
         def _free_slot():
             # удаляем блокировку дат, созданную на confirm
-            CarCalendar.objects.filter(
-                car=booking.car,
-                date_from=booking.date_from,
-                date_to=booking.date_to,
-                status="busy",
-            ).delete()
+            CarCalendar.objects.filter(booking=booking).delete()
 
         # pending -> всегда можно отменить (календарь ещё не трогали)
         if booking.status == "pending":
-            booking.status = "canceled"
-            booking.save(update_fields=["status", "updated_at"])
+            with transaction.atomic():
+                booking.status = "canceled"
+                booking.save(update_fields=["status", "updated_at"])
+                events.record_change(booking)
             return Response(BookingSerializer(booking, context=self.get_serializer_context()).data)
 
         # confirmed & не оплачено & вышел TTL -> отменяем + освобождаем слот
         if booking.status == "confirmed" and (booking.payment_marker or "").lower() != "paid":
             age = timezone.now() - booking.updated_at  # момент confirm-а
             if age.total_seconds() >= HOLD_MINUTES * 60:
-                _free_slot()
-                booking.status = "canceled"
-                booking.save(update_fields=["status", "updated_at"])
+                with transaction.atomic():
+                    _free_slot()
+                    booking.status = "canceled"
+                    booking.save(update_fields=["status", "updated_at"])
+                    events.record_change(booking)
                 return Response(BookingSerializer(booking, context=self.get_serializer_context()).data)
 
         return Response({"detail": _("Отмена невозможна: бронь уже обработана.")}, status=400)
 
+    @action(detail=False, methods=["post"], url_path="bulk-status")
+    def bulk_status(self, request):
+        """
+        Статусы броней сразу для пачки клиентов (диспетчер уведомлений клиент-бота).
+        body: {"client_tg_user_ids": [..]}
+        Просроченные заявки отменяет `manage.py expire_bookings` (apps/bookings/expiry.py).
+        """
+        ser = BulkStatusSerializer(data=request.data); ser.is_valid(raise_exception=True)
+        tg_ids = ser.validated_data["client_tg_user_ids"]
+
+        qs = (
+            Booking.objects.select_related("car", "car__region", "car__color", "partner", "client")
+            .filter(client__tg_user_id__in=tg_ids)
+            .order_by("created_at")
+        )
+        return Response(BookingSerializer(qs, many=True, context=self.get_serializer_context()).data)
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """
+        Лента изменений: брони, у которых updated_at (а значит status/payment_marker)
+        сменился после курсора. Порядок и курсор — (updated_at, id), монотонно.
+
+        ?since=<cursor>  — продолжить с курсора; без since — вернуть только курсор
+                           «с текущего момента»; since=0 — с самого начала.
+        ?limit=N         — размер страницы (по умолчанию 100, максимум CHANGES_MAX_LIMIT).
+        + фильтры partner_tg_user_id / partner_username / client_tg_user_id.
+
+        Ответ: {"results": [...], "cursor": "...", "has_more": bool}.
+        Отдаём только строки старше CHANGES_LAG_SECONDS, чтобы не потерять
+        изменения из транзакций, которые ещё не закоммичены.
+        """
+        try:
+            limit = min(max(int(request.query_params.get("limit", 100)), 1), CHANGES_MAX_LIMIT)
+        except ValueError:
+            limit = 100
+        upper = timezone.now() - timezone.timedelta(seconds=CHANGES_LAG_SECONDS)
+        since = request.query_params.get("since")
+        if not since:
+            return Response({"results": [], "cursor": encode_cursor(upper, 0), "has_more": False})
+
+        qs = self._filter_owner(
+            Booking.objects.select_related("car", "car__region", "car__color", "partner", "client")
+        ).filter(updated_at__lt=upper)
+        if since != "0":
+            try:
+                ts, last_id = decode_cursor(since)
+            except ValueError:
+                return Response({"detail": "bad cursor"}, status=400)
+            qs = qs.filter(Q(updated_at__gt=ts) | Q(updated_at=ts, id__gt=last_id))
+
+        rows = list(qs.order_by("updated_at", "id")[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = encode_cursor(rows[-1].updated_at, rows[-1].id) if rows else since
+
+        ctx = self.get_serializer_context()
+        if self._is_partner_request(request):
+            ctx["redact_client"] = True
+        return Response({
+            "results": BookingSerializer(rows, many=True, context=ctx).data,
+            "cursor": cursor,
+            "has_more": has_more,
+        })
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    client_tg_user_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=1000,
+    )
+
 
 class PartnerActionSerializer(serializers.Serializer):
     partner_tg_user_id = serializers.IntegerField(required=False)
@@ -397,3 +512,98 @@ class PartnerActionSerializer(serializers.Serializer):
         if not attrs.get("partner_tg_user_id") and not attrs.get("partner_username"):
             raise serializers.ValidationError(_("Нужно передать partner_tg_user_id или partner_username"))
         return attrs
+
+
+# ---------- События (long-poll) ----------
+
+# держит воркер и соединение БД на всё ожидание — о размере пула см. settings.EVENTS_LONGPOLL_TIMEOUT
+EVENTS_MAX_TIMEOUT = settings.EVENTS_LONGPOLL_TIMEOUT
+EVENTS_MAX_LIMIT = 200
+
+
+def serialize_events(items, context, *, redact_client=False) -> list[dict]:
+    """События + текущее состояние брони + кому из партнёров оно адресовано (пачкой, без N+1)."""
+    bookings = Booking.objects.select_related(
+        "car", "car__region", "car__color", "partner", "client"
+    ).in_bulk({e.booking_id for e in items})
+
+    partner_users: dict[int, tuple[list, list]] = {}
+    for pid, tg_id, username in PartnerUser.objects.filter(
+        partner_id__in={b.partner_id for b in bookings.values()}, is_active=True,
+    ).values_list("partner_id", "tg_user_id", "username"):
+        ids, names = partner_users.setdefault(pid, ([], []))
+        if tg_id:
+            ids.append(tg_id)
+        if username:
+            names.append(username.lower())
+
+    ctx = {**context, "redact_client": redact_client}
+    data = []
+    for e in items:
+        booking = bookings.get(e.booking_id)
+        if booking is None:
+            continue
+        ids, names = partner_users.get(booking.partner_id, ([], []))
+        data.append({
+            "id": e.id,
+            "kind": e.kind,
+            "status": e.status,
+            "payment_marker": e.payment_marker,
+            "created_at": e.created_at,
+            "booking": BookingSerializer(booking, context=ctx).data,
+            "partner_user_tg_ids": ids,
+            "partner_usernames": names,
+        })
+    return data
+
+
+class EventConsumeView(APIView):
+    """
+    GET /api/events/consume/?consumer=<name>&timeout=25&limit=100[&audience=partner]
+
+    События после подтверждённого смещения потребителя. Long-poll: отвечает сразу,
+    если события есть, иначе держит запрос до timeout секунд (PostgreSQL — LISTEN/NOTIFY).
+    audience=partner — скрываем данные клиента, как в списке для партнёра.
+    Смещение не сдвигается, пока потребитель не вызовет /events/ack/ —
+    необработанные из-за падения бота события придут снова.
+    """
+    permission_classes = (BotOnlyPermission,)
+
+    def get(self, request):
+        name = (request.query_params.get("consumer") or "").strip()
+        if not name:
+            return Response({"detail": "consumer is required"}, status=400)
+        try:
+            timeout = min(max(float(request.query_params.get("timeout", EVENTS_MAX_TIMEOUT)), 0), EVENTS_MAX_TIMEOUT)
+            limit = min(max(int(request.query_params.get("limit", 100)), 1), EVENTS_MAX_LIMIT)
+        except ValueError:
+            return Response({"detail": "bad parameters"}, status=400)
+
+        offset = events.get_consumer(name).offset
+        found = events.wait_for_events(offset, timeout, limit)
+        return Response({
+            "events": serialize_events(
+                found,
+                {"request": request},
+                redact_client=request.query_params.get("audience") == "partner",
+            ),
+            "cursor": found[-1].id if found else offset,
+        })
+
+
+class EventAckSerializer(serializers.Serializer):
+    consumer = serializers.CharField(max_length=64)
+    cursor = serializers.IntegerField(min_value=0)
+
+
+class EventAckView(APIView):
+    """
+    POST /api/events/ack/ {"consumer": "<name>", "cursor": <id>}
+    Подтвердить обработку всех событий с id <= cursor.
+    """
+    permission_classes = (BotOnlyPermission,)
+
+    def post(self, request):
+        ser = EventAckSerializer(data=request.data); ser.is_valid(raise_exception=True)
+        offset = events.ack(ser.validated_data["consumer"], ser.validated_data["cursor"])
+        return Response({"consumer": ser.validated_data["consumer"], "offset": offset})
@@ -0,0 +1,163 @@
+# apps/bookings/events.py
+"""
+События по броням для ботов (transactional outbox в таблице BookingEvent).
+
+Событие пишется явно в той же транзакции, что и изменение брони
+(confirm/reject/cancel, вебхуки оплаты, авто-отмены) — либо есть и то и другое,
+либо ничего. На PostgreSQL вставка событий сериализуется advisory-локом,
+поэтому порядок id совпадает с порядком коммитов и курсор «id > offset»
+ничего не пропускает. Вместе с записью шлётся NOTIFY: он доставляется только
+после COMMIT, и long-poll просыпается сразу. На других БД (SQLite в тестах)
+ожидание — короткий опрос таблицы.
+
+Потребители (боты) читают события через /api/events/consume/ и подтверждают
+обработанное через /api/events/ack/ — смещение хранится в EventConsumer,
+поэтому после рестарта бота события не теряются и не приходят повторно.
+"""
+import select
+import time
+
+from django.db import connections, transaction
+
+from .models import Booking, BookingEvent, EventConsumer
+
+CHANNEL = "booking_events"
+
+KIND_CREATED = "created"
+KIND_STATUS = "status"
+KIND_PAYMENT = "payment"
+
+POLL_INTERVAL = 0.5
+
+# ключ pg_advisory_xact_lock для вставки событий
+_OUTBOX_LOCK_KEY = 0x0B00_E7E1
+
+
+def _lock_outbox(using: str) -> None:
+    """
+    PostgreSQL: держим xact-лок до конца транзакции — события коммитятся
+    строго в порядке id. Берётся перед самой вставкой, в конце транзакции,
+    так что параллельные брони почти не ждут друг друга.
+    """
+    conn = connections[using]
+    if conn.vendor == "postgresql":
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", [_OUTBOX_LOCK_KEY])
+
+
+def _notify(using: str, payload: str) -> None:
+    conn = connections[using]
+    if conn.vendor == "postgresql":
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+
+def record_event(booking, kind: str) -> BookingEvent:
+    """Записать событие по брони. Вызывать внутри transaction.atomic() вместе с save()."""
+    using = booking._state.db or "default"
+    with transaction.atomic(using=using):
+        _lock_outbox(using)
+        ev = BookingEvent.objects.using(using).create(
+            booking=booking,
+            kind=kind,
+            status=booking.status,
+            payment_marker=booking.payment_marker,
+        )
+        _notify(using, str(ev.pk))
+    booking._loaded_state = (booking.status, booking.payment_marker)
+    return ev
+
+
+def record_change(booking) -> BookingEvent | None:
+    """
+    Событие, если статус или отметка оплаты изменились относительно загруженных из БД
+    (Booking.from_db). Для мест, где бронь меняется «по месту» (админка).
+    """
+    prev = getattr(booking, "_loaded_state", None)
+    state = (booking.status, booking.payment_marker)
+    if prev is None or prev == state:
+        return None
+    return record_event(booking, KIND_STATUS if prev[0] != state[0] else KIND_PAYMENT)
+
+
+def record_bulk(booking_ids, kind: str, using: str = "default") -> None:
+    """События для броней, изменённых через QuerySet.update() (сигналы не срабатывают)."""
+    if not booking_ids:
+        return
+    with transaction.atomic(using=using):
+        rows = Booking.objects.using(using).filter(id__in=booking_ids).values_list("id", "status", "payment_marker")
+        _lock_outbox(using)
+        BookingEvent.objects.using(using).bulk_create([
+            BookingEvent(booking_id=bid, kind=kind, status=st, payment_marker=pm)
+            for bid, st, pm in rows
+        ])
+        _notify(using, "bulk")
+
+
+def head_id() -> int:
+    last = BookingEvent.objects.order_by("-id").values_list("id", flat=True).first()
+    return last or 0
+
+
+def events_after(since: int, limit: int):
+    return list(
+        BookingEvent.objects.filter(id__gt=since).order_by("id")[:limit]
+    )
+
+
+def _wait_notify(conn, timeout: float) -> None:
+    """Ждём NOTIFY на CHANNEL не дольше timeout (psycopg2, autocommit)."""
+    raw = conn.connection
+    ready = select.select([raw], [], [], timeout)
+    if ready[0]:
+        raw.poll()
+        raw.notifies.clear()
+
+
+def wait_for_events(since: int, timeout: float, limit: int = 100, using: str = "default"):
+    """
+    События с id > since. Если их пока нет — ждём до timeout секунд.
+    Возвращает список (возможно пустой, если за timeout ничего не произошло).
+    """
+    found = events_after(since, limit)
+    if found or timeout <= 0:
+        return found
+
+    deadline = time.monotonic() + timeout
+    conn = connections[using]
+    listen = conn.vendor == "postgresql" and not conn.in_atomic_block
+    if listen:
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+    try:
+        while True:
+            # перепроверяем после LISTEN — событие могло прийти между запросами
+            found = events_after(since, limit)
+            remaining = deadline - time.monotonic()
+            if found or remaining <= 0:
+                return found
+            if listen:
+                _wait_notify(conn, remaining)
+            else:
+                time.sleep(min(POLL_INTERVAL, remaining))
+    finally:
+        if listen:
+            with conn.cursor() as cur:
+                cur.execute(f"UNLISTEN {CHANNEL}")
+
+
+# ---------- Потребители ----------
+
+def get_consumer(name: str) -> EventConsumer:
+    """Потребитель по имени; новый начинает с текущего конца ленты, а не со всей истории."""
+    consumer = EventConsumer.objects.filter(name=name).first()
+    if consumer is None:
+        consumer, _ = EventConsumer.objects.get_or_create(name=name, defaults={"offset": head_id()})
+    return consumer
+
+
+def ack(name: str, cursor: int) -> int:
+    """Сдвинуть смещение потребителя вперёд (назад — никогда). Возвращает текущее смещение."""
+    consumer = get_consumer(name)
+    EventConsumer.objects.filter(pk=consumer.pk, offset__lt=cursor).update(offset=cursor)
+    return max(consumer.offset, cursor)
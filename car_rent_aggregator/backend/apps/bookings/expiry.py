@@ -0,0 +1,57 @@
+# apps/bookings/expiry.py
+"""
+Истечение «холдов» по броням — отдельным процессом (`manage.py expire_bookings`),
+а не лениво в API: списки и поллинг ботов остаются чистым чтением.
+
+  • pending старше HOLD_MINUTES (партнёр не ответил) -> canceled;
+  • confirmed без оплаты старше HOLD_MINUTES после подтверждения -> canceled,
+    даты в CarCalendar освобождаются.
+
+Каждый проход — набором запросов (один DELETE по календарю, один UPDATE
+на группу) и событиями в outbox в той же транзакции.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from apps.cars.models import CarCalendar
+from apps.cars.occupancy import schedule_rebuild
+from apps.common.choices import BookingStatus, PaymentMarker
+
+from . import events
+from .models import Booking
+
+HOLD_MINUTES = 20  # TTL ожидания подтверждения / оплаты
+
+
+def _lock_ids(qs) -> list[int]:
+    # SKIP LOCKED: бронь, которую прямо сейчас подтверждают/оплачивают, заберём на следующем проходе
+    return list(qs.select_for_update(skip_locked=True).values_list("id", flat=True))
+
+
+def expire_holds(now=None) -> dict:
+    """Один проход. Возвращает число отменённых {"pending": n, "unpaid": m}."""
+    now = now or timezone.now()
+    cutoff = now - timezone.timedelta(minutes=HOLD_MINUTES)
+    with transaction.atomic():
+        pending_ids = _lock_ids(Booking.objects.filter(
+            status=BookingStatus.PENDING, created_at__lt=cutoff,
+        ))
+        unpaid_ids = _lock_ids(
+            Booking.objects.filter(status=BookingStatus.CONFIRMED, updated_at__lt=cutoff)
+            .exclude(payment_marker=PaymentMarker.PAID)
+        )
+
+        if unpaid_ids:
+            # update() не шлёт сигналы — карту занятости пересобираем сами, одним разом
+            # на коммите вместе с машинами из post_delete календаря
+            schedule_rebuild(
+                Booking.objects.filter(id__in=unpaid_ids).values_list("car_id", flat=True).distinct()
+            )
+            CarCalendar.objects.filter(booking_id__in=unpaid_ids).delete()
+
+        expired = pending_ids + unpaid_ids
+        if expired:
+            Booking.objects.filter(id__in=expired).update(status=BookingStatus.CANCELED, updated_at=now)
+            events.record_bulk(expired, events.KIND_STATUS)
+
+    return {"pending": len(pending_ids), "unpaid": len(unpaid_ids)}
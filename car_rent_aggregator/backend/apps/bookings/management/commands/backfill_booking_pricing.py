@@ -0,0 +1,38 @@
+# apps/bookings/management/commands/backfill_booking_pricing.py
+from django.core.management.base import BaseCommand
+
+from apps.bookings.models import Booking
+from apps.common.choices import BookingStatus
+
+MONEY_STATUSES = (BookingStatus.CONFIRMED, BookingStatus.ISSUED, BookingStatus.COMPLETED)
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполнить финансовую разбивку (total_amount, commission_percent, "
+        "commission_amount, partner_net) у существующих броней."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="Пересчитать и уже заполненные брони")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        qs = Booking.objects.filter(status__in=MONEY_STATUSES).select_related("car", "partner")
+        if not opts["all"]:
+            qs = qs.filter(total_amount__isnull=True)
+
+        batch, done = [], 0
+        for booking in qs.order_by("pk").iterator(chunk_size=opts["batch_size"]):
+            booking.apply_pricing()
+            batch.append(booking)
+            if len(batch) >= opts["batch_size"]:
+                Booking.objects.bulk_update(batch, Booking.PRICING_FIELDS)
+                done += len(batch)
+                batch = []
+        if batch:
+            Booking.objects.bulk_update(batch, Booking.PRICING_FIELDS)
+            done += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Обновлено броней: {done}"))
@@ -0,0 +1,31 @@
+# apps/bookings/management/commands/expire_bookings.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.bookings.expiry import expire_holds
+
+
+class Command(BaseCommand):
+    help = "Отменяет просроченные pending и неоплаченные confirmed брони (раз в --interval секунд)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Один проход и выход (для cron)")
+        parser.add_argument("--interval", type=float, default=30.0, help="Пауза между проходами, сек")
+
+    def handle(self, *args, **opts):
+        self.stdout.write("Booking expiry sweeper started")
+        while True:
+            close_old_connections()
+            try:
+                done = expire_holds()
+            except Exception as e:
+                # не роняем процесс из-за одной неудачной транзакции
+                self.stderr.write(f"expiry pass failed: {e!r}")
+            else:
+                if done["pending"] or done["unpaid"]:
+                    self.stdout.write(f"expired: pending={done['pending']} unpaid={done['unpaid']}")
+            if opts["once"]:
+                break
+            time.sleep(opts["interval"])
@@ -0,0 +1,88 @@
+# apps/bookings/management/commands/stress_booking_create.py
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.bookings.models import Booking
+from apps.cars.models import Car
+from apps.users.models import BotUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочная проверка гонки: N параллельных POST /api/bookings/ на одну машину "
+        "и один слот. Ожидаем ровно один 201, остальные — 409. Созданные брони удаляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--car", type=int, required=True, help="ID машины")
+        parser.add_argument("--client", type=int, required=True,
+                            help="tg_user_id зарегистрированного клиента (с именем и телефоном)")
+        parser.add_argument("-n", "--workers", type=int, default=20, help="Число параллельных запросов")
+        parser.add_argument("--days-ahead", type=int, default=90,
+                            help="Через сколько дней слот (чтобы не задеть реальные брони)")
+        parser.add_argument("--keep", action="store_true", help="Не удалять созданные брони")
+
+    def handle(self, *args, **opts):
+        if not settings.BOTS_API_KEY:
+            raise CommandError("BOTS_API_KEY не задан")
+        if not Car.objects.filter(pk=opts["car"]).exists():
+            raise CommandError(f"Машина #{opts['car']} не найдена")
+        if not BotUser.objects.filter(tg_user_id=opts["client"]).exists():
+            raise CommandError(f"Клиент {opts['client']} не найден")
+
+        start = (timezone.now() + timezone.timedelta(days=opts["days_ahead"])).replace(
+            hour=10, minute=0, second=0, microsecond=0,
+        )
+        payload = {
+            "car_id": opts["car"],
+            "client_tg_user_id": opts["client"],
+            "date_from": start.isoformat(),
+            "date_to": (start + timezone.timedelta(days=2)).isoformat(),
+        }
+
+        barrier = threading.Barrier(opts["workers"])
+        codes: Counter = Counter()
+        created: list[int] = []
+        lock = threading.Lock()
+
+        def worker():
+            # Host из ALLOWED_HOSTS, иначе тестовый клиент получит 400
+            client = APIClient(HTTP_HOST=settings.ALLOWED_HOSTS[0].lstrip(".") or "localhost")
+            client.credentials(HTTP_X_API_KEY=settings.BOTS_API_KEY)
+            barrier.wait()
+            try:
+                resp = client.post("/api/bookings/", payload, format="json")
+                code = resp.status_code
+            except Exception as e:
+                code = type(e).__name__
+                resp = None
+            finally:
+                connections.close_all()
+            with lock:
+                codes[code] += 1
+                if code == 201:
+                    created.append(resp.data["id"])
+
+        threads = [threading.Thread(target=worker) for _ in range(opts["workers"])]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        self.stdout.write(f"{opts['workers']} запросов за {elapsed:.2f}s: {dict(codes)}")
+        if not opts["keep"] and created:
+            Booking.objects.filter(id__in=created).delete()
+
+        if codes[201] == 1 and codes[409] == opts["workers"] - 1:
+            self.stdout.write(self.style.SUCCESS("OK: одна бронь, остальные получили 409"))
+        else:
+            raise CommandError(f"Ожидали 1×201 и {opts['workers'] - 1}×409, получили {dict(codes)}")
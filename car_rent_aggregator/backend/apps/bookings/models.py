@@ -1,5 +1,5 @@
 # apps/bookings/models.py
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from apps.cars.models import Car
@@ -61,6 +61,32 @@ class Booking(models.Model):
         default=PaymentStatus.NEW,
     )
 
+    # Финансовая разбивка, фиксируется при подтверждении (см. apply_pricing)
+    total_amount = models.DecimalField(
+        _("Сумма аренды, UZS"),
+        max_digits=12,
+        decimal_places=2,
+        null=True, blank=True,
+    )
+    commission_percent = models.DecimalField(
+        _("Комиссия агрегатора, %"),
+        max_digits=5,
+        decimal_places=2,
+        null=True, blank=True,
+    )
+    commission_amount = models.DecimalField(
+        _("Комиссия агрегатора, UZS"),
+        max_digits=12,
+        decimal_places=2,
+        null=True, blank=True,
+    )
+    partner_net = models.DecimalField(
+        _("Чистыми партнёру, UZS"),
+        max_digits=12,
+        decimal_places=2,
+        null=True, blank=True,
+    )
+
     created_at = models.DateTimeField(_("Создано"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Обновлено"), auto_now=True)
 
@@ -71,8 +97,41 @@ class Booking(models.Model):
             models.Index(fields=["partner", "status"]),
             models.Index(fields=["client", "status"]),
             models.Index(fields=["car", "date_from", "date_to"]),
+            # лента изменений /api/bookings/changes/ (курсор по (updated_at, id))
+            models.Index(fields=["updated_at", "id"]),
         ]
 
+    # ---------- Отслеживание изменений ----------
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # запоминаем состояние из БД, чтобы видеть переход статуса без лишнего SELECT (events.record_change)
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = (instance.__dict__.get("status"), instance.__dict__.get("payment_marker"))
+        return instance
+
+    # ---------- Финансы ----------
+
+    PRICING_FIELDS = ("total_amount", "commission_percent", "commission_amount", "partner_net")
+
+    def apply_pricing(self, *, save: bool = False) -> list[str]:
+        """
+        Зафиксировать сумму аренды, ставку и сумму комиссии, чистые партнёру.
+        Сумма — по текущим ценам машины (apps.common.pricing),
+        ставка — Partner.commission_percent на момент подтверждения.
+        Возвращает список изменённых полей (для update_fields).
+        """
+        from apps.common import pricing
+
+        car = self.car
+        self.total_amount = pricing.quote(self.date_from, self.date_to, car.price_weekday, car.price_weekend)
+        self.commission_percent = self.partner.commission_percent or 0
+        self.commission_amount = pricing.commission(self.total_amount, self.commission_percent)
+        self.partner_net = self.total_amount - self.commission_amount
+        if save:
+            self.save(update_fields=[*self.PRICING_FIELDS, "updated_at"])
+        return list(self.PRICING_FIELDS)
+
     # ---------- Хелперы для оплаты ----------
 
     def mark_paid_by_payment(self, payment=None, *, save: bool = True):
@@ -86,11 +145,15 @@ class Booking(models.Model):
         Статус самой брони (confirmed/completed/...) НЕ трогаем,
         этим управляет бизнес-логика партнёров и процесс выдачи авто.
         """
+        from .events import record_change
+
         self.payment_marker = PaymentMarker.PAID
         self.payment_status = PaymentStatus.PAID
         self.updated_at = timezone.now()
         if save:
-            self.save(update_fields=["payment_marker", "payment_status", "updated_at"])
+            with transaction.atomic():
+                self.save(update_fields=["payment_marker", "payment_status", "updated_at"])
+                record_change(self)
 
     def mark_payment_failed(self, payment=None, *, save: bool = True, cancel_booking: bool = True):
         """
@@ -102,6 +165,7 @@ class Booking(models.Model):
           • слот по машине освобождаем.
         """
         from apps.cars.models import CarCalendar
+        from .events import record_change
 
         self.payment_marker = PaymentMarker.UNPAID
         self.payment_status = PaymentStatus.FAILED
@@ -114,14 +178,12 @@ class Booking(models.Model):
 
         self.updated_at = timezone.now()
         if save:
-            self.save(update_fields=["payment_marker", "payment_status", "status", "updated_at"])
+            with transaction.atomic():
+                self.save(update_fields=["payment_marker", "payment_status", "status", "updated_at"])
+                record_change(self)
 
         # чистим занятость по этой броне
-        CarCalendar.objects.filter(
-            car=self.car,
-            date_from=self.date_from,
-            date_to=self.date_to,
-        ).delete()
+        CarCalendar.objects.filter(booking=self).delete()
 
     # ---------- Валидация / строковое представление ----------
 
@@ -162,3 +224,43 @@ class BookingExtension(models.Model):
 
     def __str__(self):
         return f"Ext #{self.pk} for booking #{self.booking_id}"
+
+
+class BookingEvent(models.Model):
+    """
+    Outbox событий по броням: создание, смена статуса, смена отметки оплаты.
+    Пишется в одной транзакции с изменением брони (см. apps/bookings/events.py),
+    боты читают события по возрастанию id.
+    """
+    booking = models.ForeignKey(
+        Booking,
+        verbose_name=_("Бронирование"),
+        on_delete=models.CASCADE,
+        related_name="events",
+    )
+    kind = models.CharField(_("Тип события"), max_length=16)
+    status = models.CharField(_("Статус брони"), max_length=12, choices=BookingStatus.choices)
+    payment_marker = models.CharField(_("Оплата брони"), max_length=8, choices=PaymentMarker.choices)
+    created_at = models.DateTimeField(_("Создано"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Событие брони")
+        verbose_name_plural = _("События броней")
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} booking={self.booking_id} {self.status}|{self.payment_marker}"
+
+
+class EventConsumer(models.Model):
+    """Смещение потребителя ленты BookingEvent (бота): всё с id <= offset уже обработано."""
+    name = models.CharField(_("Потребитель"), max_length=64, unique=True)
+    offset = models.BigIntegerField(_("Последнее подтверждённое событие"), default=0)
+    updated_at = models.DateTimeField(_("Обновлено"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Потребитель событий")
+        verbose_name_plural = _("Потребители событий")
+
+    def __str__(self):
+        return f"{self.name} @ {self.offset}"
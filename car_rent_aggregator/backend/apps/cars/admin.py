@@ -265,10 +265,11 @@ class CarCalendarAdmin(admin.ModelAdmin):
     - В формах выбирают только «свои» авто.
     - Дополнительно защищаем прямой доступ.
     """
-    list_display = ("id", "car", "car_partner", "date_from", "date_to", "status")
+    list_display = ("id", "car", "car_partner", "booking", "date_from", "date_to", "status")
     list_filter = ("status", "car__partner")
     search_fields = ("car__title", "car__partner__name")
-    list_select_related = ("car", "car__partner")
+    list_select_related = ("car", "car__partner", "booking")
+    raw_id_fields = ("booking",)
 
     def car_partner(self, obj):
         return getattr(obj.car.partner, "name", "-")
@@ -1,10 +1,16 @@
+from urllib.parse import parse_qs, urlparse
+
 from rest_framework import serializers, generics
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
-from .models import Car, CarCalendar
-from apps.bookings.models import Booking
+from .models import Car, CarImageFileId
+from .availability import available_cars, busy_intervals, is_free
+from .derivatives import variant_rel
+from .occupancy import available_cars_by_occupancy, occupancy_search_enabled
 from apps.common.permissions import BotOnlyPermission
-from apps.common.overlaps import qs_overlaps
 
 # ---- нормализация значений choices (принимаем код или человекочитаемое имя/синоним) ----
 
@@ -52,6 +58,10 @@ class CarSerializer(serializers.ModelSerializer):
     images_rel = serializers.SerializerMethodField()
     cover_url = serializers.SerializerMethodField()
     cover_rel = serializers.SerializerMethodField()
+    card_rel = serializers.SerializerMethodField()
+    card_url = serializers.SerializerMethodField()
+    card_webp_url = serializers.SerializerMethodField()
+    thumb_url = serializers.SerializerMethodField()
     region = serializers.SerializerMethodField()
     color = serializers.SerializerMethodField()
 
@@ -72,8 +82,18 @@ class CarSerializer(serializers.ModelSerializer):
             "age_access", "drive_exp", "passport",
             # медиа
             "active", "images", "images_rel", "cover_url", "cover_rel",
+            # уменьшенные копии (оригинал, если копия ещё не построена)
+            "card_rel", "card_url", "card_webp_url", "thumb_url",
         )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # проекция: context["fields"] — только эти поля (method-поля вне списка не считаются вовсе)
+        only = self.context.get("fields")
+        if only:
+            for name in set(self.fields) - set(only):
+                self.fields.pop(name)
+
     def _get_lang(self) -> str:
         ctx = getattr(self, "context", {}) or {}
         return ctx.get("lang") or "ru"
@@ -126,6 +146,76 @@ class CarSerializer(serializers.ModelSerializer):
         im = getattr(obj, "images", None)
         return self._file_rel(im.image1) if im and im.image1 else None
 
+    def _variant_url(self, obj, kind: str):
+        im = getattr(obj, "images", None)
+        request = self.context.get("request")
+        rel = variant_rel(im, im.image1, kind) if im and im.image1 else None
+        try:
+            return request.build_absolute_uri(im.image1.storage.url(rel)) if request and rel else None
+        except Exception:
+            return None
+
+    def get_card_rel(self, obj):
+        im = getattr(obj, "images", None)
+        files = im.files() if im else []
+        return [p for p in (variant_rel(im, f, "card") for f in files) if p]
+
+    def get_card_url(self, obj):
+        return self._variant_url(obj, "card")
+
+    def get_card_webp_url(self, obj):
+        return self._variant_url(obj, "card_webp")
+
+    def get_thumb_url(self, obj):
+        return self._variant_url(obj, "thumb")
+
+
+# Поля карточки в боте — ?view=card. Ровно то, что читают client_bot/handlers/search.py:
+# build_car_caption (подпись), kb_card_actions (id), «Подробнее»/условия брони и
+# отправка фото (карточные копии; оригиналы боту не нужны).
+CARD_FIELDS = (
+    "id", "title", "year", "region", "plate_number", "color", "mileage_km",
+    "car_class", "gearbox", "drive_type", "engine_volume_l", "horsepower_hp",
+    "fuel_type", "fuel_consumption_l_per_100km",
+    "insurance_included", "child_seat", "car_with_driver",
+    "price_weekday", "price_weekend",
+    "deposit", "deposit_amount", "limit_km", "delivery",
+    "age_access", "drive_exp", "passport",
+    "card_rel", "card_url",
+)
+
+
+def projection_fields(query_params) -> tuple | None:
+    """?fields=id,title,... или ?view=card -> список полей; None — полный CarSerializer."""
+    raw = (query_params.get("fields") or "").strip()
+    if raw:
+        return tuple(f for f in (x.strip() for x in raw.split(",")) if f in CarSerializer.Meta.fields) or None
+    if query_params.get("view") == "card":
+        return CARD_FIELDS
+    return None
+
+
+class CarSearchPagination(CursorPagination):
+    """
+    Курсорная пагинация поиска: {"count": N (только на первой странице), "next_cursor": "...", "results": [...]}.
+    next_cursor — значение для ?cursor= следующего запроса (null — страниц больше нет).
+    Позиция курсора строится по первому полю ordering, поэтому оно уникально (id, PK-индекс):
+    с неуникальным первым полем страницы внутри одного значения листаются смещением.
+    """
+    ordering = ("id",)
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None if request.query_params.get(self.cursor_query_param) else queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        link = self.get_next_link()
+        cursor = parse_qs(urlparse(link).query).get(self.cursor_query_param, [None])[0] if link else None
+        return Response({"count": self.count, "next_cursor": cursor, "results": data})
+
 
 class CarsSearchParamsSerializer(serializers.Serializer):
     date_from = serializers.DateTimeField(required=False)
@@ -138,14 +228,28 @@ class CarsSearchView(generics.ListAPIView):
     """
     GET /api/cars/search/?date_from=...&date_to=...&car_class=Эконом&gearbox=Автомат&max_price=300000
     Возвращает доступные автомобили, терпима к локализованным значениям.
+
+    Опционально:
+      ?page_size=10[&cursor=...] — постранично (CarSearchPagination), без них — весь список;
+      ?view=card или ?fields=id,title,... — только нужные поля.
     """
     serializer_class = CarSerializer
     permission_classes = (BotOnlyPermission,)
+    pagination_class = CarSearchPagination
+
+    @property
+    def paginator(self):
+        # пагинация — только по запросу клиента, старые вызовы получают список целиком
+        qp = self.request.query_params
+        if not (qp.get("page_size") or qp.get("cursor")):
+            return None
+        return super().paginator
 
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
         lang = self.request.query_params.get("lang") or "ru"
         ctx["lang"] = lang
+        ctx["fields"] = projection_fields(self.request.query_params)
         return ctx
 
     def get_queryset(self):
@@ -168,19 +272,143 @@ class CarsSearchView(generics.ListAPIView):
         start = data.get("date_from")
         end   = data.get("date_to")
         if start and end:
-            busy_car_ids = set(
-                qs_overlaps(CarCalendar.objects.filter(status="busy"), start, end)
-                .values_list("car_id", flat=True)
-            )
-            booked_car_ids = set(
-                qs_overlaps(Booking.objects.filter(status__in=("confirmed", "issued")), start, end)
-                .values_list("car_id", flat=True)
-            )
-            qs = qs.exclude(id__in=(busy_car_ids | booked_car_ids))
+            if occupancy_search_enabled():
+                qs = available_cars_by_occupancy(qs, start, end)
+            else:
+                qs = available_cars(qs, start, end)
             if self.request.query_params.get("debug") == "1":
                 print("[CAR-SEARCH-DEBUG]",
                       "cls=", cls, "gbx=", gbx,
-                      "busy=", len(busy_car_ids), "booked=", len(booked_car_ids),
-                      "final_count=", qs.exclude(id__in=(busy_car_ids | booked_car_ids)).count())
+                      "final_count=", qs.count())
 
         return qs.select_related("partner", "images").order_by("partner_id", "mark_id", "model_id", "-year")
+
+
+# ---- пакетный поиск ----
+
+BATCH_MAX_QUERIES = 20
+
+
+class CarsSearchBatchQuerySerializer(CarsSearchParamsSerializer):
+    key = serializers.CharField(required=False, max_length=64)
+    date_from = serializers.DateTimeField()
+    date_to   = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs["date_to"] <= attrs["date_from"]:
+            raise serializers.ValidationError(_("Дата 'Аренда по' должна быть больше даты 'Аренда с'."))
+        return attrs
+
+
+class CarsSearchBatchSerializer(serializers.Serializer):
+    queries = CarsSearchBatchQuerySerializer(many=True, allow_empty=False)
+    lang = serializers.CharField(required=False, default="ru")
+
+    def validate_queries(self, value):
+        if len(value) > BATCH_MAX_QUERIES:
+            raise serializers.ValidationError(f"Не больше {BATCH_MAX_QUERIES} запросов за раз.")
+        return value
+
+
+class CarsSearchBatchView(APIView):
+    """
+    POST /api/cars/search/batch/
+    {"queries": [{"key": "q1", "date_from": "...", "date_to": "...", "car_class": "eco"}, ...], "lang": "ru"}
+    -> {"results": {"q1": [<car>, ...], ...}}   (без key — ключ = индекс запроса)
+
+    Все запросы считаются по одному снимку: машины выбираются одним запросом,
+    занятость за объединённый период — ещё двумя, дальше фильтрация в памяти.
+    Каждая машина сериализуется один раз, сколько бы запросов её ни вернули.
+    """
+    permission_classes = (BotOnlyPermission,)
+
+    def post(self, request):
+        ser = CarsSearchBatchSerializer(data=request.data); ser.is_valid(raise_exception=True)
+        queries = []
+        for i, q in enumerate(ser.validated_data["queries"]):
+            queries.append({
+                "key": q.get("key") or str(i),
+                "start": q["date_from"],
+                "end": q["date_to"],
+                "cls": normalize_choice(Car, "car_class", (q.get("car_class") or "").strip() or None),
+                "gbx": normalize_choice(Car, "gearbox", (q.get("gearbox") or "").strip() or None),
+                "price": q.get("max_price"),
+            })
+
+        cars_qs = Car.objects.filter(active=True)
+        if all(q["cls"] for q in queries):
+            cars_qs = cars_qs.filter(car_class__in={q["cls"] for q in queries})
+        cars = list(
+            cars_qs.select_related("partner", "images")
+            .order_by("partner_id", "mark_id", "model_id", "-year")
+        )
+        busy = busy_intervals(
+            [c.id for c in cars],
+            min(q["start"] for q in queries),
+            max(q["end"] for q in queries),
+        )
+
+        matched: dict[str, list[Car]] = {}
+        for q in queries:
+            price = q["price"]
+            matched[q["key"]] = [
+                c for c in cars
+                if (not q["cls"] or c.car_class == q["cls"])
+                and (not q["gbx"] or c.gearbox == q["gbx"])
+                and (price is None or (c.price_weekday is not None and c.price_weekday <= price)
+                     or (c.price_weekend is not None and c.price_weekend <= price))
+                and is_free(busy.get(c.id, ()), q["start"], q["end"])
+            ]
+
+        used = {c.id: c for found in matched.values() for c in found}
+        ctx = {"request": request, "lang": ser.validated_data["lang"]}
+        data = {c.id: row for c, row in zip(used.values(), CarSerializer(list(used.values()), many=True, context=ctx).data)}
+        return Response({"results": {key: [data[c.id] for c in found] for key, found in matched.items()}})
+
+
+# ---- Telegram file_id фото ----
+
+PHOTO_IDS_MAX = 50
+
+
+class CarPhotoFileIdSerializer(serializers.Serializer):
+    path = serializers.CharField(max_length=255)
+    hash = serializers.CharField(max_length=64, required=False, allow_blank=True, default="")
+    file_id = serializers.CharField(max_length=200)
+
+
+class CarPhotoFileIdsSerializer(serializers.Serializer):
+    bot = serializers.CharField(max_length=16)
+    items = CarPhotoFileIdSerializer(many=True, allow_empty=False, max_length=PHOTO_IDS_MAX)
+
+
+class CarPhotoFileIdsView(APIView):
+    """
+    GET  /api/cars/photo-ids/?bot=client&paths=cars/2025/01/a.jpg,cars/2025/01/b.jpg
+         -> {"items": [{"path": ..., "hash": ..., "file_id": ...}, ...]}
+    POST /api/cars/photo-ids/ {"bot": "client", "items": [{"path", "hash", "file_id"}, ...]}
+         -> запомнить file_id (upsert одним запросом)
+    """
+    permission_classes = (BotOnlyPermission,)
+
+    def get(self, request):
+        bot = request.query_params.get("bot") or ""
+        paths = [p for p in (request.query_params.get("paths") or "").split(",") if p][:PHOTO_IDS_MAX]
+        if not bot or not paths:
+            return Response({"items": []})
+        rows = CarImageFileId.objects.filter(bot=bot, path__in=paths).values_list("path", "content_hash", "file_id")
+        return Response({"items": [{"path": p, "hash": h, "file_id": f} for p, h, f in rows]})
+
+    def post(self, request):
+        ser = CarPhotoFileIdsSerializer(data=request.data); ser.is_valid(raise_exception=True)
+        bot = ser.validated_data["bot"]
+        CarImageFileId.objects.bulk_create(
+            [
+                CarImageFileId(bot=bot, path=i["path"], content_hash=i["hash"], file_id=i["file_id"])
+                for i in ser.validated_data["items"]
+            ],
+            update_conflicts=True,
+            unique_fields=["bot", "path", "content_hash"],
+            update_fields=["file_id", "updated_at"],
+        )
+        return Response({"saved": len(ser.validated_data["items"])})
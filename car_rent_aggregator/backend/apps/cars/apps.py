@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CarsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.cars'
+
+    def ready(self):
+        # карта занятости обновляется сигналами CarCalendar/Booking, копии фото — сигналом CarImages
+        from . import signals  # noqa
@@ -0,0 +1,76 @@
+# apps/cars/availability.py
+from django.db.models import Exists, OuterRef
+
+from apps.common.choices import BookingStatus
+from apps.common.overlaps import qs_overlaps
+
+# статусы броней, которые реально занимают машину
+BLOCKING_BOOKING_STATUSES = (BookingStatus.CONFIRMED, BookingStatus.ISSUED)
+
+
+def busy_calendar_subquery(start, end, car_ref="pk"):
+    """
+    Коррелированный подзапрос: есть ли у машины блокировка в CarCalendar,
+    пересекающаяся с [start, end).
+    """
+    from .models import CarCalendar
+    return qs_overlaps(
+        CarCalendar.objects.filter(car_id=OuterRef(car_ref), status="busy"),
+        start, end,
+    )
+
+
+def busy_booking_subquery(start, end, car_ref="pk"):
+    """
+    Коррелированный подзапрос: есть ли у машины подтверждённая/выданная бронь,
+    пересекающаяся с [start, end).
+    """
+    from apps.bookings.models import Booking
+    return qs_overlaps(
+        Booking.objects.filter(car_id=OuterRef(car_ref), status__in=BLOCKING_BOOKING_STATUSES),
+        start, end,
+    )
+
+
+def busy_intervals(car_ids, start, end) -> dict[int, list[tuple]]:
+    """
+    {car_id: [(date_from, date_to), ...]} — блокировки календаря и подтверждённые/выданные
+    брони, пересекающиеся с [start, end). Два запроса на любое число машин;
+    car_ids=None — весь автопарк.
+    """
+    from apps.bookings.models import Booking
+    from .models import CarCalendar
+
+    cal = CarCalendar.objects.filter(status="busy")
+    bk = Booking.objects.filter(status__in=BLOCKING_BOOKING_STATUSES)
+    if car_ids is not None:
+        cal = cal.filter(car_id__in=car_ids)
+        bk = bk.filter(car_id__in=car_ids)
+
+    result: dict[int, list] = {}
+    for qs in (cal, bk):
+        rows = qs_overlaps(qs, start, end).values_list("car_id", "date_from", "date_to")
+        for car_id, df, dt in rows.iterator(chunk_size=5000):
+            result.setdefault(car_id, []).append((df, dt))
+    return result
+
+
+def is_free(intervals, start, end) -> bool:
+    """Нет ли среди интервалов пересечения с [start, end) — то же условие, что в qs_overlaps."""
+    return not any(start < dt and end > df for df, dt in intervals)
+
+
+def available_cars(qs, start, end):
+    """
+    Свободные машины на [start, end) — одним SQL-запросом.
+
+    Вместо выгрузки id занятых машин в Python и обратного NOT IN (...)
+    добавляем к queryset два коррелированных NOT EXISTS:
+      • блокировки из календаря занятости;
+      • подтверждённые/выданные брони.
+    Оба подзапроса обслуживаются индексом (car, date_from, date_to).
+    """
+    return qs.filter(
+        ~Exists(busy_calendar_subquery(start, end)),
+        ~Exists(busy_booking_subquery(start, end)),
+    )
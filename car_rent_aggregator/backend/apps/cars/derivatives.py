@@ -0,0 +1,107 @@
+# apps/cars/derivatives.py
+"""
+Уменьшенные копии фото авто (Pillow), рядом с оригиналом:
+
+  cars/2025/01/x.jpg -> cars/2025/01/x.jpg.card.jpg   карточка для Telegram (JPEG, до 1280px)
+                     -> cars/2025/01/x.jpg.card.webp  то же в WebP (веб)
+                     -> cars/2025/01/x.jpg.thumb.webp миниатюра (до 320px)
+
+В имени копии — полное имя оригинала с расширением: у x.jpg и x.png в одной
+папке копии разные. Фото больше MAX_PIXELS не декодируем (защита от «бомб»).
+Оригиналы не трогаем. Что уже построено — в CarImages.derivatives
+({имя оригинала: {вид: путь}}), поэтому сериализатор не ходит в storage,
+а заменённое фото просто получает новую запись. Строятся сигналом при
+сохранении CarImages и командой `manage.py build_image_derivatives`.
+"""
+import io
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from apps.users.uploads import MAX_PIXELS
+
+# вид -> (суффикс файла, формат PIL, максимальная сторона, параметры save)
+VARIANTS = {
+    "card": (".card.jpg", "JPEG", 1280, {"quality": 82, "optimize": True, "progressive": True}),
+    "card_webp": (".card.webp", "WEBP", 1280, {"quality": 80, "method": 4}),
+    "thumb": (".thumb.webp", "WEBP", 320, {"quality": 75, "method": 4}),
+}
+
+
+def derivative_name(original: str, kind: str) -> str:
+    p = PurePosixPath(original)
+    return str(p.with_name(p.name + VARIANTS[kind][0]))
+
+
+def _render(img: Image.Image, fmt: str, side: int, params: dict) -> bytes:
+    out = img.copy()
+    out.thumbnail((side, side), Image.Resampling.LANCZOS)  # только уменьшает
+    buf = io.BytesIO()
+    out.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def _build_one(f) -> dict:
+    storage, name = f.storage, f.name
+    with storage.open(name, "rb") as fh:
+        img = Image.open(fh)
+        if img.width * img.height > MAX_PIXELS:
+            raise ValueError(f"image too large: {img.width}x{img.height}")
+        side = max(s for _, _, s, _ in VARIANTS.values())
+        img.draft("RGB", (side, side))  # JPEG декодируется сразу в уменьшенном масштабе
+        img = ImageOps.exif_transpose(img)  # поворот с телефона — в пиксели, EXIF не сохраняем
+        img = img.convert("RGB")
+
+    paths = {}
+    for kind, (_, fmt, side, params) in VARIANTS.items():
+        target = derivative_name(name, kind)
+        if storage.exists(target):
+            storage.delete(target)  # иначе storage.save() придумает другое имя
+        paths[kind] = storage.save(target, ContentFile(_render(img, fmt, side, params)))
+    return paths
+
+
+def _drop(storage, paths: dict):
+    for p in paths.values():
+        try:
+            storage.delete(p)
+        except Exception:
+            pass
+
+
+def build_derivatives(images, force: bool = False) -> tuple[dict, int]:
+    """
+    Достроить копии для всех фото набора CarImages; копии заменённых/удалённых
+    фото удаляются. Возвращает (новое значение derivatives, сколько фото обработано).
+    Не сохраняет модель — это делает вызывающий код (update(), без сигналов).
+    """
+    current = dict(images.derivatives or {})
+    files = {f.name: f for f in images.files() if f}
+    storage = images.image1.storage
+
+    for name in set(current) - set(files):
+        _drop(storage, current.pop(name))
+
+    built = 0
+    for name, f in files.items():
+        if name in current and not force:
+            continue
+        try:
+            paths = _build_one(f)
+        except Exception:
+            # битый/не найденный/слишком большой файл — отдаём оригинал, копии не строим
+            current.pop(name, None)
+            continue
+        # копии под прежними именами (до смены схемы имён) больше не нужны
+        _drop(storage, {k: p for k, p in (current.get(name) or {}).items() if p not in paths.values()})
+        current[name] = paths
+        built += 1
+    return current, built
+
+
+def variant_rel(images, f, kind: str) -> str | None:
+    """Путь копии вида kind для файла f; оригинал, если копии нет."""
+    if not f:
+        return None
+    return ((images.derivatives or {}).get(f.name) or {}).get(kind) or f.name
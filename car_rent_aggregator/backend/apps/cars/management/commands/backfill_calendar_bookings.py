@@ -0,0 +1,52 @@
+# apps/cars/management/commands/backfill_calendar_bookings.py
+from django.core.management.base import BaseCommand
+
+from apps.bookings.models import Booking
+from apps.cars.models import CarCalendar
+from apps.common.choices import BookingStatus
+
+# брони, которые держат блокировку в календаре
+HOLDING_STATUSES = (BookingStatus.CONFIRMED, BookingStatus.ISSUED, BookingStatus.COMPLETED)
+
+
+class Command(BaseCommand):
+    help = (
+        "Привязать старые записи CarCalendar к броням (поле booking) по совпадению "
+        "авто и дат. Каждая бронь получает не больше одной записи; остальные "
+        "считаются ручными блокировками и остаются без брони."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать")
+
+    def handle(self, *args, **opts):
+        blocks = list(
+            CarCalendar.objects.filter(booking__isnull=True, status="busy")
+            .order_by("id").only("id", "car_id", "date_from", "date_to")
+        )
+        if not blocks:
+            self.stdout.write("Нечего привязывать")
+            return
+
+        linked = set(CarCalendar.objects.filter(booking__isnull=False).values_list("booking_id", flat=True))
+        candidates: dict[tuple, list[int]] = {}
+        for bid, car_id, d_from, d_to in (
+            Booking.objects.filter(status__in=HOLDING_STATUSES, car_id__in={b.car_id for b in blocks})
+            .exclude(id__in=linked)
+            .order_by("updated_at")
+            .values_list("id", "car_id", "date_from", "date_to")
+        ):
+            candidates.setdefault((car_id, d_from, d_to), []).append(bid)
+
+        updated = []
+        for block in blocks:
+            ids = candidates.get((block.car_id, block.date_from, block.date_to))
+            if ids:
+                block.booking_id = ids.pop(0)
+                updated.append(block)
+
+        if not opts["dry_run"]:
+            CarCalendar.objects.bulk_update(updated, ["booking"], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(
+            f"Привязано записей: {len(updated)}, без брони осталось: {len(blocks) - len(updated)}"
+        ))
@@ -0,0 +1,131 @@
+# apps/cars/management/commands/bench_availability.py
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from apps.cars.availability import available_cars, BLOCKING_BOOKING_STATUSES
+from apps.cars.models import Car, CarCalendar
+from apps.cars.occupancy import available_cars_by_occupancy, rebuild_cars
+from apps.common.choices import CarClass, Gearbox
+from apps.common.overlaps import qs_overlaps
+from apps.partners.models import Partner
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_available_ids(qs, start, end):
+    """Старый путь CarsSearchView: два set'а занятых id + NOT IN (...)."""
+    busy_car_ids = set(
+        qs_overlaps(CarCalendar.objects.filter(status="busy"), start, end)
+        .values_list("car_id", flat=True)
+    )
+    booked_car_ids = set(
+        qs_overlaps(Booking.objects.filter(status__in=BLOCKING_BOOKING_STATUSES), start, end)
+        .values_list("car_id", flat=True)
+    )
+    return list(qs.exclude(id__in=(busy_car_ids | booked_car_ids)).values_list("id", flat=True))
+
+
+def engine_available_ids(qs, start, end):
+    return list(available_cars(qs, start, end).values_list("id", flat=True))
+
+
+def bitmap_available_ids(qs, start, end):
+    return list(available_cars_by_occupancy(qs, start, end).values_list("id", flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк поиска свободных машин: старый путь (NOT IN), коррелированные "
+        "NOT EXISTS и NOT EXISTS с предфильтром по карте занятости (CarOccupancy). "
+        "Данные создаются во временной транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                            help="Размеры календаря занятости (строк CarCalendar)")
+        parser.add_argument("--cars", type=int, default=500, help="Размер автопарка")
+        parser.add_argument("--repeat", type=int, default=20, help="Повторов каждого запроса")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        self.stdout.write(
+            f"{'rows':>8} | {'legacy, ms':>11} | {'engine, ms':>11} | {'bitmap, ms':>11} | {'free cars':>9}"
+        )
+        for rows in opts["rows"]:
+            try:
+                with transaction.atomic():
+                    legacy_ms, engine_ms, bitmap_ms, free = self._run_one(rnd, rows, opts["cars"], opts["repeat"])
+                    raise _Rollback
+            except _Rollback:
+                pass
+            self.stdout.write(
+                f"{rows:>8} | {legacy_ms:>11.2f} | {engine_ms:>11.2f} | {bitmap_ms:>11.2f} | {free:>9}"
+            )
+
+    def _seed(self, rnd, rows, cars_count):
+        partner = Partner.objects.create(name="bench-partner")
+        cars = Car.objects.bulk_create([
+            Car(
+                partner=partner,
+                title=f"Bench car {i}",
+                year=2020,
+                car_class=rnd.choice(CarClass.values),
+                gearbox=rnd.choice(Gearbox.values),
+                price_weekday=Decimal("300000"),
+                price_weekend=Decimal("350000"),
+            )
+            for i in range(cars_count)
+        ])
+        now = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        batch = []
+        for _ in range(rows):
+            start = now + timedelta(days=rnd.randint(0, 365))
+            batch.append(CarCalendar(
+                car=rnd.choice(cars),
+                date_from=start,
+                date_to=start + timedelta(days=rnd.randint(1, 7)),
+                status="busy",
+            ))
+            if len(batch) >= 5_000:
+                CarCalendar.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            CarCalendar.objects.bulk_create(batch)
+        # bulk_create сигналов не шлёт — карты строим сами
+        rebuild_cars([car.id for car in cars])
+        return now
+
+    def _run_one(self, rnd, rows, cars_count, repeat):
+        now = self._seed(rnd, rows, cars_count)
+        windows = []
+        for _ in range(repeat):
+            start = now + timedelta(days=rnd.randint(0, 360))
+            windows.append((start, start + timedelta(days=rnd.randint(1, 5))))
+
+        qs = Car.objects.filter(active=True)
+
+        t0 = time.perf_counter()
+        legacy = [legacy_available_ids(qs, start, end) for start, end in windows]
+        legacy_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+        t0 = time.perf_counter()
+        engine = [engine_available_ids(qs, start, end) for start, end in windows]
+        engine_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+        t0 = time.perf_counter()
+        bitmap = [bitmap_available_ids(qs, start, end) for start, end in windows]
+        bitmap_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+        if any(sorted(a) != sorted(b) or sorted(a) != sorted(c) for a, b, c in zip(legacy, engine, bitmap)):
+            self.stderr.write(self.style.ERROR(f"rows={rows}: результаты расходятся!"))
+        return legacy_ms, engine_ms, bitmap_ms, len(engine[-1]) if engine else 0
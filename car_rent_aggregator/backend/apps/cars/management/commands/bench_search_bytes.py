@@ -0,0 +1,71 @@
+# apps/cars/management/commands/bench_search_bytes.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from apps.cars.api import CARD_FIELDS, CarSerializer
+from apps.cars.derivatives import variant_rel
+from apps.cars.models import Car
+
+
+def _size(storage, name) -> int:
+    try:
+        return storage.size(name) if name else 0
+    except Exception:
+        return 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Сколько байт уходит на одну страницу поиска: JSON (полный CarSerializer против "
+        "?view=card) и фото (оригиналы против карточных копий). Считается по реальным "
+        "машинам с фото, страницами по --page."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page", type=int, default=10, help="Карточек на странице поиска")
+        parser.add_argument("--pages", type=int, default=20, help="Сколько страниц посчитать")
+
+    def handle(self, *args, **opts):
+        request = APIRequestFactory().get(
+            "/api/cars/search/", HTTP_HOST=settings.ALLOWED_HOSTS[0].lstrip(".") or "localhost",
+        )
+        cars = list(
+            Car.objects.filter(images__isnull=False).select_related("partner", "images")
+            .order_by("id")[: opts["page"] * opts["pages"]]
+        )
+        if not cars:
+            self.stdout.write("Нет машин с фото")
+            return
+
+        pages = [cars[i:i + opts["page"]] for i in range(0, len(cars), opts["page"])]
+        totals = {"json_full": 0, "json_card": 0, "cover_orig": 0, "cover_card": 0, "more_orig": 0, "more_card": 0}
+        for page in pages:
+            ctx = {"request": request, "lang": "ru"}
+            totals["json_full"] += len(JSONRenderer().render(CarSerializer(page, many=True, context=ctx).data))
+            totals["json_card"] += len(JSONRenderer().render(
+                CarSerializer(page, many=True, context={**ctx, "fields": CARD_FIELDS}).data
+            ))
+            for car in page:
+                im = car.images
+                storage = im.image1.storage
+                for i, f in enumerate(f for f in im.files() if f):
+                    orig, card = _size(storage, f.name), _size(storage, variant_rel(im, f, "card"))
+                    key = "cover" if i == 0 else "more"
+                    totals[f"{key}_orig"] += orig
+                    totals[f"{key}_card"] += card
+
+        n = len(pages)
+
+        def row(title, before, after):
+            ratio = f"{after / before:.0%}" if before else "—"
+            self.stdout.write(f"{title:<22} | {before / n / 1024:>10.1f} | {after / n / 1024:>10.1f} | {ratio:>6}")
+
+        self.stdout.write(f"{n} стр. по {opts['page']} карточек, КБ на одну страницу поиска")
+        self.stdout.write(f"{'':<22} | {'было':>10} | {'стало':>10} | {'доля':>6}")
+        row("JSON ответа", totals["json_full"], totals["json_card"])
+        row("обложки карточек", totals["cover_orig"], totals["cover_card"])
+        row("«ещё фото»", totals["more_orig"], totals["more_card"])
+        row("итого", sum(totals[k] for k in ("json_full", "cover_orig", "more_orig")),
+            sum(totals[k] for k in ("json_card", "cover_card", "more_card")))
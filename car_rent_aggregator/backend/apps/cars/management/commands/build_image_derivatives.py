@@ -0,0 +1,32 @@
+# apps/cars/management/commands/build_image_derivatives.py
+from django.core.management.base import BaseCommand
+
+from apps.cars.derivatives import build_derivatives
+from apps.cars.models import CarImages
+
+
+class Command(BaseCommand):
+    help = (
+        "Построить уменьшенные копии фото авто (card JPEG/WebP, thumb WebP) для уже "
+        "загруженных CarImages. Новые загрузки обрабатываются сигналом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Перестроить и существующие копии")
+        parser.add_argument("--car", type=int, nargs="*", help="Только эти машины (ID)")
+
+    def handle(self, *args, **opts):
+        qs = CarImages.objects.order_by("id")
+        if opts["car"]:
+            qs = qs.filter(car_id__in=opts["car"])
+
+        sets = photos = 0
+        for images in qs.iterator(chunk_size=100):
+            derivatives, built = build_derivatives(images, force=opts["force"])
+            if derivatives != (images.derivatives or {}):
+                CarImages.objects.filter(pk=images.pk).update(derivatives=derivatives)
+            if built:
+                sets += 1
+                photos += built
+                self.stdout.write(f"car #{images.car_id}: {built} фото")
+        self.stdout.write(self.style.SUCCESS(f"Готово: наборов {sets}, фото {photos}"))
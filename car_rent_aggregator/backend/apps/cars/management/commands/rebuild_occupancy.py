@@ -0,0 +1,19 @@
+# apps/cars/management/commands/rebuild_occupancy.py
+from django.core.management.base import BaseCommand
+
+from apps.cars.occupancy import rebuild_cars, HORIZON_DAYS
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобрать суточные карты занятости (CarOccupancy) от сегодняшнего дня. "
+        "Запускать раз в сутки (cron), чтобы горизонт карты сдвигался вперёд."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--car", type=int, action="append", dest="cars",
+                            help="Пересобрать только для этих машин (можно несколько раз)")
+
+    def handle(self, *args, **opts):
+        n = rebuild_cars(opts.get("cars"))
+        self.stdout.write(self.style.SUCCESS(f"Карт пересобрано: {n} (горизонт {HORIZON_DAYS} дн.)"))
@@ -200,6 +200,14 @@ class CarCalendar(models.Model):
         on_delete=models.CASCADE,
         related_name="calendar"
     )
+    # блокировка, созданная подтверждением брони; у ручных блокировок — пусто
+    booking = models.ForeignKey(
+        "bookings.Booking",
+        verbose_name=_("Бронь"),
+        on_delete=models.CASCADE,
+        related_name="calendar_blocks",
+        null=True, blank=True,
+    )
     date_from = models.DateTimeField(_("Занят с"))
     date_to   = models.DateTimeField(_("Занят по"))
     status = models.CharField(
@@ -232,6 +240,8 @@ class CarImages(models.Model):
     image2 = models.ImageField(_("Фото 2"), upload_to="cars/%Y/%m", blank=True, null=True)
     image3 = models.ImageField(_("Фото 3"), upload_to="cars/%Y/%m", blank=True, null=True)
     image4 = models.ImageField(_("Фото 4"), upload_to="cars/%Y/%m", blank=True, null=True)
+    # уменьшенные копии (см. derivatives.py): {имя оригинала: {"card": ..., "card_webp": ..., "thumb": ...}}
+    derivatives = models.JSONField(_("Уменьшенные копии"), default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(_("Создано"), auto_now_add=True)
 
     class Meta:
@@ -243,3 +253,51 @@ class CarImages(models.Model):
 
     def files(self):
         return [self.image1, self.image2, self.image3, self.image4]
+
+
+class CarImageFileId(models.Model):
+    """
+    Telegram file_id загруженного ботом фото авто: после первой отправки файла
+    бот шлёт его по file_id, без повторной загрузки. file_id действителен только
+    для того бота, который его получил, поэтому ключ — (бот, путь, хэш содержимого).
+    """
+    bot = models.CharField(_("Бот"), max_length=16)
+    path = models.CharField(_("Файл"), max_length=255, help_text=_("Путь относительно MEDIA_ROOT"))
+    content_hash = models.CharField(_("SHA-256 файла"), max_length=64, blank=True)
+    file_id = models.CharField(_("Telegram file_id"), max_length=200)
+    updated_at = models.DateTimeField(_("Обновлено"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("file_id фото")
+        verbose_name_plural = _("file_id фото (Telegram)")
+        constraints = [
+            models.UniqueConstraint(fields=["bot", "path", "content_hash"], name="car_image_file_id_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.bot}:{self.path}"
+
+
+class CarOccupancy(models.Model):
+    """
+    Суточная битовая карта занятости машины на N дней вперёд (см. apps/cars/occupancy.py).
+    Бит i = 1 — день origin + i целиком занят календарём или подтверждённой бронью.
+    Поддерживается сигналами CarCalendar/Booking, пересобирается командой rebuild_occupancy.
+    """
+    car = models.OneToOneField(
+        Car,
+        verbose_name=_("Автомобиль"),
+        on_delete=models.CASCADE,
+        related_name="occupancy",
+        primary_key=True,
+    )
+    origin = models.DateField(_("Первый день карты"))
+    full_bits = models.BinaryField(_("Полностью занятые дни"), default=bytes)
+    updated_at = models.DateTimeField(_("Обновлено"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Карта занятости")
+        verbose_name_plural = _("Карты занятости")
+
+    def __str__(self):
+        return f"{self.car} [{self.origin}]"
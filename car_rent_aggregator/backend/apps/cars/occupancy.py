@@ -0,0 +1,200 @@
+# apps/cars/occupancy.py
+"""
+Материализованная суточная занятость машин.
+
+На каждую машину храним один битсет (CarOccupancy.full_bits) на HORIZON_DAYS
+дней вперёд от origin. Бит дня ставится, только если блокировка покрывает день
+целиком (с полуночи до полуночи), — карта занижает занятость, но никогда не
+завышает: частично занятые дни (первый/последний день брони) не отмечены.
+
+Поэтому карта — AND-предфильтр поиска: машина, у которой окно [start, end)
+задевает полностью занятый день, точно занята и отбрасывается условием по
+строке карты, без подзапросов. Оставшиеся проходят обычную точную проверку
+availability.available_cars (NOT EXISTS) — планировщик строит для неё тот же
+anti-join, что и без карты, только по меньшему числу машин.
+"""
+import threading
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import BinaryField, F, Func, IntegerField, Q, Value
+from django.utils import timezone
+
+
+HORIZON_DAYS = int(getattr(settings, "OCCUPANCY_HORIZON_DAYS", 365))
+_NBYTES = (HORIZON_DAYS + 7) // 8
+
+
+def day_span(start, end) -> tuple[date, date]:
+    """
+    [первый день, последний день) — все локальные дни, которых касается [start, end).
+    Конец ровно в полночь следующий день не задевает.
+    """
+    first = timezone.localdate(start)
+    last = timezone.localdate(end - timedelta(microseconds=1)) + timedelta(days=1)
+    if last <= first:
+        last = first + timedelta(days=1)
+    return first, last
+
+
+def _pack(value: int) -> bytes:
+    return value.to_bytes(_NBYTES, "little")
+
+
+def _unpack(raw) -> int:
+    return int.from_bytes(bytes(raw), "little")
+
+
+def _intervals_by_car(car_ids, origin: date):
+    """{car_id: [(date_from, date_to), ...]} блокировок, попадающих в горизонт карты."""
+    from .availability import busy_intervals
+
+    tz = timezone.get_current_timezone()
+    h_start = timezone.make_aware(datetime.combine(origin, time.min), tz)
+    return busy_intervals(car_ids, h_start, h_start + timedelta(days=HORIZON_DAYS))
+
+
+def full_day_span(start, end) -> tuple[date, date]:
+    """[первый, последний) — локальные дни, которые [start, end) покрывает целиком."""
+    first = timezone.localdate(start)
+    if timezone.localtime(start).time() != time.min:
+        first += timedelta(days=1)
+    return first, timezone.localdate(end)
+
+
+def build_bits(intervals, origin: date) -> int:
+    bits = 0
+    for df, dt in intervals:
+        first, last = full_day_span(df, dt)
+        lo = max((first - origin).days, 0)
+        hi = min((last - origin).days, HORIZON_DAYS)
+        if hi > lo:
+            bits |= ((1 << (hi - lo)) - 1) << lo
+    return bits
+
+
+def rebuild_cars(car_ids=None, origin: date | None = None) -> int:
+    """
+    Пересобрать карты для указанных машин (None — весь автопарк).
+    Возвращает число обновлённых карт.
+    """
+    from .models import Car, CarOccupancy
+
+    origin = origin or timezone.localdate()
+    if car_ids is None:
+        ids = list(Car.objects.values_list("id", flat=True))
+    else:
+        ids = list(car_ids)
+    if not ids:
+        return 0
+
+    intervals = _intervals_by_car(None if car_ids is None else ids, origin)
+    existing = set(CarOccupancy.objects.filter(car_id__in=ids).values_list("car_id", flat=True))
+
+    to_create, to_update = [], []
+    for car_id in ids:
+        row = CarOccupancy(car_id=car_id, origin=origin, full_bits=_pack(build_bits(intervals.get(car_id, ()), origin)))
+        (to_update if car_id in existing else to_create).append(row)
+
+    if to_create:
+        CarOccupancy.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+    if to_update:
+        for row in to_update:
+            row.updated_at = timezone.now()
+        CarOccupancy.objects.bulk_update(to_update, ["origin", "full_bits", "updated_at"], batch_size=1000)
+    return len(ids)
+
+
+_pending = threading.local()
+
+
+def _flush_pending():
+    ids = getattr(_pending, "car_ids", None)
+    if ids:
+        _pending.car_ids = set()
+        rebuild_cars(ids)
+
+
+def schedule_rebuild(car_ids) -> None:
+    """
+    Пересобрать карты после коммита текущей транзакции — один раз на все машины,
+    сколько бы сигналов ни пришло (bulk delete шлёт post_delete на каждую строку).
+    Вне транзакции — сразу. После отката id остаются в наборе и пересоберутся
+    со следующим коммитом: лишняя пересборка безвредна.
+    """
+    ids = getattr(_pending, "car_ids", None)
+    if ids is None:
+        ids = _pending.car_ids = set()
+    ids.update(car_ids)
+    transaction.on_commit(_flush_pending)
+
+
+def _window_bits(origin: date, start, end) -> tuple[int, int] | None:
+    first, last = day_span(start, end)
+    lo, hi = (first - origin).days, (last - origin).days
+    if lo < 0 or hi > HORIZON_DAYS:
+        return None
+    return lo, hi
+
+
+class _ZeroPad(Func):
+    # карта, дополненная нулевыми байтами: короче окна она бывает до первой
+    # пересборки или после увеличения HORIZON_DAYS — недостающие дни «не заняты»
+    template = "(%(expressions)s)"
+    arg_joiner = " || "
+    output_field = BinaryField()
+
+
+class _GetByte(Func):
+    function = "get_byte"  # номер байта с 0
+    output_field = IntegerField()
+
+
+class _Bytes(Func):
+    function = "substr"  # позиция с 1
+    output_field = BinaryField()
+
+
+def _window_clear(lo: int, hi: int) -> tuple[dict, Q]:
+    """
+    Алиасы и условие «в карте нет полностью занятых дней из [lo, hi)» —
+    чистое выражение по строке CarOccupancy, без подзапросов.
+    """
+    b0, b1 = lo // 8, (hi - 1) // 8
+    bits = _ZeroPad(F("occupancy__full_bits"), Value(bytes(b1 + 1), output_field=BinaryField()))
+    aliases, cond = {}, {}
+    if b0 == b1:
+        edges = [(b0, ((1 << (hi - lo)) - 1) << (lo % 8))]
+    else:
+        edges = [(b0, (0xFF << (lo % 8)) & 0xFF), (b1, (1 << ((hi - 1) % 8 + 1)) - 1)]
+        if b1 - b0 > 1:
+            aliases["_occ_mid"] = _Bytes(bits, Value(b0 + 2), Value(b1 - b0 - 1))
+            cond["_occ_mid"] = bytes(b1 - b0 - 1)
+    for i, (byte, mask) in enumerate(edges):
+        aliases[f"_occ_edge{i}"] = _GetByte(bits, Value(byte)).bitand(mask)
+        cond[f"_occ_edge{i}"] = 0
+    return aliases, Q(**cond)
+
+
+def available_cars_by_occupancy(cars_qs, start, end):
+    """
+    То же, что availability.available_cars, но сначала отбрасываем по карте
+    машины, у которых окно задевает полностью занятый день. Условие — AND к
+    точной проверке, а не OR: коррелированные NOT EXISTS остаются обычным
+    anti-join. Машины без карты или с картой другого дня проходят предфильтр.
+    """
+    from .availability import available_cars
+
+    today = timezone.localdate()
+    window = _window_bits(today, start, end)
+    if window is None or connections[cars_qs.db].vendor != "postgresql":
+        return available_cars(cars_qs, start, end)
+
+    aliases, clear = _window_clear(*window)
+    maybe_free = Q(occupancy__isnull=True) | ~Q(occupancy__origin=today) | clear
+    return available_cars(cars_qs.alias(**aliases).filter(maybe_free), start, end)
+
+
+def occupancy_search_enabled() -> bool:
+    return bool(getattr(settings, "OCCUPANCY_SEARCH", True))
@@ -0,0 +1,47 @@
+# apps/cars/signals.py
+from __future__ import annotations
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.bookings.models import Booking
+from apps.common.choices import BookingStatus
+from .derivatives import build_derivatives
+from .models import CarCalendar, CarImages
+from .occupancy import schedule_rebuild
+
+
+@receiver(post_save, sender=CarCalendar)
+@receiver(post_delete, sender=CarCalendar)
+def _calendar_changed(sender, instance: CarCalendar, **kwargs):
+    schedule_rebuild([instance.car_id])
+
+
+@receiver(post_save, sender=Booking)
+def _booking_saved(sender, instance: Booking, created: bool, **kwargs):
+    # новая pending-заявка машину ещё не занимает
+    if created and instance.status == BookingStatus.PENDING:
+        return
+    schedule_rebuild([instance.car_id])
+
+
+@receiver(post_delete, sender=Booking)
+def _booking_deleted(sender, instance: Booking, **kwargs):
+    schedule_rebuild([instance.car_id])
+
+
+def _build_image_derivatives(pk: int):
+    # копии для новых/заменённых фото; update() — чтобы не вызвать сигнал повторно
+    images = CarImages.objects.filter(pk=pk).first()
+    if images is None:
+        return
+    derivatives, _ = build_derivatives(images)
+    if derivatives != (images.derivatives or {}):
+        CarImages.objects.filter(pk=pk).update(derivatives=derivatives)
+
+
+@receiver(post_save, sender=CarImages)
+def _images_saved(sender, instance: CarImages, **kwargs):
+    # после коммита: Pillow не держит транзакцию сохранения, откат не оставляет копий
+    pk = instance.pk
+    transaction.on_commit(lambda: _build_image_derivatives(pk))
@@ -60,3 +60,9 @@ class PaymentStatus(TextChoices):
 class PaymentProvider(TextChoices):
     CLICK = "click", _("Click")
     PAYME = "payme", _("Payme")
+
+class ReportJobStatus(TextChoices):
+    PENDING = "pending", _("В очереди")
+    RUNNING = "running", _("Формируется")
+    DONE    = "done",    _("Готов")
+    FAILED  = "failed",  _("Ошибка")
@@ -0,0 +1,75 @@
+# apps/common/management/commands/pg_ranges.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from apps.bookings.models import Booking
+from apps.cars.availability import BLOCKING_BOOKING_STATUSES
+from apps.cars.models import CarCalendar
+from apps.common.overlaps import RANGE_INDEX_SUFFIX, RANGE_DETECT_TTL, reset_range_detection
+
+PERIOD_EXPR = "tstzrange(date_from, date_to, '[)')"
+
+
+def _targets():
+    """
+    (таблица, условие для EXCLUDE) для моделей с интервалами занятости.
+    Для Booking запрет пересечений действует только на брони, реально занимающие машину.
+    """
+    statuses = ", ".join(f"'{s}'" for s in BLOCKING_BOOKING_STATUSES)
+    return [
+        (CarCalendar._meta.db_table, "status = 'busy'"),
+        (Booking._meta.db_table, f"status IN ({statuses})"),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "PostgreSQL: включает/выключает range-режим для CarCalendar и Booking — "
+        "GiST-индекс по tstzrange(date_from, date_to) и EXCLUDE-ограничение "
+        "(car_id WITH =, period WITH &&), запрещающее двойное бронирование на уровне БД."
+    )
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument("--enable", action="store_true")
+        group.add_argument("--disable", action="store_true")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **opts):
+        alias = opts["database"]
+        conn = connections[alias]
+        if conn.vendor != "postgresql":
+            raise CommandError("Range-режим доступен только на PostgreSQL.")
+
+        statements = self._enable_sql() if opts["enable"] else self._disable_sql()
+        with transaction.atomic(using=alias), conn.cursor() as cur:
+            for sql in statements:
+                self.stdout.write(sql)
+                cur.execute(sql)
+
+        # qs_overlaps кеширует результат автоопределения; другие процессы увидят его через TTL
+        reset_range_detection()
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово. Запущенные воркеры переключатся в течение {RANGE_DETECT_TTL:.0f} сек."
+        ))
+
+    def _enable_sql(self):
+        sql = ["CREATE EXTENSION IF NOT EXISTS btree_gist"]
+        for table, where in _targets():
+            sql.append(
+                f"CREATE INDEX IF NOT EXISTS {table}{RANGE_INDEX_SUFFIX} "
+                f"ON {table} USING gist (car_id, {PERIOD_EXPR})"
+            )
+            sql.append(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_no_overlap")
+            sql.append(
+                f"ALTER TABLE {table} ADD CONSTRAINT {table}_no_overlap "
+                f"EXCLUDE USING gist (car_id WITH =, {PERIOD_EXPR} WITH &&) WHERE ({where})"
+            )
+        return sql
+
+    def _disable_sql(self):
+        sql = []
+        for table, _where in _targets():
+            sql.append(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_no_overlap")
+            sql.append(f"DROP INDEX IF EXISTS {table}{RANGE_INDEX_SUFFIX}")
+        return sql
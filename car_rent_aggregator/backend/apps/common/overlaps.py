@@ -1,12 +1,100 @@
 # apps/common/overlaps.py
-from django.db.models import Q
+import functools
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q, Func, Value
 from django.utils import timezone
 
+# Таблицы, для которых `manage.py pg_ranges --enable` создаёт GiST-индекс
+# по tstzrange(date_from, date_to, '[)') и EXCLUDE-ограничение.
+RANGE_INDEX_SUFFIX = "_period_gist"
+
+# Автоопределение перепроверяется раз в RANGE_DETECT_TTL секунд: воркеры gunicorn
+# подхватят `pg_ranges --enable/--disable` без перезапуска.
+RANGE_DETECT_TTL = 60.0
+_range_detect_cache: dict[str, tuple[bool, float]] = {}
+
+
+def _range_mode_setting():
+    """None — автоопределение, True/False — принудительно."""
+    return getattr(settings, "OVERLAPS_RANGE_MODE", None)
+
+
+def _has_range_indexes(alias: str) -> bool:
+    """
+    Есть ли в БД GiST-индексы, созданные командой pg_ranges. Ответ кешируется
+    на RANGE_DETECT_TTL; ошибка БД не кешируется — до следующего вызова считаем False.
+    """
+    cached = _range_detect_cache.get(alias)
+    now = time.monotonic()
+    if cached and cached[1] > now:
+        return cached[0]
+    try:
+        with connections[alias].cursor() as cur:
+            # "_" в LIKE — любой символ, экранируем
+            cur.execute(
+                "SELECT 1 FROM pg_indexes WHERE indexname LIKE %s LIMIT 1",
+                ["%" + RANGE_INDEX_SUFFIX.replace("_", "\\_")],
+            )
+            found = cur.fetchone() is not None
+    except Exception:
+        _range_detect_cache.pop(alias, None)
+        return False
+    _range_detect_cache[alias] = (found, now + RANGE_DETECT_TTL)
+    return found
+
+
+def reset_range_detection():
+    """Сбросить кеш автоопределения (после pg_ranges в этом процессе)."""
+    _range_detect_cache.clear()
+
+
+def range_overlaps_enabled(alias: str = "default") -> bool:
+    """
+    Используем ли оператор && по tstzrange вместо пары сравнений.
+    Только PostgreSQL; по умолчанию — если индексы pg_ranges уже созданы.
+    """
+    if connections[alias].vendor != "postgresql":
+        return False
+    mode = _range_mode_setting()
+    if mode is not None:
+        return bool(mode)
+    return _has_range_indexes(alias)
+
+
+@functools.lru_cache(maxsize=1)
+def _tstzrange_func():
+    # импорт только под PostgreSQL: contrib.postgres требует psycopg
+    from django.contrib.postgres.fields import DateTimeRangeField
+
+    class TsTzRange(Func):
+        function = "TSTZRANGE"
+        output_field = DateTimeRangeField()
+
+    return TsTzRange
+
+
+def tstzrange(lower, upper):
+    """Выражение tstzrange(lower, upper, '[)') — ровно то, по которому построен GiST-индекс."""
+    return _tstzrange_func()(lower, upper, Value("[)"))
+
+
 def qs_overlaps(qs, start, end, field_from="date_from", field_to="date_to"):
     """
     Фильтр пересечений по [start, end). Если end <= start — пусть валидатор модели ловит.
     Условие пересечения: (start < date_to) AND (end > date_from)
+
+    На PostgreSQL с включённым range-режимом то же условие записывается как
+    tstzrange(date_from, date_to, '[)') && tstzrange(start, end, '[)'),
+    что обслуживается GiST-индексом.
     """
+    if range_overlaps_enabled(qs.db):
+        return qs.alias(
+            _period=tstzrange(field_from, field_to),
+        ).filter(_period__overlap=tstzrange(Value(start), Value(end)))
+
     return qs.filter(
         Q(**{f"{field_from}__lt": end}) &
         Q(**{f"{field_to}__gt": start})
@@ -0,0 +1,63 @@
+# apps/common/pricing.py
+"""
+Единый расчёт стоимости аренды.
+
+Правило: сутки аренды — календарные даты от date_from (включительно) до date_to
+(исключая), в локальном часовом поясе. Будни -> price_weekday,
+СБ/ВС -> price_weekend (если не задана — берём weekday).
+
+Количество будних/выходных дней считается в закрытой форме за O(1):
+полные недели дают 5/2, остаток — по смещению первого дня недели.
+Тот же алгоритм продублирован в bots/shared/pricing.py (боты не импортируют Django).
+"""
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+CENT = Decimal("0.01")
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            return timezone.localtime(value).date()
+        return value.date()
+    return value
+
+
+def _weekends_before(x: int) -> int:
+    """Сколько СБ/ВС среди дней 0..x-1, если день 0 — понедельник."""
+    return (x // 7) * 2 + max(0, x % 7 - 5)
+
+
+def count_days(start, end) -> tuple[int, int]:
+    """(будних, выходных) суток аренды в [start, end)."""
+    d0 = _as_date(start)
+    n = max((_as_date(end) - d0).days, 0)
+    w0 = d0.weekday()
+    weekends = _weekends_before(w0 + n) - _weekends_before(w0)
+    return n - weekends, weekends
+
+
+def _to_decimal(value) -> Decimal:
+    if value in (None, ""):
+        return Decimal("0")
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def quote_for_counts(counts: tuple[int, int], price_weekday, price_weekend=None) -> Decimal:
+    weekdays, weekends = counts
+    pw = _to_decimal(price_weekday)
+    we = _to_decimal(price_weekend) or pw
+    return (pw * weekdays + we * weekends).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def quote(start, end, price_weekday, price_weekend=None) -> Decimal:
+    """Стоимость аренды одной машины за [start, end)."""
+    return quote_for_counts(count_days(start, end), price_weekday, price_weekend)
+
+
+def commission(total, percent) -> Decimal:
+    """Комиссия агрегатора с суммы total при ставке percent (%)."""
+    return (_to_decimal(total) * _to_decimal(percent) / Decimal("100")).quantize(CENT, rounding=ROUND_HALF_UP)
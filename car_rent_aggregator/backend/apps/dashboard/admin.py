@@ -1,2 +1,11 @@
 from django.contrib import admin
 
+from .models import ReportJob
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "created_at", "started_at", "finished_at", "requested_by", "file")
+    list_filter = ("status",)
+    readonly_fields = ("key", "params_key", "params", "file", "error", "requested_by",
+                       "created_at", "started_at", "finished_at")
@@ -0,0 +1,149 @@
+# apps/dashboard/jobs.py
+"""
+Фоновое формирование XLSX-отчётов.
+
+Админка только ставит задание (ReportJob) и отдаёт готовый файл,
+сам файл собирает отдельный процесс: `manage.py run_report_worker`.
+
+Ключ задания = параметры отчёта + версия данных (число броней выборки
+и максимальный updated_at). Новая/изменённая бронь меняет версию —
+следующий запрос поставит новое задание, старые файлы удаляются после
+готовности нового.
+"""
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from apps.common.choices import ReportJobStatus
+from apps.dashboard.models import ReportJob
+from apps.dashboard.utils import base_queryset, write_excel
+
+log = logging.getLogger(__name__)
+
+
+def export_params(date_from, date_to, partner_id=None, region_id=None) -> dict:
+    """Параметры отчёта в JSON-виде (для ReportJob.params)."""
+    return {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "partner_id": int(partner_id) if partner_id else None,
+        "region_id": int(region_id) if region_id else None,
+    }
+
+
+def queryset_for(params: dict):
+    return base_queryset(
+        datetime.fromisoformat(params["date_from"]),
+        datetime.fromisoformat(params["date_to"]),
+        partner_id=params["partner_id"],
+        region_id=params["region_id"],
+    )
+
+
+def data_version(qs) -> str:
+    """Версия данных выборки: одним агрегатом, без чтения строк."""
+    agg = qs.order_by().aggregate(n=Count("id"), last=Max("updated_at"))
+    last = agg["last"].isoformat() if agg["last"] else "-"
+    return f"{agg['n']}:{last}"
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def request_report(params: dict, user=None, retry: bool = False) -> ReportJob:
+    """
+    Найти задание под текущую версию данных или поставить новое.
+    Упавшее задание возвращается как есть (страница ожидания покажет ошибку);
+    в очередь заново — только по явному retry, иначе автообновление страницы
+    перезапускало бы заведомо падающий отчёт каждые несколько секунд.
+    """
+    params_key = _digest("xlsx", params["date_from"], params["date_to"],
+                         params["partner_id"], params["region_id"])
+    key = _digest(params_key, data_version(queryset_for(params)))
+
+    job = ReportJob.objects.filter(key=key).first()
+    if job is None:
+        try:
+            with transaction.atomic():
+                job = ReportJob.objects.create(
+                    key=key,
+                    params_key=params_key,
+                    params=params,
+                    requested_by=user if getattr(user, "is_authenticated", False) else None,
+                )
+        except IntegrityError:
+            # параллельный запрос успел создать то же задание
+            job = ReportJob.objects.get(key=key)
+    elif retry and job.status == ReportJobStatus.FAILED:
+        ReportJob.objects.filter(pk=job.pk, status=ReportJobStatus.FAILED).update(
+            status=ReportJobStatus.PENDING, error="", started_at=None, finished_at=None,
+        )
+        job.refresh_from_db()
+    return job
+
+
+def claim_next(stale_minutes: int = 30) -> ReportJob | None:
+    """
+    Забрать одно задание из очереди (SELECT ... FOR UPDATE SKIP LOCKED —
+    несколько воркеров не возьмут одно и то же). Зависшие в running дольше
+    stale_minutes считаются брошенными и берутся повторно.
+    """
+    stale = timezone.now() - timedelta(minutes=stale_minutes)
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[ReportJobStatus.PENDING, ReportJobStatus.RUNNING])
+            .exclude(status=ReportJobStatus.RUNNING, started_at__gte=stale)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJobStatus.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+    return job
+
+
+def run_job(job: ReportJob) -> None:
+    """Сформировать файл задания в MEDIA_ROOT/reports/ и убрать устаревшие версии."""
+    params = job.params
+    try:
+        with tempfile.TemporaryFile(suffix=".xlsx") as tmp:
+            write_excel(
+                queryset_for(params),
+                datetime.fromisoformat(params["date_from"]),
+                datetime.fromisoformat(params["date_to"]),
+                tmp,
+            )
+            tmp.seek(0)
+            job.file.save(f"{job.key}.xlsx", File(tmp), save=False)
+    except Exception as e:
+        log.exception("Report job #%s failed", job.pk)
+        job.status = ReportJobStatus.FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+        return
+
+    job.status = ReportJobStatus.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["file", "status", "finished_at"])
+
+    # только завершённые задания, созданные раньше этого: более новые (под свежую
+    # версию данных) могут ещё ждать воркера, их id уже отдан клиенту
+    for old in ReportJob.objects.filter(
+        params_key=job.params_key,
+        status__in=[ReportJobStatus.DONE, ReportJobStatus.FAILED],
+        created_at__lt=job.created_at,
+    ).exclude(pk=job.pk):
+        if old.file:
+            old.file.delete(save=False)
+        old.delete()
@@ -0,0 +1,151 @@
+# apps/dashboard/management/commands/bench_reports.py
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.bookings.admin import _calc_total_sum, _calc_commission, _calc_partner_net
+from apps.bookings.models import Booking
+from apps.cars.models import Car
+from apps.common.choices import BookingStatus, CarClass, Gearbox, PaymentMarker
+from apps.dashboard.utils import base_queryset, calc_stats
+from apps.partners.models import Partner
+from apps.users.models import BotUser
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_calc_stats(qs):
+    """Прежний calc_stats: обход всех броней в Python и рейтинги через dict."""
+    totals = {
+        "total_bookings": qs.count(),
+        "total_turnover": Decimal("0"),
+        "total_paid": Decimal("0"),
+        "total_commission": Decimal("0"),
+        "total_partner_net": Decimal("0"),
+    }
+    by_car, by_partner = {}, {}
+    for b in qs:
+        sum_total = _calc_total_sum(b)
+        totals["total_turnover"] += sum_total
+        totals["total_commission"] += _calc_commission(b, sum_total)
+        totals["total_partner_net"] += _calc_partner_net(b, sum_total)
+        if b.payment_marker == PaymentMarker.PAID:
+            totals["total_paid"] += sum_total
+        by_car[b.car.title] = by_car.get(b.car.title, Decimal("0")) + sum_total
+        by_partner[b.partner.name] = by_partner.get(b.partner.name, Decimal("0")) + sum_total
+    totals["top_cars_raw"] = sorted(by_car.items(), key=lambda x: x[1], reverse=True)[:5]
+    totals["top_partners_raw"] = sorted(by_partner.items(), key=lambda x: x[1], reverse=True)[:5]
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк calc_stats дашборда: обход броней в Python против SUM/GROUP BY/ROW_NUMBER в БД. "
+        "Данные создаются во временной транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, nargs="+", default=[1_000, 10_000, 50_000],
+                            help="Число подтверждённых броней за период")
+        parser.add_argument("--partners", type=int, default=20)
+        parser.add_argument("--cars", type=int, default=300)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        self.stdout.write(
+            f"{'bookings':>8} | {'legacy, ms':>11} | {'queries':>7} | {'sql, ms':>9} | {'queries':>7}"
+        )
+        for count in opts["bookings"]:
+            try:
+                with transaction.atomic():
+                    result = self._run_one(rnd, count, opts)
+                    raise _Rollback
+            except _Rollback:
+                pass
+            self.stdout.write(
+                f"{count:>8} | {result[0]:>11.2f} | {result[1]:>7} | {result[2]:>9.2f} | {result[3]:>7}"
+            )
+
+    def _seed(self, rnd, count, opts):
+        partners = Partner.objects.bulk_create([
+            Partner(name=f"bench-partner-{i}", commission_percent=Decimal(rnd.choice([5, 10, 15])))
+            for i in range(opts["partners"])
+        ])
+        cars = Car.objects.bulk_create([
+            Car(
+                partner=rnd.choice(partners),
+                title=f"Bench car {i}",
+                year=2020,
+                car_class=rnd.choice(CarClass.values),
+                gearbox=rnd.choice(Gearbox.values),
+                price_weekday=Decimal("300000"),
+                # у части машин цена выходных не задана — считается по будням
+                price_weekend=rnd.choice([Decimal("350000"), Decimal("0")]),
+            )
+            for i in range(opts["cars"])
+        ])
+        client = BotUser.objects.create(tg_user_id=-rnd.randint(1, 10**9))
+
+        now = timezone.now()
+        batch = []
+        for _ in range(count):
+            car = rnd.choice(cars)
+            start = now - timedelta(days=rnd.randint(1, 360))
+            b = Booking(
+                car=car,
+                partner=car.partner,
+                client=client,
+                client_phone="+998900000000",
+                date_from=start,
+                date_to=start + timedelta(days=rnd.randint(1, 7)),
+                price_quote=Decimal("0"),
+                status=rnd.choice([BookingStatus.CONFIRMED, BookingStatus.ISSUED, BookingStatus.COMPLETED]),
+                payment_marker=rnd.choice(PaymentMarker.values),
+            )
+            b.apply_pricing()
+            if rnd.random() < 0.3:
+                # бронь до backfill_booking_pricing: разбивки нет, а price_quote
+                # (цена на момент заявки) расходится с пересчётом по ценам машины
+                b.price_quote = b.total_amount + Decimal(rnd.randint(-50, 50) * 1000)
+                for field in Booking.PRICING_FIELDS:
+                    setattr(b, field, None)
+            else:
+                b.price_quote = b.total_amount
+            batch.append(b)
+            if len(batch) >= 5_000:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Booking.objects.bulk_create(batch)
+        return now
+
+    def _measure(self, fn, qs, repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                result = fn(qs)
+            elapsed = (time.perf_counter() - t0) * 1000 / repeat
+        return result, elapsed, len(ctx.captured_queries) // repeat
+
+    def _run_one(self, rnd, count, opts):
+        now = self._seed(rnd, count, opts)
+        qs = base_queryset(now - timedelta(days=365), now)
+
+        legacy, legacy_ms, legacy_q = self._measure(legacy_calc_stats, qs, opts["repeat"])
+        stats, sql_ms, sql_q = self._measure(calc_stats, qs, opts["repeat"])
+
+        keys = ("total_bookings", "total_turnover", "total_paid", "total_commission", "total_partner_net")
+        if any(legacy[k] != stats[k] for k in keys) or \
+                [s for _, s in legacy["top_cars_raw"]] != [s for _, s in stats["top_cars_raw"]]:
+            self.stderr.write(self.style.ERROR(f"bookings={count}: результаты расходятся!"))
+        return legacy_ms, legacy_q, sql_ms, sql_q
@@ -0,0 +1,48 @@
+# apps/dashboard/management/commands/run_report_worker.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.dashboard import jobs
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновых отчётов дашборда: забирает ReportJob из очереди и пишет файлы в MEDIA_ROOT/reports/."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Обработать очередь и выйти")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Пауза при пустой очереди, сек")
+        parser.add_argument("--stale-minutes", type=int, default=30,
+                            help="Через сколько минут задание в running считается брошенным")
+
+    def handle(self, *args, **opts):
+        self.stdout.write("Report worker started")
+        while True:
+            close_old_connections()
+            try:
+                job = jobs.claim_next(stale_minutes=opts["stale_minutes"])
+            except Exception as e:
+                # обрыв соединения с БД и т.п. — не роняем воркер, очередь не встанет
+                self.stderr.write(f"claim failed: {e!r}")
+                if opts["once"]:
+                    break
+                time.sleep(opts["sleep"])
+                continue
+            if job is None:
+                if opts["once"]:
+                    break
+                time.sleep(opts["sleep"])
+                continue
+
+            started = time.perf_counter()
+            try:
+                jobs.run_job(job)
+            except Exception as e:
+                # задание останется в running и будет взято заново через --stale-minutes
+                self.stderr.write(f"job #{job.pk} failed: {e!r}")
+                time.sleep(opts["sleep"])
+                continue
+            self.stdout.write(
+                f"job #{job.pk}: {job.status} in {time.perf_counter() - started:.1f}s"
+            )
@@ -1,3 +1,51 @@
+# apps/dashboard/models.py
+from django.conf import settings
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+from apps.common.choices import ReportJobStatus
+
+
+class ReportJob(models.Model):
+    """
+    Задание на формирование файла отчёта.
+    Ставится из админки, выполняется командой run_report_worker.
+    key = параметры отчёта + версия данных: пока брони не менялись,
+    повторный запрос получает уже готовый файл.
+    """
+    key = models.CharField(_("Ключ"), max_length=64, unique=True)
+    params_key = models.CharField(
+        _("Ключ параметров"),
+        max_length=64,
+        db_index=True,
+        help_text=_("Те же параметры без версии данных — чтобы удалять устаревшие файлы"),
+    )
+    params = models.JSONField(_("Параметры"), default=dict)
+    status = models.CharField(
+        _("Статус"),
+        max_length=10,
+        choices=ReportJobStatus.choices,
+        default=ReportJobStatus.PENDING,
+        db_index=True,
+    )
+    file = models.FileField(_("Файл"), upload_to="reports/", blank=True, null=True)
+    error = models.TextField(_("Ошибка"), blank=True, default="")
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name=_("Кто запросил"),
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+
+    created_at = models.DateTimeField(_("Создано"), auto_now_add=True)
+    started_at = models.DateTimeField(_("Начато"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("Готово"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Задание отчёта")
+        verbose_name_plural = _("Задания отчётов")
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"#{self.pk} {self.params.get('date_from', '')}→{self.params.get('date_to', '')} ({self.get_status_display()})"
@@ -0,0 +1,138 @@
+# apps/dashboard/reports.py
+"""
+Запросы отчётов дашборда.
+
+Все суммы считаются в БД по зафиксированной в брони разбивке
+(Booking.total_amount / commission_amount / partner_net, см. apply_pricing).
+Питон получает только итоговые числа и по N строк рейтингов.
+"""
+from decimal import Decimal
+
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, Func, IntegerField, Max, Q, Sum, Value, When, Window,
+)
+from django.db.models.functions import (
+    Cast, Coalesce, ExtractIsoWeekDay, Greatest, Length, Mod, NullIf, Round, RowNumber, TruncDate,
+)
+
+from apps.common.choices import PaymentMarker
+
+TOP_N = 5
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal("0"), output_field=MONEY)
+
+# Старые брони без зафиксированной разбивки (до backfill_booking_pricing)
+# досчитываем в SQL тем же правилом, что apps.common.pricing.quote() и
+# _calc_total_sum() в админке: сутки — локальные даты [date_from, date_to),
+# СБ/ВС по price_weekend (если не задана — по price_weekday), число выходных —
+# в закрытой форме, как pricing.count_days(). price_quote — только для брони
+# с пустым периодом. Поэтому итоги одинаковы до и после backfill.
+INT = IntegerField()
+
+
+def _weekends_before(x):
+    """SQL-версия pricing._weekends_before: СБ/ВС среди дней 0..x-1 (день 0 — понедельник)."""
+    return ExpressionWrapper(x / 7 * 2 + Greatest(Mod(x, 7, output_field=INT) - 5, 0), output_field=INT)
+
+
+_DAY0 = TruncDate("date_from")  # дата в TIME_ZONE, как pricing._as_date()
+_DAYS = Greatest(
+    Func(TruncDate("date_to"), _DAY0, template="(%(expressions)s)", arg_joiner=" - ", output_field=INT),
+    0,
+)
+# EXTRACT в PostgreSQL 14+ отдаёт numeric — приводим, чтобы "/ 7" было целочисленным
+_WEEKDAY0 = ExpressionWrapper(Cast(ExtractIsoWeekDay(_DAY0), INT) - 1, output_field=INT)
+_WEEKENDS = ExpressionWrapper(
+    _weekends_before(_WEEKDAY0 + _DAYS) - _weekends_before(_WEEKDAY0), output_field=INT,
+)
+_PRICE_WD = Coalesce("car__price_weekday", ZERO, output_field=MONEY)
+_PRICE_WE = Coalesce(NullIf("car__price_weekend", ZERO), _PRICE_WD, output_field=MONEY)
+QUOTE = Round(
+    ExpressionWrapper(_PRICE_WD * (_DAYS - _WEEKENDS) + _PRICE_WE * _WEEKENDS, output_field=MONEY),
+    precision=2,
+)
+
+TOTAL = Coalesce(
+    "total_amount",
+    Case(
+        When(date_to__gt=F("date_from"), then=QUOTE),
+        default=Coalesce("price_quote", ZERO, output_field=MONEY),
+        output_field=MONEY,
+    ),
+    output_field=MONEY,
+)
+COMMISSION = Coalesce(
+    "commission_amount",
+    Round(
+        ExpressionWrapper(
+            TOTAL * Coalesce("partner__commission_percent", ZERO) / Value(Decimal("100")),
+            output_field=MONEY,
+        ),
+        precision=2,
+    ),
+    output_field=MONEY,
+)
+NET = Coalesce("partner_net", ExpressionWrapper(TOTAL - COMMISSION, output_field=MONEY), output_field=MONEY)
+
+
+def kpi_totals(qs) -> dict:
+    """Один SELECT: число броней, оборот, оплачено, комиссия, чистыми партнёрам."""
+    return qs.order_by().aggregate(
+        total_bookings=Count("id"),
+        total_turnover=Coalesce(Sum(TOTAL), ZERO),
+        total_paid=Coalesce(Sum(TOTAL, filter=Q(payment_marker=PaymentMarker.PAID)), ZERO),
+        total_commission=Coalesce(Sum(COMMISSION), ZERO),
+        total_partner_net=Coalesce(Sum(NET), ZERO),
+    )
+
+
+def top_by_turnover(qs, name_field: str, n: int = TOP_N) -> list[tuple[str, Decimal]]:
+    """
+    Топ-N по обороту, сгруппированный по name_field (например "car__title").
+    GROUP BY + ROW_NUMBER() OVER (ORDER BY SUM(...) DESC) — отсечение по рангу в БД.
+    """
+    rows = (
+        qs.order_by()
+        .values(name_field)
+        .annotate(
+            turnover=Sum(TOTAL),
+            place=Window(RowNumber(), order_by=[F("turnover").desc(), F(name_field).asc()]),
+        )
+        .filter(place__lte=n)
+        .order_by("place")
+    )
+    return [(r[name_field] or "—", r["turnover"] or Decimal("0")) for r in rows]
+
+
+# ---------- Выгрузка ----------
+
+EXPORT_FIELDS = (
+    "id", "date_from", "date_to", "car__title", "car__region__name", "partner__name",
+    "status", "export_total", "export_commission", "export_net", "payment_marker",
+)
+# текстовые колонки, ширину которых считаем через MAX(LENGTH(...))
+EXPORT_TEXT_FIELDS = ("car__title", "car__region__name", "partner__name")
+
+
+def export_rows(qs, chunk_size: int = 2000):
+    """
+    Строки выгрузки в порядке EXPORT_FIELDS — кортежами, серверным курсором,
+    без создания экземпляров моделей.
+    """
+    return (
+        qs.order_by("date_from", "id")
+        .annotate(
+            export_total=TOTAL,
+            export_commission=COMMISSION,
+            export_net=NET,
+        )
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def export_text_widths(qs) -> dict[str, int]:
+    """Максимальная длина значения в текстовых колонках — одним запросом."""
+    agg = qs.order_by().aggregate(**{f"w{i}": Max(Length(f)) for i, f in enumerate(EXPORT_TEXT_FIELDS)})
+    return {f: agg[f"w{i}"] or 0 for i, f in enumerate(EXPORT_TEXT_FIELDS)}
@@ -1,16 +1,16 @@
 # apps/dashboard/utils.py
+import csv
 from datetime import datetime, timedelta
-from decimal import Decimal
 
-from django.utils.timezone import make_aware, now
+from django.utils.timezone import localtime, make_aware, now
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
-from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill, Border, Side
 
 from apps.bookings.models import Booking
 from apps.common.choices import BookingStatus, PaymentMarker
-from apps.bookings.admin import _calc_total_sum, _calc_commission, _calc_partner_net
+from apps.dashboard import reports
 
 
 def parse_period(request):
@@ -80,7 +80,8 @@ def base_queryset(date_from, date_to, partner_id=None, region_id=None):
 
 def calc_stats(qs):
     """
-    Считаем KPI + строим данные для двух рейтингов:
+    Считаем KPI + строим данные для двух рейтингов.
+    Всё считается в БД (см. apps.dashboard.reports), в Python — только итог:
     - Топ авто по обороту
     - Топ партнёров по обороту
 
@@ -92,36 +93,9 @@ def calc_stats(qs):
       chart_labels / chart_values            -> машины
       partners_chart_labels / partners_chart_values -> партнёры
     """
-    total_bookings = qs.count()
-
-    total_turnover = Decimal("0")
-    total_paid = Decimal("0")
-    total_commission = Decimal("0")
-    total_partner_net = Decimal("0")
-
-    by_car = {}
-    by_partner = {}
-
-    for b in qs:
-        sum_total = Decimal(str(_calc_total_sum(b)))
-        sum_comm = Decimal(str(_calc_commission(b)))
-        sum_net = Decimal(str(_calc_partner_net(b)))
-
-        total_turnover += sum_total
-        total_commission += sum_comm
-        total_partner_net += sum_net
-
-        if b.payment_marker == PaymentMarker.PAID:
-            total_paid += sum_total
-
-        car_name = b.car.title if b.car else "—"
-        by_car[car_name] = by_car.get(car_name, Decimal("0")) + sum_total
-
-        partner_name = b.partner.name if b.partner else "—"
-        by_partner[partner_name] = by_partner.get(partner_name, Decimal("0")) + sum_total
-
-    top_cars_items = sorted(by_car.items(), key=lambda x: x[1], reverse=True)[:5]
-    top_partners_items = sorted(by_partner.items(), key=lambda x: x[1], reverse=True)[:5]
+    totals = reports.kpi_totals(qs)
+    top_cars_items = reports.top_by_turnover(qs, "car__title")
+    top_partners_items = reports.top_by_turnover(qs, "partner__name")
 
     cars_labels = [name for (name, _sum) in top_cars_items]
     cars_values = [float(_sum) for (_, _sum) in top_cars_items]
@@ -130,11 +104,7 @@ def calc_stats(qs):
     partners_values = [float(_sum) for (_, _sum) in top_partners_items]
 
     return {
-        "total_bookings": total_bookings,
-        "total_turnover": total_turnover,
-        "total_paid": total_paid,
-        "total_commission": total_commission,
-        "total_partner_net": total_partner_net,
+        **totals,
         "top_cars_raw": top_cars_items,
         "top_partners_raw": top_partners_items,
         "chart_labels": cars_labels,
@@ -144,7 +114,7 @@ def calc_stats(qs):
     }
 
 
-# ---------- XLSX helpers ----------
+# ---------- XLSX / CSV helpers ----------
 
 _THIN = Side(border_style="thin", color="D9D9D9")
 BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
@@ -152,109 +122,138 @@ HEAD_FILL = PatternFill("solid", fgColor="F2F4F7")
 HEAD_FONT = Font(bold=True)
 CENTER = Alignment(horizontal="center", vertical="center")
 LEFT = Alignment(horizontal="left", vertical="center")
+MONEY_FORMAT = "#,##0"  # openpyxl применит формат локально в Excel
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+REPORT_HEADERS = [
+    "Booking ID",
+    "Дата с",
+    "Дата по",
+    "Машина",
+    "Регион",
+    "Партнёр",
+    "Статус",
+    "Сумма аренды (UZS)",
+    "Комиссия агрегатора (UZS)",
+    "Чистыми партнёру (UZS)",
+    "Оплата",
+]
+MONEY_COLUMNS = (7, 8, 9)  # индексы в строке (0-based)
+
+_STATUS_LABELS = dict(BookingStatus.choices)
+
+
+def _named_styles():
+    """
+    Именованные стили: в файле хранится по одному экземпляру,
+    ячейки ссылаются на них по имени — без копии стиля на каждую ячейку.
+    """
+    head = NamedStyle(name="report_head", font=HEAD_FONT, fill=HEAD_FILL, alignment=CENTER, border=BORDER)
+    cell = NamedStyle(name="report_cell", alignment=LEFT, border=BORDER)
+    cell_id = NamedStyle(name="report_id", alignment=CENTER, border=BORDER)
+    money = NamedStyle(name="report_money", alignment=LEFT, border=BORDER, number_format=MONEY_FORMAT)
+    return head, cell, cell_id, money
+
+
+def _report_row(values) -> list:
+    """Кортеж из reports.export_rows -> строка отчёта (порядок REPORT_HEADERS)."""
+    (bid, df, dt, car, region, partner, status, total, commission, net, marker) = values
+    return [
+        bid,
+        localtime(df).strftime(DATE_FORMAT),
+        localtime(dt).strftime(DATE_FORMAT),
+        car or "",
+        region or "",
+        partner or "",
+        str(_STATUS_LABELS.get(status, status)),
+        float(total),   # как число
+        float(commission),
+        float(net),
+        "Оплачено" if marker == PaymentMarker.PAID else "Не оплачено",
+    ]
 
 
-def _auto_width(ws: Worksheet, cols: int):
-    for col_idx in range(1, cols + 1):
-        col_letter = get_column_letter(col_idx)
-        max_len = 0
-        for cell in ws[col_letter]:
-            try:
-                v = str(cell.value) if cell.value is not None else ""
-            except Exception:
-                v = ""
-            max_len = max(max_len, len(v))
-        ws.column_dimensions[col_letter].width = min(max(12, max_len + 2), 40)
+def _column_widths(qs) -> list[int]:
+    """
+    Ширины колонок. В write_only-режиме они пишутся в файл до первой строки,
+    поэтому считаем их заранее: заголовок, фиксированная ширина дат/сумм
+    и MAX(LENGTH(...)) текстовых колонок из БД.
+    """
+    text = reports.export_text_widths(qs)
+    known = {
+        1: len("2025-01-01 00:00"),
+        2: len("2025-01-01 00:00"),
+        3: text["car__title"],
+        4: text["car__region__name"],
+        5: text["partner__name"],
+        6: max((len(str(label)) for label in _STATUS_LABELS.values()), default=0),
+        7: 14, 8: 14, 9: 14,
+        10: len("Не оплачено"),
+    }
+    return [
+        min(max(12, len(h) + 2, known.get(idx, 0) + 2), 40)
+        for idx, h in enumerate(REPORT_HEADERS)
+    ]
 
 
-def build_excel(qs, date_from, date_to):
+def write_excel(qs, date_from, date_to, fileobj):
     """
-    Готовим .xlsx отчёт (1 лист):
+    Пишет .xlsx отчёт (1 лист) в fileobj потоково:
     - Заголовок
     - Период
     - Таблица детальности
+    Лист в режиме write_only — строки сразу уходят в файл, память не растёт с периодом.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Report"
-
-    # 1) Шапка
-    title = "Отчёт по бронированиям"
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=11)
-    c = ws.cell(row=1, column=1, value=title)
-    c.font = Font(size=14, bold=True)
-    c.alignment = CENTER
-
-    # 2) Период
-    period_text = f"Период: {date_from.strftime('%Y-%m-%d')} \u2192 {date_to.strftime('%Y-%m-%d')}"
-    ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=11)
-    c2 = ws.cell(row=2, column=1, value=period_text)
-    c2.alignment = CENTER
-    c2.font = Font(color="666666")
-
-    ws.append([])  # пустая строка после шапки (это станет строкой 3)
-
-    # 3) Заголовки таблицы
-    headers = [
-        "Booking ID",
-        "Дата с",
-        "Дата по",
-        "Машина",
-        "Регион",
-        "Партнёр",
-        "Статус",
-        "Сумма аренды (UZS)",
-        "Комиссия агрегатора (UZS)",
-        "Чистыми партнёру (UZS)",
-        "Оплата",
-    ]
-    ws.append(headers)
-
-    # применяем стиль к заголовкам
-    head_row = 4
-    for col_idx in range(1, len(headers) + 1):
-        cell = ws.cell(row=head_row, column=col_idx)
-        cell.font = HEAD_FONT
-        cell.fill = HEAD_FILL
-        cell.alignment = CENTER
-        cell.border = BORDER
-
-    # 4) Данные
-    money_format = "#,##0"  # openpyxl применит формат локально в Excel
-    for b in qs:
-        region_name = b.car.region.name if (b.car and b.car.region) else ""
-        total_sum = _calc_total_sum(b)
-        commission = _calc_commission(b)
-        partner_net = _calc_partner_net(b)
-
-        row = [
-            b.id,
-            b.date_from.strftime("%Y-%m-%d %H:%M"),
-            b.date_to.strftime("%Y-%m-%d %H:%M"),
-            b.car.title if b.car else "",
-            region_name,
-            b.partner.name if b.partner else "",
-            b.get_status_display(),
-            float(total_sum),   # как число
-            float(commission),  # как число
-            float(partner_net), # как число
-            "Оплачено" if b.payment_marker == PaymentMarker.PAID else "Не оплачено",
-        ]
-        ws.append(row)
-
-        # стили для только что добавленной строки
-        r = ws.max_row
-        for col_idx in range(1, len(headers) + 1):
-            cell = ws.cell(row=r, column=col_idx)
-            cell.alignment = LEFT if col_idx not in (1,) else CENTER
-            cell.border = BORDER
-
-        # числовой формат для сумм
-        ws.cell(row=r, column=8).number_format = money_format
-        ws.cell(row=r, column=9).number_format = money_format
-        ws.cell(row=r, column=10).number_format = money_format
-
-    # автоширина
-    _auto_width(ws, len(headers))
-
-    return wb
+    wb = Workbook(write_only=True)
+    styles = _named_styles()
+    for st in styles:
+        wb.add_named_style(st)
+    head_style, cell_style, id_style, money_style = (st.name for st in styles)
+
+    ws = wb.create_sheet("Report")
+    for idx, width in enumerate(_column_widths(qs), start=1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+
+    def styled(value, style):
+        c = WriteOnlyCell(ws, value=value)
+        c.style = style
+        return c
+
+    # 1) Шапка и период (merge в write_only недоступен — просто первая ячейка)
+    title = WriteOnlyCell(ws, value="Отчёт по бронированиям")
+    title.font = Font(size=14, bold=True)
+    ws.append([title])
+    period = WriteOnlyCell(
+        ws, value=f"Период: {date_from.strftime('%Y-%m-%d')} \u2192 {date_to.strftime('%Y-%m-%d')}"
+    )
+    period.font = Font(color="666666")
+    ws.append([period])
+    ws.append([])
+
+    # 2) Заголовки таблицы
+    ws.append([styled(h, head_style) for h in REPORT_HEADERS])
+
+    # 3) Данные
+    for values in reports.export_rows(qs):
+        row = _report_row(values)
+        ws.append([
+            styled(v, id_style if idx == 0 else money_style if idx in MONEY_COLUMNS else cell_style)
+            for idx, v in enumerate(row)
+        ])
+
+    wb.save(fileobj)
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(qs):
+    """Строки CSV-выгрузки (для StreamingHttpResponse). BOM — чтобы Excel понял UTF-8."""
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(REPORT_HEADERS)
+    for values in reports.export_rows(qs):
+        yield writer.writerow(_report_row(values))
@@ -1,17 +1,23 @@
 # apps/dashboard/views.py
+import tempfile
+
+from django.conf import settings
 from django.views.generic import TemplateView, View
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
-from django.http import HttpResponse, HttpResponseForbidden
-from django.shortcuts import render
+from django.http import FileResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import redirect, render
 
 from apps.cars.models import Region
+from apps.common.choices import ReportJobStatus
+from apps.dashboard import jobs
 from apps.partners.models import Partner, PartnerAdminLink
 from apps.dashboard.utils import (
     parse_period,
     base_queryset,
     calc_stats,
-    build_excel,
+    iter_csv,
+    write_excel,
 )
 
 PARTNER_GROUP = "Partners"
@@ -92,35 +98,96 @@ class DashboardReportView(TemplateView):
         return render(request, self.template_name, context)
 
 
+def _export_filters(request):
+    """
+    Фильтры выгрузки из GET (те же, что у дашборда) с ограничением партнёр-админа.
+    Возвращает (date_from, date_to, partner_id, region_id) или None, если доступа нет.
+    """
+    date_from, date_to = parse_period(request)
+
+    partner_id = request.GET.get("partner")
+    region_id  = request.GET.get("region")
+
+    if _is_partner_admin(request.user):
+        allowed = _user_partner_ids(request.user)
+        if not allowed:
+            return None
+        if partner_id and int(partner_id) not in allowed:
+            partner_id = allowed[0]
+        if not partner_id:
+            partner_id = allowed[0]
+
+    return date_from, date_to, partner_id, region_id
+
+
 @method_decorator(staff_member_required, name="dispatch")
 class DashboardExportExcelView(View):
     """
     /admin/report/export.xlsx
     Выгружает XLSX по тем же фильтрам.
+
+    При REPORTS_ASYNC файл собирает run_report_worker: запрос ставит задание
+    и показывает страницу ожидания (202), которая сама обновляется,
+    пока файл не будет готов. Готовый файл переиспользуется, пока брони не изменились.
+    Упавшее задание показывается с ошибкой и перезапускается только кнопкой (?retry=1).
+    Без REPORTS_ASYNC файл пишется потоково во временный файл прямо в запросе.
     """
-    def get(self, request, *args, **kwargs):
-        date_from, date_to = parse_period(request)
+    pending_template = "dashboard/report_pending.html"
 
-        partner_id = request.GET.get("partner")
-        region_id  = request.GET.get("region")
+    def get(self, request, *args, **kwargs):
+        filters = _export_filters(request)
+        if filters is None:
+            return HttpResponseForbidden("Нет доступа к данным партнёра")
+        date_from, date_to, partner_id, region_id = filters
+        filename = f"report_{date_from.date()}_{date_to.date()}.xlsx"
 
-        if _is_partner_admin(request.user):
-            allowed = _user_partner_ids(request.user)
-            if not allowed:
-                return HttpResponseForbidden("Нет доступа к данным партнёра")
-            if partner_id and int(partner_id) not in allowed:
-                partner_id = allowed[0]
-            if not partner_id:
-                partner_id = allowed[0]
+        if not getattr(settings, "REPORTS_ASYNC", False):
+            qs = base_queryset(date_from, date_to, partner_id=partner_id, region_id=region_id)
+            tmp = tempfile.TemporaryFile(suffix=".xlsx")
+            write_excel(qs, date_from, date_to, tmp)
+            tmp.seek(0)
+            # FileResponse закроет (и тем самым удалит) временный файл после отдачи
+            return self._file_response(tmp, filename)
+
+        params = jobs.export_params(date_from, date_to, partner_id=partner_id, region_id=region_id)
+        if request.GET.get("retry"):
+            # «Повторить» на странице ошибки: перезапускаем задание и уходим
+            # на адрес без retry, чтобы автообновление его не повторяло
+            jobs.request_report(params, user=request.user, retry=True)
+            query = request.GET.copy()
+            query.pop("retry")
+            return redirect(f"{request.path}?{query.urlencode()}")
+        job = jobs.request_report(params, user=request.user)
+        if job.status == ReportJobStatus.DONE and job.file:
+            return self._file_response(job.file.open("rb"), filename)
+
+        return render(request, self.pending_template, {"job": job}, status=202)
+
+    @staticmethod
+    def _file_response(fileobj, filename):
+        return FileResponse(
+            fileobj,
+            as_attachment=True,
+            filename=filename,
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
 
-        qs = base_queryset(date_from, date_to, partner_id=partner_id, region_id=region_id)
-        wb = build_excel(qs, date_from, date_to)
 
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        filename = f"report_{date_from.date()}_{date_to.date()}.xlsx"
-        response["Content-Disposition"] = f'attachment; filename=\"{filename}\"'
+@method_decorator(staff_member_required, name="dispatch")
+class DashboardExportCsvView(View):
+    """
+    /admin/report/export.csv
+    Та же таблица в CSV — для очень больших периодов.
+    Строки отдаются по мере чтения из БД (StreamingHttpResponse).
+    """
+    def get(self, request, *args, **kwargs):
+        filters = _export_filters(request)
+        if filters is None:
+            return HttpResponseForbidden("Нет доступа к данным партнёра")
+        date_from, date_to, partner_id, region_id = filters
 
-        wb.save(response)
+        qs = base_queryset(date_from, date_to, partner_id=partner_id, region_id=region_id)
+        response = StreamingHttpResponse(iter_csv(qs), content_type="text/csv; charset=utf-8")
+        filename = f"report_{date_from.date()}_{date_to.date()}.csv"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
         return response
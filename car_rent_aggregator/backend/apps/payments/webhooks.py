@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import json
 import logging
+from django.db import transaction as db_transaction
 from django.http import HttpRequest
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
@@ -50,11 +51,13 @@ class PaymeWebhookView(PTUBasePaymeView):
             }
             pay.raw_meta = raw
             # Важно: сохраняем только реально существующие поля
-            pay.save(update_fields=["status", "raw_meta"])
+            # платёж, бронь и событие для ботов — одной транзакцией
+            with db_transaction.atomic():
+                pay.save(update_fields=["status", "raw_meta"])
 
-            if pay.booking_id:
-                # метод в Booking, который выставляет оплаченный статус и чистит hold/календарь
-                pay.booking.mark_paid_by_payment(pay)
+                if pay.booking_id:
+                    # метод в Booking, который выставляет оплаченный статус и чистит hold/календарь
+                    pay.booking.mark_paid_by_payment(pay)
         except Payment.DoesNotExist:
             logger.error("Payme: Payment %s not found on success", transaction.account_id)
         except Exception as e:
@@ -72,10 +75,12 @@ class PaymeWebhookView(PTUBasePaymeView):
                 "transaction_id": str(transaction.transaction_id),
             }
             pay.raw_meta = raw
-            pay.save(update_fields=["status", "raw_meta"])
+            # платёж, бронь и событие для ботов — одной транзакцией
+            with db_transaction.atomic():
+                pay.save(update_fields=["status", "raw_meta"])
 
-            if pay.booking_id:
-                pay.booking.mark_payment_failed(pay)
+                if pay.booking_id:
+                    pay.booking.mark_payment_failed(pay)
         except Payment.DoesNotExist:
             logger.error("Payme: Payment %s not found on cancel", transaction.account_id)
         except Exception as e:
@@ -139,10 +144,12 @@ class ClickWebhookView(PTUBaseClickView):
                 "transaction_id": transaction.transaction_id,
             }
             pay.raw_meta = raw
-            pay.save(update_fields=["status", "raw_meta"])
+            # платёж, бронь и событие для ботов — одной транзакцией
+            with db_transaction.atomic():
+                pay.save(update_fields=["status", "raw_meta"])
 
-            if pay.booking_id:
-                pay.booking.mark_paid_by_payment(pay)
+                if pay.booking_id:
+                    pay.booking.mark_paid_by_payment(pay)
         except Exception as e:
             logger.exception("Click successfully_payment handler failed: %s", e)
 
@@ -164,9 +171,11 @@ class ClickWebhookView(PTUBaseClickView):
                 "transaction_id": transaction.transaction_id,
             }
             pay.raw_meta = raw
-            pay.save(update_fields=["status", "raw_meta"])
+            # платёж, бронь и событие для ботов — одной транзакцией
+            with db_transaction.atomic():
+                pay.save(update_fields=["status", "raw_meta"])
 
-            if pay.booking_id:
-                pay.booking.mark_payment_failed(pay)
+                if pay.booking_id:
+                    pay.booking.mark_payment_failed(pay)
         except Exception as e:
             logger.exception("Click cancelled_payment handler failed: %s", e)
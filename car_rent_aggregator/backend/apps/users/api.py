@@ -3,13 +3,16 @@ import base64
 from datetime import date, datetime
 from uuid import uuid4
 
+from django.conf import settings
 from django.core.files.base import ContentFile
 from rest_framework import serializers, views, status
+from rest_framework.parsers import FileUploadParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.utils.translation import gettext_lazy as _
 from apps.common.permissions import BotOnlyPermission
 from .models import BotUser
+from .uploads import BoundedImageUploadHandler, UploadRejected, reencode_image
 
 class BotUserRegisterSerializer(serializers.ModelSerializer):
     birth_date = serializers.DateField(
@@ -127,7 +130,14 @@ class SelfieUpdateSerializer(serializers.Serializer):
     selfie_file_id = serializers.CharField(max_length=200, required=False, allow_blank=True)
     image_b64 = serializers.CharField(required=True)
 
+
+class SelfieUploadSerializer(serializers.Serializer):
+    tg_user_id = serializers.IntegerField()
+    selfie_file_id = serializers.CharField(max_length=200, required=False, allow_blank=True)
+
+
 class SelfieUpdateView(APIView):
+    """Старый путь: фото base64 в JSON. Боты шлют через SelfieUploadView."""
     permission_classes = (BotOnlyPermission,)
 
     def post(self, request):
@@ -155,13 +165,86 @@ class SelfieUpdateView(APIView):
         if selfie_file_id:
             obj.selfie_file_id = selfie_file_id
 
-        # сохраняем файл в ImageField
+        # сохраняем файл в ImageField; file_id старого селфи партнёрскому боту больше не годится
+        obj.selfie_partner_file_id = None
         filename = f"selfie_{tg}_{uuid4().hex}.jpg"
         obj.selfie_image.save(filename, ContentFile(raw), save=True)
 
         return Response({"ok": True})
 
 
+class SelfieUploadView(APIView):
+    """
+    POST /api/users/selfie/upload/?tg_user_id=...&selfie_file_id=...
+
+    Тело — либо multipart (поле file), либо сам файл (Content-Type: image/*,
+    Content-Disposition: attachment; filename=...). Файл идёт чанками во
+    временный файл, размер и тип проверяются по ходу (413/415), в storage
+    сохраняется перекодированный Pillow JPEG.
+    """
+    permission_classes = (BotOnlyPermission,)
+    parser_classes = (MultiPartParser, FileUploadParser)
+
+    def post(self, request):
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        # multipart-обвязка — пара КБ сверху к самому файлу
+        if length > settings.SELFIE_MAX_BYTES + 64 * 1024:
+            return Response({"detail": "file_too_large"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        request.upload_handlers = [BoundedImageUploadHandler(request._request)]
+        try:
+            upload = request.data.get("file")
+            fields = {**request.query_params.dict(), **{k: v for k, v in request.data.items() if k != "file"}}
+        except UploadRejected as e:
+            return Response({"detail": e.detail}, status=e.status)
+
+        if not upload:
+            return Response({"detail": "file_required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ser = SelfieUploadSerializer(data=fields)
+            ser.is_valid(raise_exception=True)
+            content = reencode_image(upload)
+        except UploadRejected as e:
+            return Response({"detail": e.detail}, status=e.status)
+        finally:
+            upload.close()  # временный файл удаляется при закрытии
+
+        tg = ser.validated_data["tg_user_id"]
+        obj, _ = BotUser.objects.get_or_create(tg_user_id=tg)
+        if ser.validated_data.get("selfie_file_id"):
+            obj.selfie_file_id = ser.validated_data["selfie_file_id"]
+        obj.selfie_partner_file_id = None
+        obj.selfie_image.save(f"selfie_{tg}_{uuid4().hex}.jpg", content, save=True)
+        return Response({"ok": True})
+
+
+class SelfiePartnerFileIdSerializer(serializers.Serializer):
+    selfie = serializers.CharField(max_length=255)
+    file_id = serializers.CharField(max_length=200)
+
+
+class SelfiePartnerFileIdView(APIView):
+    """
+    POST /api/users/selfie/file-id/ {"selfie": "<client_selfie_rel>", "file_id": "..."}
+
+    Партнёрский бот сообщает file_id селфи после первой загрузки. Ключ — путь
+    файла: если клиент успел сменить селфи, запись не найдётся и чужой
+    file_id не сохранится.
+    """
+    permission_classes = (BotOnlyPermission,)
+
+    def post(self, request):
+        ser = SelfiePartnerFileIdSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        updated = BotUser.objects.filter(selfie_image=ser.validated_data["selfie"]).update(
+            selfie_partner_file_id=ser.validated_data["file_id"],
+        )
+        return Response({"ok": bool(updated)})
+
+
 class LanguageUpdateSerializer(serializers.Serializer):
     tg_user_id = serializers.IntegerField()
     language = serializers.ChoiceField(choices=[("uz", "uz"), ("ru", "ru"), ("en", "en")])
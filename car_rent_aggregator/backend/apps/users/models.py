@@ -19,6 +19,13 @@ class BotUser(models.Model):
         null=True,
         help_text=_("Сырой file_id фото из Telegram для идентификации клиента")
     )
+    selfie_partner_file_id = models.CharField(
+        _("file_id селфи в партнёрском боте"),
+        max_length=200,
+        blank=True,
+        null=True,
+        help_text=_("file_id, полученный партнёрским ботом при первой отправке селфи; сбрасывается при новом селфи")
+    )
     selfie_image = models.ImageField(
         _("Селфи"),
         upload_to="selfies/%Y/%m/%d",
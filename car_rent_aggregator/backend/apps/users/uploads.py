@@ -0,0 +1,78 @@
+# apps/users/uploads.py
+"""
+Потоковая загрузка селфи: тело запроса пишется чанками во временный файл
+на диске (не в память), размер и сигнатура проверяются на первых чанках —
+лишнее не дочитываем. Затем Pillow перекодирует фото в JPEG не больше
+SELFIE_MAX_SIDE по длинной стороне, в storage уходит уже уменьшенная копия.
+"""
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+# сигнатуры JPEG / PNG / WEBP
+_MAGIC = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n")
+ALLOWED_FORMATS = ("JPEG", "PNG", "WEBP")
+ALLOWED_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp", "application/octet-stream", "")
+MAX_PIXELS = 40_000_000  # защита от «бомб»: 40 Мп хватает любой камере телефона
+
+
+class UploadRejected(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def _looks_like_image(head: bytes) -> bool:
+    return head.startswith(_MAGIC) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Временный файл на диске + ранний отказ по типу/сигнатуре/размеру."""
+
+    def __init__(self, request=None, max_bytes: int | None = None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or settings.SELFIE_MAX_BYTES
+        self.received = 0
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        if (content_type or "").split(";")[0].strip().lower() not in ALLOWED_CONTENT_TYPES:
+            raise UploadRejected(415, "unsupported_media_type")
+        if content_length and content_length > self.max_bytes:
+            raise UploadRejected(413, "file_too_large")
+        self.received = 0
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and not _looks_like_image(raw_data[:12]):
+            raise UploadRejected(415, "not_an_image")
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            raise UploadRejected(413, "file_too_large")
+        return super().receive_data_chunk(raw_data, start)
+
+
+def reencode_image(fileobj, max_side: int | None = None) -> ContentFile:
+    """Проверить картинку Pillow и перекодировать в JPEG с длинной стороной <= max_side."""
+    side = max_side or settings.SELFIE_MAX_SIDE
+    fileobj.seek(0)
+    try:
+        with Image.open(fileobj) as img:
+            if img.format not in ALLOWED_FORMATS:
+                raise UploadRejected(415, "unsupported_image_format")
+            if img.width * img.height > MAX_PIXELS:
+                raise UploadRejected(413, "image_too_large")
+            img.draft("RGB", (side, side))  # JPEG декодируется сразу в уменьшенном масштабе
+            out = ImageOps.exif_transpose(img).convert("RGB")
+    except UploadRejected:
+        raise
+    except Exception:
+        raise UploadRejected(400, "invalid_image")
+
+    out.thumbnail((side, side), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    out.save(buf, "JPEG", quality=85, optimize=True)
+    return ContentFile(buf.getvalue())
@@ -110,6 +110,27 @@ DATABASES = {
     }
 }
 
+# Range-режим для пересечений интервалов (PostgreSQL, см. manage.py pg_ranges):
+#   auto  — включается сам, если GiST-индексы созданы
+#   true/false — принудительно
+_range_mode = os.environ.get("OVERLAPS_RANGE_MODE", "auto").lower()
+OVERLAPS_RANGE_MODE = None if _range_mode == "auto" else _range_mode in ['true', 'yes', '1']
+
+# Суточные карты занятости машин (apps/cars/occupancy.py)
+OCCUPANCY_HORIZON_DAYS = int(os.environ.get("OCCUPANCY_HORIZON_DAYS", "365"))
+OCCUPANCY_SEARCH = os.environ.get("OCCUPANCY_SEARCH", "True").lower() in ['true', 'yes', '1']
+
+# Long-poll ленты событий (/api/events/consume/): запрос держит
+# sync-воркер gunicorn и соединение с PostgreSQL (LISTEN) до EVENTS_LONGPOLL_TIMEOUT сек.
+# Каждый бот держит такой запрос постоянно (client-bot и partner-bot — по одному),
+# поэтому 2 воркера/потока и 2 соединения БД заняты всегда: workers × threads
+# и max_connections считать как «нужно для остального трафика» + 2 (+1 на каждый
+# лишний экземпляр бота). Меньше таймаут — чаще переподключения, но не меньше занятых воркеров.
+EVENTS_LONGPOLL_TIMEOUT = int(os.environ.get("EVENTS_LONGPOLL_TIMEOUT", "25"))
+
+# XLSX-отчёты дашборда собирает `manage.py run_report_worker` (apps/dashboard/jobs.py)
+REPORTS_ASYNC = os.environ.get("REPORTS_ASYNC", "False").lower() in ['true', 'yes', '1']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -192,6 +213,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))
 
+# Загрузка селфи (/api/users/selfie/upload/): лимит размера и сторона после перекодирования
+SELFIE_MAX_BYTES = int(os.environ.get("SELFIE_MAX_BYTES", str(10 * 1024 * 1024)))
+SELFIE_MAX_SIDE = int(os.environ.get("SELFIE_MAX_SIDE", "1600"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
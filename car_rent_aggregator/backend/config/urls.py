@@ -6,15 +6,17 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from django.conf.urls.i18n import i18n_patterns
 
-from apps.bookings.api import BookingViewSet
+from apps.bookings.api import BookingViewSet, EventConsumeView, EventAckView
 from apps.payments.api import PaymentViewSet
 from apps.payments.views import PaymentRedirectView
-from apps.cars.api import CarsSearchView
-from apps.users.api import RegisterView, CheckView, SelfieUpdateView, LanguageUpdateView
+from apps.cars.api import CarsSearchView, CarsSearchBatchView, CarPhotoFileIdsView
+from apps.users.api import (
+    RegisterView, CheckView, SelfieUpdateView, SelfieUploadView, SelfiePartnerFileIdView, LanguageUpdateView,
+)
 from apps.partners.api import PartnerLinkView
 from apps.payments.webhooks import PaymeWebhookView, ClickWebhookView
 
-from apps.dashboard.views import DashboardReportView, DashboardExportExcelView
+from apps.dashboard.views import DashboardReportView, DashboardExportExcelView, DashboardExportCsvView
 
 from .views import ActivateLanguageView
 from apps.cars.autocomplete import ModelCarAutocomplete
@@ -30,12 +32,19 @@ urlpatterns = [
                   path('i18n/', include('django.conf.urls.i18n')),
                   path("admin/report/", DashboardReportView.as_view(), name="dashboard-report"),
                   path("admin/report/export.xlsx", DashboardExportExcelView.as_view(), name="dashboard-export"),
+                  path("admin/report/export.csv", DashboardExportCsvView.as_view(), name="dashboard-export-csv"),
                   path("admin/", admin.site.urls),
                   path("api/", include([
                       path("", include(router.urls)),
                       path("cars/search/", CarsSearchView.as_view(), name="cars-search"),
+                      path("cars/search/batch/", CarsSearchBatchView.as_view(), name="cars-search-batch"),
+                      path("cars/photo-ids/", CarPhotoFileIdsView.as_view(), name="cars-photo-ids"),
+                      path("events/consume/", EventConsumeView.as_view(), name="events-consume"),
+                      path("events/ack/", EventAckView.as_view(), name="events-ack"),
                       path("users/register/", RegisterView.as_view(), name="users-register"),
                       path("users/selfie/", SelfieUpdateView.as_view(), name="users-selfie"),
+                      path("users/selfie/upload/", SelfieUploadView.as_view(), name="users-selfie-upload"),
+                      path("users/selfie/file-id/", SelfiePartnerFileIdView.as_view(), name="users-selfie-file-id"),
                       path("users/check/", CheckView.as_view()),
                       path("partners/link/", PartnerLinkView.as_view(), name="partners-link"),
                       path("users/set-language/", LanguageUpdateView.as_view()),
@@ -12,7 +12,7 @@ from aiogram.types import (
 
 from bots.shared.api_client import ApiClient
 from bots.shared.i18n import t, resolve_user_lang, SUPPORTED
-from bots.client_bot.poller import PAYMENT_MSGS
+from bots.client_bot.poller import remember_payment_msg
 from bots.client_bot.states import PaymentStates
 
 from bots.client_bot.handlers.start import main_menu
@@ -201,7 +201,7 @@ async def my_bookings(m: Message, state: FSMContext):
         )
 
         sent = await m.answer(text_pay, reply_markup=kb)
-        PAYMENT_MSGS.setdefault(m.from_user.id, {}).setdefault(int(b["id"]), []).append(sent.message_id)
+        await remember_payment_msg(m.from_user.id, int(b["id"]), sent.message_id)
 
 @router.callback_query(F.data.startswith("pay:start:"))
 async def cb_start_payment(c: CallbackQuery, state: FSMContext):
@@ -1,25 +1,31 @@
 # bots/client_bot/handlers/search.py
-import base64
+import asyncio
 import io
-from pathlib import Path
 from datetime import datetime, date, timedelta
 import calendar
 
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
-    Message, CallbackQuery, FSInputFile,
+    Message, CallbackQuery,
     InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 )
 
 from bots.shared.api_client import ApiClient
-from bots.shared.config import settings
+from bots.shared.logger import setup_logging
+from bots.shared import pricing
+from bots.shared.photos import PhotoSender
+from bots.shared.sender import LIMITER
 from bots.client_bot.states import SearchStates, BookingStates
 from bots.client_bot.poller import TRACK_BOOKINGS
 from bots.client_bot.handlers.start import is_find_btn, kb_request_phone, main_menu
 from bots.shared.i18n import t, resolve_user_lang, SUPPORTED
 
 router = Router()
+log = setup_logging("client-search")
+
+# фото авто через кэш Telegram file_id
+PHOTOS = PhotoSender("client")
 
 def kb_context_search_menu(lang: str) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
@@ -150,27 +156,17 @@ def kb_confirm_booking(lang: str) -> InlineKeyboardMarkup:
     ])
 
 # ---------- расчёт сметы ----------
-def iter_days(start: datetime, end: datetime):
-    for i in range((end - start).days):
-        yield (start + timedelta(days=i)).date()
-
 def estimate_quote(start: datetime, end: datetime,
-                   price_weekday: float, price_weekend: float):
+                   price_weekday, price_weekend):
     """
     Возвращаем (total_sum:int, day_count:int)
     total_sum считает цену за каждый день отдельно:
       будни -> weekday_price
       выходные (сб/вс) -> weekend_price
     """
-    total = 0.0
-    days_cnt = 0
-    for d in iter_days(start, end):
-        days_cnt += 1
-        if d.weekday() >= 5:
-            total += float(price_weekend or price_weekday or 0)
-        else:
-            total += float(price_weekday or 0)
-    return int(total), days_cnt
+    counts = pricing.count_days(start, end)
+    total = pricing.quote_for_counts(counts, price_weekday, price_weekend)
+    return int(total), sum(counts)
 
 # ---------- карточка машины ----------
 def build_car_caption(car: dict, lang: str) -> str:
@@ -325,7 +321,7 @@ async def start_search(m: Message, state: FSMContext):
 
     await state.set_state(SearchStates.DATE_FROM)
     today = date.today()
-    await state.update_data(date_from=None, date_to=None, results=None, pending_booking=None)
+    await state.update_data(date_from=None, date_to=None, results=None, next_cursor=None, pending_booking=None)
 
     await m.answer(
         t(lang, "search-date-from"),
@@ -469,75 +465,89 @@ async def set_class_from_results(c: CallbackQuery, state: FSMContext):
     await c.answer()
 
 # ---------- собственно выдача результатов ----------
-async def do_search(msg: Message, state: FSMContext, user_id: int):
-    data = await state.get_data()
-    api = ApiClient()
-    lang = await resolve_user_lang(api, user_id, await state.get_data())
-    await api.close()
+# Карточек за раз; следующие страницы — по кнопке (курсор хранится в FSM)
+SEARCH_PAGE_SIZE = 10
 
+
+def kb_next_page(lang: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=t(lang, "search-next-page"), callback_data="page:next")],
+    ])
+
+
+async def _fetch_page(data: dict, lang: str, cursor: str | None = None) -> dict:
+    """Страница поиска: только поля карточки (view=card), курсорная пагинация."""
     params = {
         "date_from": data.get("date_from"),
         "date_to": data.get("date_to"),
         "lang": lang,
+        "view": "card",
+        "page_size": SEARCH_PAGE_SIZE,
     }
     if data.get("car_class"):
         params["car_class"] = data["car_class"]
+    if cursor:
+        params["cursor"] = cursor
 
     api = ApiClient()
     try:
-        cars = await api.get("/cars/search/", params=params)
+        page = await api.get("/cars/search/", params=params)
     finally:
         await api.close()
+    return page if isinstance(page, dict) else {"results": [], "next_cursor": None}
+
 
-    items = cars if isinstance(cars, list) else []
-    await state.update_data(results=items, page=1)
+async def _send_cards(msg: Message, items: list, lang: str):
+    # file_id обложек всей страницы — одним запросом
+    await PHOTOS.prefetch((car.get("card_rel") or [None])[0] for car in items)
+
+    async def send_card(car: dict):
+        caption = build_car_caption(car, lang)
+        markup = kb_card_actions(lang, car["id"])
+
+        # file_id -> локальная копия карточного размера -> card_url
+        sent = await PHOTOS.send(
+            msg.bot, msg.chat.id,
+            rel=(car.get("card_rel") or [None])[0],
+            url=car.get("card_url"),
+            caption=caption,
+            reply_markup=markup,
+        )
+        # без фото
+        if sent is None:
+            await LIMITER.send(msg.chat.id, lambda: msg.answer("📄 " + caption, reply_markup=markup))
+
+    # карточки независимы (у каждой свои кнопки) — шлём параллельно, темп держит LIMITER;
+    # ошибка одной карточки не должна отменять остальные
+    results = await asyncio.gather(*(send_card(car) for car in items), return_exceptions=True)
+    for car, res in zip(items, results):
+        if isinstance(res, Exception):
+            log.warning("card send failed for car=%s: %r", car.get("id"), res)
+
+
+async def do_search(msg: Message, state: FSMContext, user_id: int):
+    data = await state.get_data()
+    api = ApiClient()
+    lang = await resolve_user_lang(api, user_id, await state.get_data())
+    await api.close()
+
+    page = await _fetch_page(data, lang)
+    items = page.get("results") or []
+    # в FSM — только показанные карточки и курсор следующей страницы
+    await state.update_data(results=items, next_cursor=page.get("next_cursor"))
 
     if not items:
         await msg.answer(t(lang, "search-results-none"), reply_markup=kb_classes_inline_again(lang))
         await state.set_state(SearchStates.RESULTS)
         return
 
-    extra = " " + t(lang, "showing-first-10") if len(items) > 10 else ""
-    await msg.answer(t(lang, "search-results-head", count=len(items), extra=extra))
-
-    root = Path(settings.media_root) if settings.media_root else None
-    for car in items[:10]:
-        caption = build_car_caption(car, lang)
-        markup = kb_card_actions(lang, car["id"])
-
-        sent_ok = False
-
-        # 1) локальная фотка
-        if root and car.get("images_rel"):
-            fp = root / car["images_rel"][0]
-            if fp.exists():
-                try:
-                    await msg.bot.send_photo(
-                        chat_id=msg.chat.id,
-                        photo=FSInputFile(str(fp)),
-                        caption=caption,
-                        reply_markup=markup,
-                    )
-                    sent_ok = True
-                except Exception:
-                    sent_ok = False
-
-        # 2) абсолютный cover_url, если есть
-        if (not sent_ok) and car.get("cover_url"):
-            try:
-                await msg.bot.send_photo(
-                    chat_id=msg.chat.id,
-                    photo=car["cover_url"],
-                    caption=caption,
-                    reply_markup=markup,
-                )
-                sent_ok = True
-            except Exception:
-                sent_ok = False
+    count = page.get("count") or len(items)
+    extra = " " + t(lang, "showing-first-10") if count > len(items) else ""
+    await msg.answer(t(lang, "search-results-head", count=count, extra=extra))
 
-        # 3) без фото
-        if not sent_ok:
-            await msg.answer("📄 " + caption, reply_markup=markup)
+    await _send_cards(msg, items, lang)
+    if page.get("next_cursor"):
+        await msg.answer(t(lang, "search-next-page-hint"), reply_markup=kb_next_page(lang))
 
     # после выдачи карточек даём человеку возможность сменить класс/дату
     await msg.answer(
@@ -546,6 +556,33 @@ async def do_search(msg: Message, state: FSMContext, user_id: int):
     )
     await state.set_state(SearchStates.RESULTS)
 
+
+@router.callback_query(SearchStates.RESULTS, F.data == "page:next")
+async def show_next_page(c: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    api = ApiClient()
+    lang = await resolve_user_lang(api, c.from_user.id, data)
+    await api.close()
+
+    cursor = data.get("next_cursor")
+    if not cursor:
+        return await c.answer()
+    try:
+        await c.message.edit_reply_markup(reply_markup=None)
+    except Exception:
+        pass
+
+    page = await _fetch_page(data, lang, cursor)
+    items = page.get("results") or []
+    await state.update_data(
+        results=(data.get("results") or []) + items,
+        next_cursor=page.get("next_cursor"),
+    )
+    await _send_cards(c.message, items, lang)
+    if page.get("next_cursor"):
+        await c.message.answer(t(lang, "search-next-page-hint"), reply_markup=kb_next_page(lang))
+    await c.answer()
+
 @router.message(SearchStates.RESULTS, F.text.func(is_change_class_btn))
 async def change_class_from_menu(m: Message, state: FSMContext):
     """
@@ -580,6 +617,7 @@ async def change_dates_from_menu(m: Message, state: FSMContext):
         date_from=None,
         date_to=None,
         results=None,
+        next_cursor=None,
         pending_booking=None,
         car_class=car_class,  # класс сохраняем
     )
@@ -604,19 +642,13 @@ async def show_more_photos(c: CallbackQuery, state: FSMContext):
     if not car:
         return await c.answer(t(lang, "terms-car-not-found"), show_alert=True)
 
-    paths = (car.get("images_rel") or [])[1:]
+    paths = (car.get("card_rel") or [])[1:]
     if not paths:
         return await c.answer(t(lang, "terms-no-more-photos"), show_alert=True)
 
-    root = Path(settings.media_root) if settings.media_root else None
-    if root:
-        for rel in paths:
-            fp = root / rel
-            if fp.exists():
-                try:
-                    await c.message.bot.send_photo(c.message.chat.id, FSInputFile(str(fp)))
-                except Exception:
-                    pass
+    await PHOTOS.prefetch(paths)
+    # остальные фото — альбомом, а не отдельным сообщением на каждое
+    await PHOTOS.send_album(c.message.bot, c.message.chat.id, paths)
     await c.answer()
 
 @router.callback_query(SearchStates.RESULTS, F.data.startswith("terms:"))
@@ -715,8 +747,8 @@ async def pick_car(c: CallbackQuery, state: FSMContext):
     total_sum, days_cnt = estimate_quote(
         start_dt,
         end_dt,
-        float(car.get("price_weekday") or 0),
-        float(car.get("price_weekend") or (car.get("price_weekday") or 0)),
+        car.get("price_weekday"),
+        car.get("price_weekend"),
     )
 
     # готовим payload на будущее создание
@@ -748,8 +780,7 @@ async def got_selfie(m: Message, state: FSMContext):
     """
     Принимаем селфи:
     - только photo или document с image/*
-    - скачиваем файл с Telegram
-    - шлём base64 на бэкенд (/users/selfie/)
+    - потоком передаём файл из Telegram на бэкенд (/users/selfie/upload/)
     - показываем превью брони + кнопки Подтвердить/Отмена
     """
     api = ApiClient()
@@ -757,11 +788,13 @@ async def got_selfie(m: Message, state: FSMContext):
     await api.close()
 
     file_id = None
+    content_type, filename = "image/jpeg", "selfie.jpg"
 
     if m.photo:
         file_id = m.photo[-1].file_id
     elif m.document and m.document.mime_type and m.document.mime_type.startswith("image/"):
         file_id = m.document.file_id
+        content_type, filename = m.document.mime_type, "selfie." + m.document.mime_type.split("/")[-1]
 
     if not file_id:
         await m.answer(t(lang, "selfie-invalid"))
@@ -770,25 +803,23 @@ async def got_selfie(m: Message, state: FSMContext):
     # кладём file_id в FSM (на будущее, если пригодится)
     await state.update_data(selfie_file_id=file_id)
 
-    # 🔽 качаем файл из Telegram
-    try:
-        tg_file = await m.bot.get_file(file_id)
-        buf = io.BytesIO()
-        await m.bot.download_file(tg_file.file_path, buf)
-        raw = buf.getvalue()
-        image_b64 = base64.b64encode(raw).decode("ascii")
-    except Exception as e:
-        await m.answer(t(lang, "selfie-save-fail", error=str(e)))
-        return
-
-    # 🔽 сохраняем/обновляем селфи на бэке
+    # 🔽 файл из Telegram сразу уходит на бэк: чанки скачивания = чанки загрузки
     api = ApiClient()
     try:
-        await api.post("/users/selfie/", json={
-            "tg_user_id": m.from_user.id,
-            "selfie_file_id": file_id,
-            "image_b64": image_b64,
-        })
+        tg_file = await m.bot.get_file(file_id)
+        if tg_file.file_size:
+            url = m.bot.session.api.file_url(m.bot.token, tg_file.file_path)
+            body, size = m.bot.session.stream_content(url, chunk_size=64 * 1024), tg_file.file_size
+        else:
+            # Telegram не сообщил размер — без Content-Length поток не отправить
+            buf = io.BytesIO()
+            await m.bot.download_file(tg_file.file_path, buf)
+            body = buf.getvalue()
+            size = len(body)
+        await api.upload(
+            "/users/selfie/upload/", body, size=size, content_type=content_type, filename=filename,
+            params={"tg_user_id": m.from_user.id, "selfie_file_id": file_id},
+        )
     except Exception as e:
         await m.answer(t(lang, "selfie-save-fail", error=str(e)))
     finally:
@@ -888,7 +919,7 @@ async def booking_confirm(c: CallbackQuery, state: FSMContext):
 
     # если дошли сюда — бронь создана успешно (как и раньше)
     try:
-        TRACK_BOOKINGS.setdefault(c.from_user.id, set()).add(int(booking["id"]))
+        await TRACK_BOOKINGS.add(f"{c.from_user.id}:{int(booking['id'])}")
     except Exception:
         pass
 
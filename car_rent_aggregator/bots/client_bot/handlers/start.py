@@ -90,7 +90,7 @@ def is_lang_btn(text: str) -> bool:
 @router.message(F.text == "/start")
 async def cmd_start(m: Message, state: FSMContext):
     await state.clear()
-    ensure_client_subscription(m.bot, m.chat.id)
+    await ensure_client_subscription(m.bot, m.chat.id)
 
     api = ApiClient()
     try:
@@ -363,14 +363,14 @@ async def legal_agree_and_register(c: CallbackQuery, state: FSMContext):
             await c.message.edit_text(t(lang, "book-create-fail", error=str(e)))
         finally:
             await api.close()
-            ensure_client_subscription(c.bot, c.message.chat.id)
+            await ensure_client_subscription(c.bot, c.message.chat.id)
             await state.clear()
             await c.answer()
         return
 
     await api.close()
     await c.message.edit_text(t(lang, "reg-ok"))
-    ensure_client_subscription(c.bot, c.message.chat.id)
+    await ensure_client_subscription(c.bot, c.message.chat.id)
     await state.clear()
     await c.message.answer(t(lang, "menu-title"), reply_markup=main_menu(lang))
     await c.answer()
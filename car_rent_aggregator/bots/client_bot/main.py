@@ -3,7 +3,9 @@ from aiogram import Bot, Dispatcher
 from bots.shared.mw_antiflood import AntiFloodMiddleware
 from bots.shared.mw_state_ttl import StateTTLMiddleware
 from bots.shared.config import settings
+from bots.shared.api_client import close_shared_session
 from bots.shared.logger import setup_logging
+from .poller import restore_client_subscriptions
 from .handlers import start, search, bookings, fallbacks
 
 # после создания dp/dispatcher
@@ -32,6 +34,8 @@ async def main():
     dp.include_router(search.router)
     dp.include_router(bookings.router)
     dp.include_router(fallbacks.router)
+    dp.startup.register(restore_client_subscriptions)
+    dp.shutdown.register(close_shared_session)
     log.info("Client bot started (polling)")
     try:
         await dp.start_polling(bot)
@@ -1,29 +1,41 @@
 # bots/client_bot/poller.py
 import asyncio
-from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
 from bots.shared.api_client import ApiClient
 from bots.shared.config import settings
-from bots.shared.i18n import t, resolve_user_lang
+from bots.shared.i18n import t, DEFAULT_LANG, SUPPORTED
+from bots.shared.sender import OutboundQueue
 from bots.shared.logger import setup_logging
+from bots.shared.state_store import open_store
 
 log = setup_logging("client-poller")
 
-# chat_id -> { booking_id -> [message_id, ...] }
-PAYMENT_MSGS: Dict[int, Dict[int, List[int]]] = {}
+# "chat_id:booking_id" -> [message_id, ...]
+PAYMENT_MSGS = open_store("client:payment-msgs")
 
-# chat_id -> { booking_id -> last_status }
-CLIENT_BOOKING_STATUS: Dict[int, Dict[int, str]] = {}
+# "chat_id:booking_id" -> последнее известное "status|payment_marker"
+CLIENT_BOOKING_STATUS = open_store("client:booking-status")
 
 # Время жизни неподтверждённой/неоплаченной заявки (минуты)
 HOLD_MINUTES = 20
 
-# явно отслеживаемые только что созданные заявки пользователя
-TRACK_BOOKINGS: Dict[int, set[int]] = {}
+# явно отслеживаемые только что созданные заявки пользователя: "chat_id:booking_id"
+TRACK_BOOKINGS = open_store("client:tracked-bookings")
+
+# подписанные клиенты (переживают рестарт); без TTL — отписки у клиента нет
+SUBSCRIPTIONS = open_store("client:subscribers", ttl=0)
+
+
+async def remember_payment_msg(chat_id: int, booking_id: int, message_id: int) -> None:
+    key = f"{chat_id}:{booking_id}"
+    await PAYMENT_MSGS.set(key, [*await PAYMENT_MSGS.get(key, []), message_id])
+
 
 def _parse_dt(iso: str) -> Optional[datetime]:
     """
@@ -100,32 +112,63 @@ async def cleanup_chat_generic(bot: Bot, chat_id: int, window: int = 50) -> None
         # если что-то пошло не так – просто молча живём дальше
         return
 
+# Поиски для подсказок, собранные за SUGGEST_BATCH_WINDOW сек, уходят одним /cars/search/batch/
+SUGGEST_BATCH_WINDOW = 0.2
+_SUGGEST_PENDING: Dict[tuple, tuple[dict, List[asyncio.Future]]] = {}
+_SUGGEST_FLUSH: Optional[asyncio.Task] = None
+
+
+async def _flush_suggest_searches() -> None:
+    global _SUGGEST_FLUSH
+    await asyncio.sleep(SUGGEST_BATCH_WINDOW)
+    pending = list(_SUGGEST_PENDING.values())
+    _SUGGEST_PENDING.clear()
+    _SUGGEST_FLUSH = None
+
+    queries = [{**q, "key": str(i)} for i, (q, _) in enumerate(pending)]
+    try:
+        resp = await ApiClient().post("/cars/search/batch/", json={"queries": queries})
+        results = resp.get("results") or {}
+    except Exception as e:
+        log.warning("suggestions batch search failed: %r", e)
+        results = {}
+    for i, (_, futures) in enumerate(pending):
+        for fut in futures:
+            if not fut.done():
+                fut.set_result(results.get(str(i)) or [])
+
+
+def _search_suggestions(date_from: str, date_to: str, car_class: Optional[str]) -> asyncio.Future:
+    """Поставить поиск в ближайший пакет; одинаковые запросы схлопываются."""
+    global _SUGGEST_FLUSH
+    fut = asyncio.get_running_loop().create_future()
+    key = (date_from, date_to, car_class or "")
+    if key not in _SUGGEST_PENDING:
+        query = {"date_from": date_from, "date_to": date_to}
+        if car_class:
+            query["car_class"] = car_class
+        _SUGGEST_PENDING[key] = (query, [])
+    _SUGGEST_PENDING[key][1].append(fut)
+    if _SUGGEST_FLUSH is None:
+        _SUGGEST_FLUSH = asyncio.create_task(_flush_suggest_searches())
+    return fut
+
+
 async def _send_suggestions(
     bot: Bot,
     chat_id: int,
     lang: str,
     *,
-    date_from: str,
-    date_to: str,
-    car_class: Optional[str],
+    cars: asyncio.Future,
     partner_id: Optional[int],
 ) -> None:
     """
     Подбираем до 5 похожих авто в том же классе:
       1) сначала машины того же партнёра (если указан),
       2) затем другие партнёры.
+    cars — результат _search_suggestions (поиск запущен заранее, пакетом).
     """
-    api = ApiClient()
-    try:
-        params = {"date_from": date_from, "date_to": date_to}
-        if car_class:
-            params["car_class"] = car_class
-
-        cars = await api.get("/cars/search/", params=params)
-    except Exception:
-        cars = []
-    finally:
-        await api.close()
+    cars = await cars
 
     if not isinstance(cars, list) or not cars:
         await bot.send_message(
@@ -177,306 +220,199 @@ async def _send_suggestions(
     )
 
 
-async def client_notify_loop(bot: Bot, chat_id: int) -> None:
+def _notify_booking(bot: Bot, chat_id: int, lang: str, b: dict, prev: Optional[str]) -> List[asyncio.Future]:
     """
-    Каждые ~20 секунд:
-      1) Подтягиваем брони клиента.
-      2) Автоматически аннулируем старые pending (>= HOLD_MINUTES).
-      3) Отлавливаем смену статуса и шлём уведомления:
-
-         • pending  -> ничего не шлём.
-         • confirmed -> "заявка подтверждена" (ОТДЕЛЬНО от оплаты).
-         • paid      -> "оплата успешно прошла".
-         • rejected  -> "заявка отклонена" + похожие авто.
-         • expired / canceled -> "истёк срок / отменено" + похожие авто.
-
-      Важно: на переходе в paid мы больше НЕ дублируем текст про подтверждение.
+    Ставит в очередь уведомление о новом состоянии брони (возвращает future отправок):
+
+       • pending  -> ничего не шлём.
+       • confirmed -> "заявка подтверждена" (ОТДЕЛЬНО от оплаты).
+       • paid      -> "оплата успешно прошла".
+       • rejected  -> "заявка отклонена" + похожие авто.
+       • expired / canceled -> "истёк срок / отменено" + похожие авто.
+
+    Важно: на переходе в paid мы больше НЕ дублируем текст про подтверждение.
     """
-    while True:
-        try:
-            api = ApiClient()
-            try:
-                lang = await resolve_user_lang(api, chat_id, {})
-            except Exception:
-                lang = "ru"
-            try:
-                items = await api.get("/bookings/", params={"client_tg_user_id": chat_id})
-            finally:
-                await api.close()
-
-            known = CLIENT_BOOKING_STATUS.setdefault(chat_id, {})
-
-            # 2) авто-аннуляция старых pending
-            now_utc = datetime.now(timezone.utc)
-            for b in items:
-                if b.get("status") != "pending":
-                    continue
-
-                created = _parse_dt(b.get("created_at", ""))
-                if not created:
-                    continue
-
-                created_utc = created.astimezone(timezone.utc)
-                if now_utc - created_utc >= timedelta(minutes=HOLD_MINUTES):
-                    # сервер переведёт бронь в canceled
-                    try:
-                        api2 = ApiClient()
-                        await api2.post(
-                            f"/bookings/{b['id']}/cancel/",
-                            json={"client_tg_user_id": chat_id},
-                        )
-                        await api2.close()
-                    except Exception:
-                        # молчим, попробуем в следующий цикл
-                        pass
-
-            # 3) перечитываем, чтобы увидеть обновлённые статусы после авто-отмен
-            api = ApiClient()
-            items = await api.get("/bookings/", params={"client_tg_user_id": chat_id})
-            await api.close()
-
-            # 4) анализ смены статусов
-            for b in items:
-                bid = b.get("id")
-                st = b.get("status")
-                pm = (b.get("payment_marker") or "").lower()
-                if bid is None or st is None:
-                    continue
-
-                state = f"{st}|{pm}"
-                prev = known.get(bid)
-                title = b.get("car_title") or b.get("car") or "—"
-                car_color = b.get("car_color")
-                car_region = b.get("car_region")
-                car_plate_number = b.get("car_plate_number")
-                dfrom_iso = b.get("date_from", "")
-                dto_iso = b.get("date_to", "")
-                dfrom = _fmt_date(dfrom_iso)
-                dto = _fmt_date(dto_iso)
-                car_class = b.get("car_class")
-                partner_id = b.get("partner")
-
-                partner_name = b.get("partner_name") or ""
-                partner_phone = b.get("partner_phone") or ""
-                partner_address = b.get("partner_address") or ""
-
-                # первое появление брони в кеше
-                if prev is None:
-                    # запоминаем полное состояние: статус + маркер оплаты
-                    known[bid] = state
-
-                    if pm == "paid":
-                        await cleanup_chat_generic(bot, chat_id)
-                        await bot.send_message(
-                            chat_id,
-                            t(
-                                lang,
-                                "client-booking-paid",
-                                id=bid,
-                                title=title,
-                                car_color = car_color,
-                                car_region = car_region,
-                                car_plate_number = car_plate_number,
-                                date_from=dfrom,
-                                date_to=dto,
-                                partner_name=partner_name,
-                                partner_phone=partner_phone,
-                                partner_address=partner_address,
-                            ),
-                            reply_markup=kb_main_menu(lang),
-                        )
-                        log.info("Booking %s for chat %s initial state %s (marker=paid)", bid, chat_id, st)
-
-                    elif st == "confirmed":
-                        await bot.send_message(
-                            chat_id,
-                            t(
-                                lang,
-                                "client-booking-confirmed",
-                                id=bid,
-                                title=title,
-                                car_color=car_color,
-                                car_region=car_region,
-                                car_plate_number=car_plate_number,
-                                date_from=dfrom,
-                                date_to=dto,
-                            ),
-                            reply_markup=kb_payment(lang)
-                        )
-                        log.info("Booking %s for chat %s initial status confirmed", bid, chat_id)
-
-                    elif st == "rejected":
-                        await bot.send_message(
-                            chat_id,
-                            t(
-                                lang,
-                                "client-booking-rejected",
-                                id=bid,
-                                title=title,
-                                car_color=car_color,
-                                car_region=car_region,
-                                car_plate_number=car_plate_number,
-                                date_from=dfrom,
-                                date_to=dto,
-                            ),
-                        )
-                        await _send_suggestions(
-                            bot,
-                            chat_id,
-                            lang,
-                            date_from=dfrom_iso,
-                            date_to=dto_iso,
-                            car_class=car_class,
-                            partner_id=partner_id,
-                        )
-                        log.info("Booking %s for chat %s initial status rejected", bid, chat_id)
-
-                    elif st in ("expired", "canceled"):
-                        await bot.send_message(
-                            chat_id,
-                            t(
-                                lang,
-                                "client-booking-expired",
-                                id=bid,
-                                title=title,
-                                car_color=car_color,
-                                car_region=car_region,
-                                car_plate_number=car_plate_number,
-                                date_from=dfrom,
-                                date_to=dto,
-                            ),
-                        )
-                        await _send_suggestions(
-                            bot,
-                            chat_id,
-                            lang,
-                            date_from=dfrom_iso,
-                            date_to=dto_iso,
-                            car_class=car_class,
-                            partner_id=partner_id,
-                        )
-                        log.info("Booking %s for chat %s initial status %s", bid, chat_id, st)
-
-                    continue
-
-                # если состояние (status + payment_marker) не изменилось — ничего не шлём
-                if prev == state:
-                    continue
-
-                # состояние изменилось
-                known[bid] = state
-
-                # 1) успешная оплата — реагируем на payment_marker
-                if pm == "paid" and (prev is None or not prev.endswith("|paid")):
-                    await cleanup_chat_generic(bot, chat_id)
-                    await bot.send_message(
-                        chat_id,
-                        t(
-                            lang,
-                            "client-booking-paid",
-                            id=bid,
-                            title=title,
-                            car_color=car_color,
-                            car_region=car_region,
-                            car_plate_number=car_plate_number,
-                            date_from=dfrom,
-                            date_to=dto,
-                            partner_name=partner_name,
-                            partner_phone=partner_phone,
-                            partner_address=partner_address,
-                        ),
-                        reply_markup=kb_main_menu(lang),
-                    )
-                elif st == "confirmed":
-                    await bot.send_message(
-                        chat_id,
-                        t(
-                            lang,
-                            "client-booking-confirmed",
-                            id=bid,
-                            title=title,
-                            car_color=car_color,
-                            car_region=car_region,
-                            car_plate_number=car_plate_number,
-                            date_from=dfrom,
-                            date_to=dto,
-                        ),
-                        reply_markup=kb_payment(lang)
-                    )
-
-                elif st == "rejected":
-                    # ОТКЛОНЕНО ПАРТНЁРОМ
-                    # client-booking-rejected + затем похожие варианты
-                    await bot.send_message(
-                        chat_id,
-                        t(
-                            lang,
-                            "client-booking-rejected",
-                            id=bid,
-                            title=title,
-                            car_color=car_color,
-                            car_region=car_region,
-                            car_plate_number=car_plate_number,
-                            date_from=dfrom,
-                            date_to=dto,
-                        ),
-                    )
-                    await _send_suggestions(
-                        bot,
-                        chat_id,
-                        lang,
-                        date_from=dfrom_iso,
-                        date_to=dto_iso,
-                        car_class=car_class,
-                        partner_id=partner_id,
-                    )
-
-                elif st in ("expired", "canceled"):
-                    # ИСТЁК СРОК ОЖИДАНИЯ / ОТМЕНЕНО
-                    # client-booking-expired
-                    await bot.send_message(
-                        chat_id,
-                        t(
-                            lang,
-                            "client-booking-expired",
-                            id=bid,
-                            title=title,
-                            car_color=car_color,
-                            car_region=car_region,
-                            car_plate_number=car_plate_number,
-                            date_from=dfrom,
-                            date_to=dto,
-                        ),
-                    )
-                    await _send_suggestions(
-                        bot,
-                        chat_id,
-                        lang,
-                        date_from=dfrom_iso,
-                        date_to=dto_iso,
-                        car_class=car_class,
-                        partner_id=partner_id,
-                    )
+    bid = b.get("id")
+    st = b.get("status")
+    pm = (b.get("payment_marker") or "").lower()
+    dfrom_iso = b.get("date_from", "")
+    dto_iso = b.get("date_to", "")
+    card = dict(
+        id=bid,
+        title=b.get("car_title") or b.get("car") or "—",
+        car_color=b.get("car_color"),
+        car_region=b.get("car_region"),
+        car_plate_number=b.get("car_plate_number"),
+        date_from=_fmt_date(dfrom_iso),
+        date_to=_fmt_date(dto_iso),
+    )
 
+    def suggestions():
+        # поиск стартует сразу, при постановке в очередь: подсказки по всей
+        # пачке событий уходят на backend одним пакетным запросом
+        found = _search_suggestions(dfrom_iso, dto_iso, b.get("car_class"))
+        return lambda: _send_suggestions(bot, chat_id, lang, cars=found, partner_id=b.get("partner"))
+
+    # 1) успешная оплата — реагируем на payment_marker
+    if pm == "paid" and (prev is None or not prev.endswith("|paid")):
+        sends = [OUTBOX.put(chat_id, lambda: cleanup_chat_generic(bot, chat_id))]
+        sends.append(OUTBOX.send_message(
+            bot, chat_id,
+            t(
+                lang,
+                "client-booking-paid",
+                **card,
+                partner_name=b.get("partner_name") or "",
+                partner_phone=b.get("partner_phone") or "",
+                partner_address=b.get("partner_address") or "",
+            ),
+            reply_markup=kb_main_menu(lang),
+        ))
+    elif st == "confirmed":
+        sends = [OUTBOX.send_message(
+            bot, chat_id,
+            t(lang, "client-booking-confirmed", **card),
+            reply_markup=kb_payment(lang),
+        )]
+    elif st == "rejected":
+        # ОТКЛОНЕНО ПАРТНЁРОМ: client-booking-rejected + затем похожие варианты
+        sends = [
+            OUTBOX.send_message(bot, chat_id, t(lang, "client-booking-rejected", **card)),
+            OUTBOX.put(chat_id, suggestions()),
+        ]
+    elif st in ("expired", "canceled"):
+        # ИСТЁК СРОК ОЖИДАНИЯ / ОТМЕНЕНО
+        sends = [
+            OUTBOX.send_message(bot, chat_id, t(lang, "client-booking-expired", **card)),
+            OUTBOX.put(chat_id, suggestions()),
+        ]
+    else:
+        return []
+    log.info("Booking %s for chat %s: %s -> %s|%s", bid, chat_id, prev, st, pm)
+    return sends
+
+
+# Клиенты (chat_id == tg_user_id), чьи брони отслеживает диспетчер (кэш SUBSCRIPTIONS)
+TRACKED_CLIENTS: set[int] = set()
+
+# Сколько секунд backend держит long-poll /events/consume/
+EVENTS_WAIT = 25
+# Имя потребителя ленты событий (смещение хранится на backend)
+CONSUMER = "client-bot"
+
+OUTBOX = OutboundQueue()
+
+
+async def _handle_change(bot: Bot, b: dict, batch: Dict[str, tuple[str, List[asyncio.Future]]]) -> None:
+    """
+    Сравниваем состояние брони с CLIENT_BOOKING_STATUS и уведомляем клиента при изменении.
+    batch — изменения текущей пачки событий: key -> (новое состояние, отправки);
+    в CLIENT_BOOKING_STATUS оно попадёт только после доставки (см. _deliver).
+    """
+    cid = b.get("client_tg_user_id")
+    bid = b.get("id")
+    st = b.get("status")
+    if cid is None or bid is None or st is None:
+        return
+    chat_id = int(cid)
+    if chat_id not in TRACKED_CLIENTS:
+        return
 
-        except Exception as e:
+    key = f"{chat_id}:{bid}"
+    state = f"{st}|{(b.get('payment_marker') or '').lower()}"
+    prev, sends = batch[key] if key in batch else (await CLIENT_BOOKING_STATUS.get(key), [])
+    # если состояние (status + payment_marker) не изменилось — ничего не шлём
+    if prev == state:
+        return
 
-            # логируем любые ошибки в поллере, чтобы не отлавливать их по ощущениям
+    lang = (b.get("client_language") or DEFAULT_LANG).lower()
+    if lang not in SUPPORTED:
+        lang = DEFAULT_LANG
+    batch[key] = (state, sends + _notify_booking(bot, chat_id, lang, b, prev))
 
-            log.exception("client_notify_loop error for chat_id=%s: %r", chat_id, e)
 
-        await asyncio.sleep(20)
+async def _deliver(batch: Dict[str, tuple[str, List[asyncio.Future]]]) -> bool:
+    """
+    Дождаться отправки уведомлений пачки и запомнить состояния доставленных броней.
+    Ошибки, которые повтором не исправить (бот заблокирован, запрос отвергнут),
+    считаем доставкой. False — что-то не ушло: пачку не подтверждаем, после
+    повторного чтения уйдёт только недоставленное.
+    """
+    delivered = True
+    for key, (state, sends) in batch.items():
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        failed = [
+            r for r in results
+            if isinstance(r, Exception) and not isinstance(r, (TelegramForbiddenError, TelegramBadRequest))
+        ]
+        if failed:
+            log.warning("notify %s not delivered: %r", key, failed[0])
+            delivered = False
+            continue
+        await CLIENT_BOOKING_STATUS.set(key, state)
+    return delivered
+
+
+async def client_notify_dispatcher(bot: Bot) -> None:
+    """
+    Один цикл на всех клиентов, поверх long-poll /events/consume/:
+      1) запрос висит на backend, пока не появятся события по броням
+         (PostgreSQL будит его через NOTIFY сразу после коммита);
+      2) по каждому событию берём состояние брони на момент события, оставляем
+         отслеживаемых клиентов и сравниваем со CLIENT_BOOKING_STATUS;
+      3) уведомления ставим в OUTBOX — он соблюдает лимиты Telegram;
+      4) ждём их отправки и только тогда запоминаем состояние брони и
+         подтверждаем пачку (/events/ack/) — смещение CONSUMER хранится на backend,
+         после рестарта или сбоя отправки бот перечитает неподтверждённое.
+    Задержка уведомления — около секунды, пустых запросов — один на ~25 сек.
+    """
+    api = ApiClient()
+    while True:
+        try:
+            page = await api.get(
+                "/events/consume/",
+                params={"consumer": CONSUMER, "timeout": EVENTS_WAIT, "limit": 200},
+            )
+            batch: Dict[str, tuple[str, List[asyncio.Future]]] = {}
+            for ev in page.get("events") or []:
+                try:
+                    # статус/оплата — из снимка события, остальное — актуальная бронь
+                    await _handle_change(bot, {**ev["booking"], "status": ev["status"],
+                                               "payment_marker": ev["payment_marker"]}, batch)
+                except Exception as e:
+                    log.exception("notify error for event=%s: %r", ev.get("id"), e)
+            if not await _deliver(batch):
+                await asyncio.sleep(5)
+                continue
+            if page.get("events"):
+                await api.post("/events/ack/", json={"consumer": CONSUMER, "cursor": page["cursor"]})
+        except Exception as e:
+            # логируем любые ошибки в поллере, чтобы не отлавливать их по ощущениям
+            log.exception("client_notify_dispatcher error: %r", e)
+            await asyncio.sleep(5)
 
 
-SUB_TASKS_CLIENT: Dict[int, asyncio.Task] = {}
+_DISPATCHER_TASK: Optional[asyncio.Task] = None
 
 
-def ensure_client_subscription(bot: Bot, chat_id: int) -> None:
+async def ensure_client_subscription(bot: Bot, chat_id: int) -> None:
     """
-    Запускаем фоновую задачу уведомлений для клиента, если она ещё не запущена.
+    Добавляем клиента в отслеживание и запускаем общий диспетчер, если он ещё не запущен.
     Вызывается из /start.
     """
-    t = SUB_TASKS_CLIENT.get(chat_id)
-    if t and not t.done():
+    global _DISPATCHER_TASK
+    if chat_id not in TRACKED_CLIENTS:
+        TRACKED_CLIENTS.add(chat_id)
+        await SUBSCRIPTIONS.set(str(chat_id), 1)
+    if _DISPATCHER_TASK and not _DISPATCHER_TASK.done():
         return
-    SUB_TASKS_CLIENT[chat_id] = asyncio.create_task(client_notify_loop(bot, chat_id))
+    _DISPATCHER_TASK = asyncio.create_task(client_notify_dispatcher(bot))
+
+
+async def restore_client_subscriptions(bot: Bot) -> None:
+    """dp.startup: поднимаем подписки из хранилища, чтобы уведомления шли и без повторного /start."""
+    for key, _ in await SUBSCRIPTIONS.items():
+        TRACKED_CLIENTS.add(int(key))
+    if TRACKED_CLIENTS:
+        log.info("Restored %s client subscriptions", len(TRACKED_CLIENTS))
+        await ensure_client_subscription(bot, next(iter(TRACKED_CLIENTS)))
@@ -153,6 +153,8 @@ search-period = 🗓 Period: { $start } → { $end }\n\nChoose a car class:
 search-results-none = No suitable cars found. Try another class or change the dates.
 search-results-head = Found { $count } cars.{ $extra }
 showing-first-10 = Showing the first 10.
+search-next-page = ➡️ Show more
+search-next-page-hint = More cars available:
 search-classes-head = Choose another class or change the dates:
 
 class-eco = Economy
@@ -159,6 +159,8 @@ search-period = 🗓 Период: { $start } → { $end }\n\nВыберите 
 search-results-none = К сожалению, подходящих авто не найдено. Попробуйте другой класс или измените даты.
 search-results-head = Найдено { $count } авто.{ $extra }
 showing-first-10 = Показаны первые 10.
+search-next-page = ➡️ Показать ещё
+search-next-page-hint = Есть ещё варианты:
     }
 search-classes-head = Выберите другой класс или измените даты:
 
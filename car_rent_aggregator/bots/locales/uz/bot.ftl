@@ -154,6 +154,8 @@ search-results-none = Afsus, mos avtomobillar topilmadi. Boshqa klassni tanlang
 search-results-head = Topildi: { $count } ta avto.{ $extra }
 search-classes-head = Boshqa klassni tanlang yoki sanalarni o‘zgartiring:
 showing-first-10 = Dastlabki 10 tasi ko‘rsatildi.
+search-next-page = ➡️ Yana ko‘rsatish
+search-next-page-hint = Yana variantlar bor:
 
 class-eco = Ekonom
 class-comfort = Komfort
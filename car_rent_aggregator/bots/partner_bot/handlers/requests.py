@@ -1,7 +1,5 @@
 # bots/partner_bot/handlers/requests.py
 from __future__ import annotations
-import aiohttp
-from aiogram.types import BufferedInputFile
 from datetime import datetime, timezone as _tz
 
 from aiogram import Router, F
@@ -15,6 +13,7 @@ from aiogram.fsm.context import FSMContext
 
 from bots.shared.api_client import ApiClient
 from bots.shared.i18n import t
+from bots.partner_bot.selfie import send_client_selfie
 
 router = Router()
 
@@ -27,28 +26,6 @@ def _resolve_partner_lang() -> str:
     # пока только ru, в будущем можно хранить язык партнёра
     return "ru"
 
-async def _send_selfie_from_url(bot, chat_id: int, selfie_url: str) -> bool:
-    """
-    Качаем картинку по URL и отправляем её как файл.
-    Работает даже если Telegram не может сам сходить по URL.
-    """
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(selfie_url) as resp:
-                if resp.status != 200:
-                    return False
-                raw = await resp.read()
-    except Exception:
-        return False
-
-    try:
-        file = BufferedInputFile(raw, filename="selfie.jpg")
-        await bot.send_photo(chat_id=chat_id, photo=file)
-        return True
-    except Exception:
-        return False
-
-
 def _fmt_dt_short(iso: str) -> str:
     """
     "2025-10-25T10:00:00+05:00" -> "25.10.2025"
@@ -175,9 +152,7 @@ async def list_requests(m: Message, state: FSMContext):
             f"{ttl_line}"
         )
 
-        selfie_url = b.get("client_selfie_url")
-        if selfie_url:
-            ok = await _send_selfie_from_url(m.bot, m.chat.id, selfie_url)
+        await send_client_selfie(m.bot, m.chat.id, b)
 
         await m.answer(
             text,
@@ -240,9 +215,7 @@ async def cb_confirm(c: CallbackQuery, state: FSMContext):
         f"{client_block}"
     )
 
-    selfie_url = booking.get("client_selfie_url")
-    if selfie_url:
-        await _send_selfie_from_url(c.bot, c.message.chat.id, selfie_url)
+    await send_client_selfie(c.bot, c.message.chat.id, booking)
 
     try:
         await c.message.edit_text(text, reply_markup=None)
@@ -9,7 +9,7 @@ router = Router()
 @router.message(F.text == "/start")
 async def cmd_start(m: Message):
     # Авто-подписка (если уже подписан — вернётся False и всё ок)
-    subscribe_partner(m.bot, m.chat.id, m.from_user.username)
+    await subscribe_partner(m.bot, m.chat.id, m.from_user.username)
     await m.answer(
         "Партнёр-бот.\nКоманды:\n"
         "- /link — привязать аккаунт по username и включить уведомления\n"
@@ -31,7 +31,7 @@ async def link_account(m: Message):
     except Exception as e:
         await m.answer(f"Не удалось привязать: {e}")
     else:
-        subscribe_partner(m.bot, m.chat.id, m.from_user.username)
+        await subscribe_partner(m.bot, m.chat.id, m.from_user.username)
         await m.answer(
             "Аккаунт привязан ✅.\n"
             "Оповещения о новых заявках включены автоматически. "
@@ -1,19 +1,20 @@
 import asyncio
 from aiogram import Bot, Dispatcher, F
 from bots.shared.config import settings
+from bots.shared.api_client import close_shared_session
 from bots.shared.logger import setup_logging
 from .handlers import start, requests, cars
-from .poller import subscribe_partner, unsubscribe_partner
+from .poller import subscribe_partner, unsubscribe_partner, restore_partner_subscriptions
 
 async def cmd_subscribe(m, bot):
-    already = not subscribe_partner(bot, m.chat.id, m.from_user.username)
+    already = not await subscribe_partner(bot, m.chat.id, m.from_user.username)
     if already:
         await m.answer("Вы уже подписаны на уведомления о новых заявках.")
     else:
         await m.answer("Подписка оформлена. Будем присылать новые заявки автоматически.")
 
 async def cmd_unsubscribe(m):
-    ok = unsubscribe_partner(m.chat.id)
+    ok = await unsubscribe_partner(m.chat.id)
     if ok:
         await m.answer("Подписка отключена.")
     else:
@@ -27,6 +28,8 @@ async def main():
     dp.include_router(start.router)
     dp.include_router(requests.router)
     dp.include_router(cars.router)
+    dp.startup.register(restore_partner_subscriptions)
+    dp.shutdown.register(close_shared_session)
 
     dp.message.register(lambda m: cmd_subscribe(m, bot), F.text == "/subscribe")
     dp.message.register(cmd_unsubscribe, F.text == "/unsubscribe")
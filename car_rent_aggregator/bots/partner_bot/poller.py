@@ -2,19 +2,25 @@ from __future__ import annotations
 
 import asyncio
 from datetime import datetime, timezone as _tz
-import aiohttp
 from aiogram import Bot
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from bots.shared.api_client import ApiClient
 from bots.shared.i18n import t
+from bots.shared.logger import setup_logging
+from bots.shared.sender import LIMITER
+from bots.shared.state_store import open_store
+from bots.partner_bot.selfie import send_client_selfie
+
+log = setup_logging("partner-poller")
 
 HOLD_MINUTES = 20
 
-# какие заявки уже анонсировали партнёру как pending
-SEEN_PENDING: dict[int, set[int]] = {}   # chat_id -> set(booking_ids)
-# какие оплаты уже анонсировали как paid
-SEEN_PAID: dict[int, set[int]] = {}      # chat_id -> set(booking_ids)
+# какие заявки уже анонсировали партнёру как pending: "chat_id:booking_id"
+SEEN_PENDING = open_store("partner:seen-pending")
+# какие оплаты уже анонсировали как paid: "chat_id:booking_id"
+SEEN_PAID = open_store("partner:seen-paid")
 
 
 def _resolve_partner_lang() -> str:
@@ -66,28 +72,6 @@ def _kb_request_actions(bid: int) -> InlineKeyboardMarkup:
     )
 
 
-async def _send_selfie_from_url(bot: Bot, chat_id: int, selfie_url: str) -> bool:
-    """
-    Качаем картинку по URL и отправляем её как файл.
-    Используется в автопуллере для новых заявок.
-    """
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(selfie_url) as resp:
-                if resp.status != 200:
-                    return False
-                raw = await resp.read()
-    except Exception:
-        return False
-
-    try:
-        file = BufferedInputFile(raw, filename="selfie.jpg")
-        await bot.send_photo(chat_id=chat_id, photo=file)
-        return True
-    except Exception:
-        return False
-
-
 async def _fetch_bookings(username: str | None, chat_id: int, status: str | None = None) -> list[dict]:
     """
     Универсальный helper:
@@ -110,159 +94,219 @@ async def _fetch_bookings(username: str | None, chat_id: int, status: str | None
         await api.close()
 
 
-async def _fetch_paid_bookings(username: str | None, chat_id: int) -> list[dict]:
+async def _announce_pending(bot: Bot, chat_id: int, b: dict):
+    """Карточка новой заявки с кнопками ✅/❌ (и селфи клиента, если есть)."""
+    bid = b["id"]
+    car = b.get("car_title") or f"#{b.get('car')}"
+    plate = b.get("car_plate_number") or ""
+    region = b.get("car_region") or ""
+    df = _fmt_date(b.get("date_from", ""))
+    dt = _fmt_date(b.get("date_to", ""))
+
+    # регион + номер, если есть
+    extra_car_line = ""
+    extra_car = []
+    if region:
+        extra_car.append(f"Регион: {region}")
+    if plate:
+        extra_car.append(f"Госномер: {plate}")
+    if extra_car:
+        extra_car_line = "\n" + " | ".join(extra_car)
+
+    left_min = _left_minutes(b.get("created_at"))
+    ttl_line = ""
+    if left_min is not None:
+        ttl_line = f"\n⏳ Осталось ~{left_min} мин."
+
+    age = b.get("client_age_years")
+    drive_exp = b.get("client_drive_exp")
+
+    client_line = ""
+    parts = []
+    if age:
+        parts.append(f"Возраст клиента: {age}")
+    if drive_exp:
+        parts.append(f"Стаж вождения: {drive_exp} лет")
+    if parts:
+        client_line = "\n" + " | ".join(parts)
+
+    text = (
+        f"🆕 Новая заявка #{bid}\n"
+        f"Авто: {car}\n"
+        f"{extra_car_line}\n"
+        f"{df}–{dt}"
+        f"{ttl_line}"
+        f"{client_line}"
+    )
+
+    # 🧠 сначала пробуем отправить селфи клиента, если есть
+    await send_client_selfie(bot, chat_id, b)
+
+    # затем сама карточка заявки (в пределах лимитов Telegram, как и селфи)
+    await LIMITER.send(
+        chat_id, lambda: bot.send_message(chat_id, text, reply_markup=_kb_request_actions(bid)),
+    )
+
+
+async def _announce_paid(bot: Bot, chat_id: int, b: dict):
+    """Уведомление об оплате заявки."""
+    bid = b["id"]
+    car = b.get("car_title") or f"#{b.get('car')}"
+    plate = b.get("car_plate_number") or ""
+    region = b.get("car_region") or ""
+    df = _fmt_date(b.get("date_from", ""))
+    dt = _fmt_date(b.get("date_to", ""))
+    mode = (b.get("payment_mode") or "").lower()
+    if mode == "adv":
+        mode_txt = "аванс"
+    else:
+        mode_txt = "полная оплата"
+
+    lines = [
+        f"💸 Клиент оплатил заявку #{bid}",
+        f"Авто: {car}",
+    ]
+
+    # регион + номер, если есть
+    extra_car = []
+    if region:
+        extra_car.append(f"Регион: {region}")
+    if plate:
+        extra_car.append(f"Госномер: {plate}")
+    if extra_car:
+        lines.append(" | ".join(extra_car))
+
+    lines.append(f"{df}–{dt}")
+    lines.append(f"Тип оплаты: {mode_txt}.")
+
+    await LIMITER.send(chat_id, lambda: bot.send_message(chat_id, "\n".join(lines)))
+
+
+# Подписанные партнёры: chat_id -> username (кэш SUBSCRIPTIONS)
+SUBSCRIBERS: dict[int, str | None] = {}
+# то же в хранилище — переживает рестарт; без TTL, удаляется /unsubscribe
+SUBSCRIPTIONS = open_store("partner:subscribers", ttl=0)
+
+# Сколько секунд backend держит long-poll /events/consume/
+EVENTS_WAIT = 25
+# Имя потребителя ленты событий (смещение хранится на backend)
+CONSUMER = "partner-bot"
+
+
+async def _announce_once(seen, key: str, announce, bot: Bot, chat_id: int, b: dict) -> None:
     """
-    Получаем брони партнёра, у которых payment_marker = 'paid'.
-    Статус брони (confirmed/completed/...) неважен.
+    Анонс ровно один раз: ключ отмечается в seen только после успешной отправки.
+    Ошибка отправки пробрасывается — пачка событий не подтверждается и будет
+    перечитана, а неотмеченный ключ даст повторную попытку. Ошибки, которые
+    повтором не исправить (бот заблокирован, запрос отвергнут), ленту не держат:
+    заблокировавший бота чат отписываем.
     """
-    items = await _fetch_bookings(username, chat_id, status=None)
-    result: list[dict] = []
-    for b in items:
-        pm = (b.get("payment_marker") or "").lower()
-        if pm == "paid":
-            result.append(b)
-    return result
+    if await seen.contains(key):
+        return
+    try:
+        await announce(bot, chat_id, b)
+    except TelegramForbiddenError as e:
+        log.warning("chat %s blocked the bot, unsubscribing: %r", chat_id, e)
+        await unsubscribe_partner(chat_id)
+        return
+    except TelegramBadRequest as e:
+        # повтор не поможет (битый текст/разметка) — отмечаем, чтобы не держать ленту
+        log.error("announce %s to chat %s rejected: %r", key, chat_id, e)
+    await seen.set(key, 1)
+
+
+async def _announce_existing(bot: Bot, chat_id: int, username: str | None):
+    """При подписке — уже висящие pending-заявки партнёра."""
+    try:
+        for b in await _fetch_bookings(username, chat_id, status="pending"):
+            await _announce_once(SEEN_PENDING, f"{chat_id}:{b['id']}", _announce_pending, bot, chat_id, b)
+    except Exception as e:
+        log.exception("announce existing for chat %s failed: %r", chat_id, e)
+
+
+def _targets(ev: dict) -> list[int]:
+    """Подписанные чаты пользователей партнёра, которому адресована бронь."""
+    tg_ids = set(ev.get("partner_user_tg_ids") or [])
+    usernames = set(ev.get("partner_usernames") or [])
+    return [
+        chat_id for chat_id, username in SUBSCRIBERS.items()
+        if (username and username.lower() in usernames) or chat_id in tg_ids
+    ]
 
 
-async def notify_loop(bot: Bot, chat_id: int, username: str | None):
+async def notify_dispatcher(bot: Bot):
     """
-    Каждые 20 сек:
+    Один long-poll /events/consume/ на всех подписанных партнёров:
       • новые pending заявки -> карточка с кнопками ✅/❌
       • новые оплаченные заявки (payment_marker=paid) -> уведомление об оплате
+    Событие приходит примерно через секунду после изменения брони.
+    Обработанная пачка подтверждается через /events/ack/ — после рестарта
+    бот дочитает то, что пришло, пока он лежал.
     """
-    lang = _resolve_partner_lang()
+    api = ApiClient()
 
     while True:
         try:
-            # ---- pending заявки
-            pendings = await _fetch_bookings(username, chat_id, status="pending")
-            seen_p = SEEN_PENDING.setdefault(chat_id, set())
-            for b in pendings:
-                bid = b["id"]
-                if bid in seen_p:
-                    continue
-                seen_p.add(bid)
-
-                car = b.get("car_title") or f"#{b.get('car')}"
-                plate = b.get("car_plate_number") or ""
-                region = b.get("car_region") or ""
-                df = _fmt_date(b.get("date_from", ""))
-                dt = _fmt_date(b.get("date_to", ""))
-
-                # регион + номер, если есть
-                extra_car_line = ""
-                extra_car = []
-                if region:
-                    extra_car.append(f"Регион: {region}")
-                if plate:
-                    extra_car.append(f"Госномер: {plate}")
-                if extra_car:
-                    extra_car_line = "\n" + " | ".join(extra_car)
-
-                left_min = _left_minutes(b.get("created_at"))
-                ttl_line = ""
-                if left_min is not None:
-                    ttl_line = f"\n⏳ Осталось ~{left_min} мин."
-
-                age = b.get("client_age_years")
-                drive_exp = b.get("client_drive_exp")
-
-                client_line = ""
-                parts = []
-                if age:
-                    parts.append(f"Возраст клиента: {age}")
-                if drive_exp:
-                    parts.append(f"Стаж вождения: {drive_exp} лет")
-                if parts:
-                    client_line = "\n" + " | ".join(parts)
-
-                text = (
-                    f"🆕 Новая заявка #{bid}\n"
-                    f"Авто: {car}\n"
-                    f"{extra_car_line}\n"
-                    f"{df}–{dt}"
-                    f"{ttl_line}"
-                    f"{client_line}"
-                )
-
-                # 🧠 сначала пробуем отправить селфи клиента, если есть
-                selfie_url = b.get("client_selfie_url")
-                if selfie_url:
-                    await _send_selfie_from_url(bot, chat_id, selfie_url)
-
-                # затем сама карточка заявки
-                await bot.send_message(
-                    chat_id,
-                    text,
-                    reply_markup=_kb_request_actions(bid),
-                )
-
-            # ---- оплаченные заявки (payment_marker=paid)
-            paids = await _fetch_paid_bookings(username, chat_id)
-            seen_paid = SEEN_PAID.setdefault(chat_id, set())
-            for b in paids:
+            page = await api.get(
+                "/events/consume/",
+                params={"consumer": CONSUMER, "timeout": EVENTS_WAIT, "limit": 200, "audience": "partner"},
+            )
+            for ev in page.get("events") or []:
+                b = ev["booking"]
                 bid = b["id"]
-                if bid in seen_paid:
-                    continue
-                seen_paid.add(bid)
-
-                car = b.get("car_title") or f"#{b.get('car')}"
-                plate = b.get("car_plate_number") or ""
-                region = b.get("car_region") or ""
-                df = _fmt_date(b.get("date_from", ""))
-                dt = _fmt_date(b.get("date_to", ""))
-                mode = (b.get("payment_mode") or "").lower()
-                if mode == "adv":
-                    mode_txt = "аванс"
-                else:
-                    mode_txt = "полная оплата"
-
-                lines = [
-                    f"💸 Клиент оплатил заявку #{bid}",
-                    f"Авто: {car}",
-                ]
-
-                # регион + номер, если есть
-                extra_car = []
-                if region:
-                    extra_car.append(f"Регион: {region}")
-                if plate:
-                    extra_car.append(f"Госномер: {plate}")
-                if extra_car:
-                    lines.append(" | ".join(extra_car))
-
-                lines.append(f"{df}–{dt}")
-                lines.append(f"Тип оплаты: {mode_txt}.")
-
-                await bot.send_message(
-                    chat_id,
-                    "\n".join(lines),
-                )
-
-        except Exception:
-            # не убиваем цикл даже при ошибках
-            pass
-
-        await asyncio.sleep(20)
-
-
-SUB_TASKS: dict[int, asyncio.Task] = {}
-
-
-def subscribe_partner(bot: Bot, chat_id: int, username: str | None):
+                for chat_id in _targets(ev):
+                    key = f"{chat_id}:{bid}"
+                    # ---- pending заявки (статус на момент события)
+                    if ev.get("status") == "pending":
+                        await _announce_once(SEEN_PENDING, key, _announce_pending, bot, chat_id, b)
+                    # ---- оплаченные заявки (payment_marker=paid)
+                    if (ev.get("payment_marker") or "").lower() == "paid":
+                        await _announce_once(SEEN_PAID, key, _announce_paid, bot, chat_id, b)
+            if page.get("events"):
+                await api.post("/events/ack/", json={"consumer": CONSUMER, "cursor": page["cursor"]})
+
+        except Exception as e:
+            # не убиваем цикл даже при ошибках; пачка не подтверждена — её перечитаем,
+            # уже отправленное отсеют SEEN_*
+            log.exception("notify_dispatcher error: %r", e)
+            await asyncio.sleep(5)
+
+
+_DISPATCHER_TASK: asyncio.Task | None = None
+
+
+async def subscribe_partner(bot: Bot, chat_id: int, username: str | None):
     """
-    Включаем фоновые уведомления. Если задача уже есть — ничего не делаем.
+    Включаем фоновые уведомления. Если чат уже подписан — ничего не делаем.
     """
-    tsk = SUB_TASKS.get(chat_id)
-    if tsk and not tsk.done():
+    if chat_id in SUBSCRIBERS:
         return False
-    SUB_TASKS[chat_id] = asyncio.create_task(notify_loop(bot, chat_id, username))
+    SUBSCRIBERS[chat_id] = username
+    await SUBSCRIPTIONS.set(str(chat_id), username)
+    asyncio.create_task(_announce_existing(bot, chat_id, username))
+    _ensure_dispatcher(bot)
     return True
 
 
-def unsubscribe_partner(chat_id: int):
-    tsk = SUB_TASKS.get(chat_id)
-    if tsk and not tsk.done():
-        tsk.cancel()
-        return True
-    return False
+def _ensure_dispatcher(bot: Bot):
+    global _DISPATCHER_TASK
+    if _DISPATCHER_TASK is None or _DISPATCHER_TASK.done():
+        _DISPATCHER_TASK = asyncio.create_task(notify_dispatcher(bot))
+
+
+async def unsubscribe_partner(chat_id: int):
+    await SUBSCRIPTIONS.delete(str(chat_id))
+    return SUBSCRIBERS.pop(chat_id, False) is not False
+
+
+async def restore_partner_subscriptions(bot: Bot):
+    """
+    dp.startup: поднимаем подписки из хранилища. Уже висящие заявки не
+    переанонсируем — SEEN_* тоже сохранены, а пропущенное за время простоя
+    бот дочитает из ленты событий.
+    """
+    for key, username in await SUBSCRIPTIONS.items():
+        SUBSCRIBERS[int(key)] = username
+    if SUBSCRIBERS:
+        log.info("Restored %s partner subscriptions", len(SUBSCRIBERS))
+        _ensure_dispatcher(bot)
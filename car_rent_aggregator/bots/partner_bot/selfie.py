@@ -0,0 +1,89 @@
+# bots/partner_bot/selfie.py
+"""
+Селфи клиента в карточках заявок партнёру.
+
+В Telegram фото загружается один раз на селфи: полученный file_id партнёрского
+бота сохраняется на backend (/users/selfie/file-id/, приходит в брони как
+client_selfie_file_id) и в локальном кэше — дальше селфи уходит по file_id.
+Без file_id файл читается с диска (BOTS_MEDIA_ROOT + client_selfie_rel);
+по client_selfie_url через общую сессию — только если media боту недоступна.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile
+
+from bots.shared.api_client import ApiClient, get_shared_session
+from bots.shared.config import settings
+from bots.shared.logger import setup_logging
+from bots.shared.sender import LIMITER
+from bots.shared.state_store import open_store
+
+log = setup_logging("partner-selfie")
+
+# путь селфи (относительно MEDIA_ROOT) -> file_id партнёрского бота
+FILE_IDS = open_store("partner:selfie-ids")
+
+
+def _local_file(rel: str | None) -> FSInputFile | None:
+    if not rel or not settings.media_root:
+        return None
+    fp = Path(settings.media_root) / rel
+    return FSInputFile(str(fp)) if fp.exists() else None
+
+
+async def _download(url: str | None) -> BufferedInputFile | None:
+    if not url:
+        return None
+    try:
+        async with get_shared_session().get(url) as resp:
+            if resp.status != 200:
+                return None
+            return BufferedInputFile(await resp.read(), filename="selfie.jpg")
+    except Exception:
+        return None
+
+
+async def _remember(rel: str, file_id: str) -> None:
+    await FILE_IDS.set(rel, file_id)
+    try:
+        await ApiClient().post("/users/selfie/file-id/", json={"selfie": rel, "file_id": file_id})
+    except Exception as e:
+        log.warning("selfie file_id save failed: %r", e)
+
+
+async def send_client_selfie(bot: Bot, chat_id: int, booking: dict) -> bool:
+    """Отправить партнёру селфи клиента из брони. False — селфи нет или отправить не удалось."""
+    rel = booking.get("client_selfie_rel")
+    url = booking.get("client_selfie_url")
+    if not rel and not url:
+        return False
+
+    def send_photo(photo):
+        return LIMITER.send(chat_id, lambda: bot.send_photo(chat_id=chat_id, photo=photo))
+
+    file_id = ((await FILE_IDS.get(rel)) if rel else None) or booking.get("client_selfie_file_id")
+    if file_id:
+        try:
+            await send_photo(file_id)
+            return True
+        except TelegramBadRequest:
+            # file_id не принят — загрузим файл заново и перезапишем его
+            if rel:
+                await FILE_IDS.delete(rel)
+        except Exception:
+            return False
+
+    source = _local_file(rel) or await _download(url)
+    if source is None:
+        return False
+    try:
+        sent = await send_photo(source)
+    except Exception:
+        return False
+    if rel and sent.photo:
+        await _remember(rel, sent.photo[-1].file_id)
+    return True
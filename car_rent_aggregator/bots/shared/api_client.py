@@ -1,29 +1,177 @@
+import asyncio
+import logging
+import random
+import time
+
 import aiohttp
 from .config import settings
 
+log = logging.getLogger("api-client")
+
+# Одна aiohttp-сессия (и пул соединений) на процесс бота.
+# Создаётся лениво в текущем event loop, закрывается на shutdown диспетчера.
+_shared_session: aiohttp.ClientSession | None = None
+_shared_loop: asyncio.AbstractEventLoop | None = None
+
+# Таймауты (сек) по префиксу пути; остальное — settings.api_timeout.
+ENDPOINT_TIMEOUTS: dict[str, float] = {
+    "/cars/search/": 10,
+    "/users/selfie/": 30,
+    "/bookings/": 10,
+    "/payments/": 15,
+    "/events/consume/": 35,  # long-poll держится до 25 сек
+}
+
+# Ответы, после которых GET имеет смысл повторить (backend перезапускается/перегружен)
+RETRY_STATUSES = {502, 503, 504}
+
+# Счётчики для логов/диагностики: сколько было повторов, открытий breaker'а и т.д.
+STATS = {
+    "requests": 0,
+    "retries": 0,
+    "timeouts": 0,
+    "failures": 0,
+    "circuit_opened": 0,
+    "short_circuited": 0,
+}
+
+
+class ApiUnavailable(aiohttp.ClientConnectionError):
+    """Backend недоступен: breaker открыт, запрос не отправлялся."""
+
+
+class _Retry(Exception):
+    pass
+
+
+def _new_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=settings.api_conn_limit,
+        limit_per_host=settings.api_conn_limit_per_host,
+        keepalive_timeout=settings.api_keepalive_timeout,
+        ttl_dns_cache=settings.api_dns_ttl,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.api_timeout,
+        connect=settings.api_connect_timeout,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+def get_shared_session() -> aiohttp.ClientSession:
+    global _shared_session, _shared_loop
+    loop = asyncio.get_running_loop()
+    if _shared_session is None or _shared_session.closed or _shared_loop is not loop:
+        _shared_session = _new_session()
+        _shared_loop = loop
+    return _shared_session
+
+
+async def close_shared_session():
+    """Закрыть общий пул. Регистрируется в dp.shutdown."""
+    global _shared_session, _shared_loop
+    if _shared_session and not _shared_session.closed:
+        await _shared_session.close()
+    _shared_session = None
+    _shared_loop = None
+
+
+class CircuitBreaker:
+    """
+    closed -> (threshold сбоев подряд) -> open -> (reset_after сек) -> half-open:
+    пропускаем один пробный запрос; успех закрывает breaker, сбой снова открывает.
+    """
+
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at < self.reset_after or self._probe:
+            return False
+        self._probe = True  # half-open: один запрос на разведку
+        return True
+
+    def release(self):
+        """Пробный запрос оборвался без ответа (отмена, ошибка разбора) — пустить следующий."""
+        self._probe = False
+
+    def success(self):
+        if self.opened_at is not None:
+            log.info("API circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probe = False
+
+    def failure(self):
+        self.failures += 1
+        self._probe = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                STATS["circuit_opened"] += 1
+                log.warning("API circuit opened after %s failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def _breaker(base_url: str) -> CircuitBreaker:
+    br = _breakers.get(base_url)
+    if br is None:
+        br = _breakers[base_url] = CircuitBreaker(
+            settings.api_breaker_threshold, settings.api_breaker_reset,
+        )
+    return br
+
+
+def _timeout_for(path: str) -> aiohttp.ClientTimeout:
+    total = settings.api_timeout
+    for prefix, value in ENDPOINT_TIMEOUTS.items():
+        if path.startswith(prefix):
+            total = value
+            break
+    return aiohttp.ClientTimeout(total=total, connect=settings.api_connect_timeout)
+
+
+def _backoff(attempt: int) -> float:
+    """Экспоненциальная задержка с полным джиттером."""
+    cap = min(settings.api_retry_max_delay, settings.api_retry_base_delay * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
 class ApiClient:
     """
     Обёртка для DRF-запросов. Автоматически добавляет X-Api-Key.
     В случае ошибки печатает тело ответа, чтобы понимать причину (403/400/...).
+
+    Все экземпляры работают поверх общей сессии процесса (keep-alive, лимиты
+    соединений, DNS-кэш, таймауты), поэтому создавать ApiClient() на каждый
+    вызов дёшево. close() оставлен для совместимости и ничего не закрывает.
+
+    Устойчивость: таймаут по эндпоинту (ENDPOINT_TIMEOUTS), повторы GET
+    с экспоненциальной задержкой, общий circuit breaker на base_url —
+    пока backend лежит, запросы сразу падают с ApiUnavailable.
     """
 
     def __init__(self, base_url: str | None = None, api_key: str | None = None):
         self.base_url = (base_url or settings.api_base_url).rstrip("/")
         self.api_key = api_key or settings.api_key
-        self._session: aiohttp.ClientSession | None = None
+        self._headers: dict = {}
+        # ВАЖНО: X-Api-Key должен быть непустым
+        if not self.api_key:
+            if settings.debug_bots:
+                print("[ApiClient] WARNING: api_key пустой — запросы будут получать 403")
+        else:
+            self._headers["X-Api-Key"] = self.api_key
 
     async def _get_sess(self) -> aiohttp.ClientSession:
-        if not self._session or self._session.closed:
-            headers = {"Content-Type": "application/json"}
-            # ВАЖНО: X-Api-Key должен быть непустым
-            if not self.api_key:
-                if settings.debug_bots:
-                    print("[ApiClient] WARNING: api_key пустой — запросы будут получать 403")
-            else:
-                headers["X-Api-Key"] = self.api_key
-
-            self._session = aiohttp.ClientSession(headers=headers)
-        return self._session
+        return get_shared_session()
 
     async def _handle(self, resp: aiohttp.ClientResponse):
         text = await resp.text()
@@ -38,16 +186,78 @@ class ApiClient:
             resp.request_info, resp.history, status=resp.status, message=text or resp.reason
         )
 
-    async def get(self, path: str, params: dict | None = None):
-        s = await self._get_sess()
-        async with s.get(self.base_url + path, params=params) as r:
-            return await self._handle(r)
+    async def _request(self, method: str, path: str, *, retries: int, timeout: float | None,
+                       headers: dict | None = None, **kwargs):
+        br = _breaker(self.base_url)
+        tmo = (aiohttp.ClientTimeout(total=timeout, connect=settings.api_connect_timeout)
+               if timeout else _timeout_for(path))
+        headers = {**self._headers, **(headers or {})}
+        attempt = 0
+        while True:
+            if not br.allow():
+                STATS["short_circuited"] += 1
+                raise ApiUnavailable(f"backend unavailable ({method} {path})")
+
+            STATS["requests"] += 1
+            s = await self._get_sess()
+            try:
+                async with s.request(method, self.base_url + path, headers=headers,
+                                     timeout=tmo, **kwargs) as r:
+                    if r.status in RETRY_STATUSES:
+                        br.failure()
+                        if attempt < retries:
+                            raise _Retry()
+                        STATS["failures"] += 1
+                    else:
+                        br.success()  # 4xx — backend жив, это ошибка запроса
+                    return await self._handle(r)
+            except _Retry:
+                pass
+            except asyncio.TimeoutError:
+                STATS["timeouts"] += 1
+                br.failure()
+                if attempt >= retries:
+                    STATS["failures"] += 1
+                    raise
+            except aiohttp.ClientConnectionError:
+                br.failure()
+                if attempt >= retries:
+                    STATS["failures"] += 1
+                    raise
+            except BaseException:
+                # CancelledError, ClientPayloadError, 4xx из _handle...: без release()
+                # half-open breaker остался бы с занятым пробным слотом навсегда
+                br.release()
+                raise
+
+            attempt += 1
+            STATS["retries"] += 1
+            delay = _backoff(attempt)
+            log.warning("API %s %s: retry %s/%s in %.2fs", method, path, attempt, retries, delay)
+            await asyncio.sleep(delay)
+
+    async def get(self, path: str, params: dict | None = None, *, timeout: float | None = None):
+        # GET идемпотентен — можно повторять
+        return await self._request("GET", path, params=params,
+                                   retries=settings.api_get_retries, timeout=timeout)
+
+    async def post(self, path: str, json: dict | None = None, *, timeout: float | None = None):
+        # POST не повторяем: запрос мог дойти и изменить данные
+        return await self._request("POST", path, json=json, retries=0, timeout=timeout)
 
-    async def post(self, path: str, json: dict | None = None):
-        s = await self._get_sess()
-        async with s.post(self.base_url + path, json=json) as r:
-            return await self._handle(r)
+    async def upload(self, path: str, data, *, size: int, content_type: str, filename: str,
+                     params: dict | None = None, timeout: float | None = None):
+        """
+        POST файла «сырым» телом: data — bytes или async-итератор чанков, size — его длина.
+        Content-Length задаём сами, поэтому чанки уходят в сокет по мере поступления,
+        без сборки файла в памяти. Не повторяется: поток не перечитать.
+        """
+        return await self._request("POST", path, params=params, data=data, retries=0, timeout=timeout, headers={
+            "Content-Type": content_type,
+            "Content-Length": str(size),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        })
 
     async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
+        # Сессия общая для процесса — закрывается в close_shared_session() на shutdown.
+        return None
@@ -24,6 +24,30 @@ class Settings(BaseModel):
     debug_bots: bool = os.getenv("DEBUG_BOTS", "0") in ("1", "true", "True")
     media_root: str = os.getenv("BOTS_MEDIA_ROOT", "")
 
+    # HTTP-пул к backend (общая aiohttp-сессия, см. api_client.py)
+    api_conn_limit: int = int(os.getenv("API_CONN_LIMIT", "100"))
+    api_conn_limit_per_host: int = int(os.getenv("API_CONN_LIMIT_PER_HOST", "30"))
+    api_keepalive_timeout: float = float(os.getenv("API_KEEPALIVE_TIMEOUT", "30"))
+    api_dns_ttl: int = int(os.getenv("API_DNS_TTL", "300"))
+    api_timeout: float = float(os.getenv("API_TIMEOUT", "15"))
+    api_connect_timeout: float = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+    # Повторы GET и circuit breaker
+    api_get_retries: int = int(os.getenv("API_GET_RETRIES", "3"))
+    api_retry_base_delay: float = float(os.getenv("API_RETRY_BASE_DELAY", "0.3"))
+    api_retry_max_delay: float = float(os.getenv("API_RETRY_MAX_DELAY", "5"))
+    api_breaker_threshold: int = int(os.getenv("API_BREAKER_THRESHOLD", "5"))
+    api_breaker_reset: float = float(os.getenv("API_BREAKER_RESET", "30"))
+    # Лимиты Telegram для отправки (см. sender.py)
+    tg_rate_global: float = float(os.getenv("TG_RATE_GLOBAL", "30"))
+    tg_rate_per_chat: float = float(os.getenv("TG_RATE_PER_CHAT", "1"))
+    tg_chat_burst: float = float(os.getenv("TG_CHAT_BURST", "10"))
+    # Состояние поллеров (см. state_store.py): memory | sqlite | redis
+    state_backend: str = os.getenv("BOT_STATE_BACKEND", "sqlite")
+    state_path: str = os.getenv("BOT_STATE_PATH", "bots_state.sqlite3")
+    state_redis_url: str = os.getenv("BOT_STATE_REDIS_URL", "redis://127.0.0.1:6379/0")
+    state_max_items: int = int(os.getenv("BOT_STATE_MAX_ITEMS", "50000"))
+    state_ttl: float = float(os.getenv("BOT_STATE_TTL", str(30 * 24 * 3600)))  # 30 дней
+
 settings = Settings()
 
 # Небольшой дебаг-лог (видно в консоли бота)
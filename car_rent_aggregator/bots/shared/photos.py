@@ -0,0 +1,212 @@
+"""
+Отправка фото авто через кэш Telegram file_id.
+
+Первый раз файл загружается в Telegram (FSInputFile или URL), полученный
+file_id запоминается — локально (state_store) и на backend (/cars/photo-ids/),
+дальше то же фото уходит по file_id без повторной загрузки. Ключ — путь файла
+относительно MEDIA_ROOT и SHA-256 его содержимого: заменённый файл получит
+новый file_id. file_id привязан к боту, поэтому кэш у каждого бота свой.
+"""
+import asyncio
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from .api_client import ApiClient
+from .config import settings
+from .logger import setup_logging
+from .sender import LIMITER
+from .state_store import open_store
+
+log = setup_logging("photos")
+
+# сколько несохранённых на backend file_id держим, пока он недоступен
+MAX_UNSAVED = 1000
+
+
+@lru_cache(maxsize=4096)
+def _hash_file(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_hash(fp: Path) -> str:
+    """SHA-256 файла; пересчитывается только при смене mtime/размера."""
+    st = os.stat(fp)
+    return _hash_file(str(fp), st.st_mtime_ns, st.st_size)
+
+
+class PhotoSender:
+    def __init__(self, bot_name: str):
+        self.bot_name = bot_name
+        self._ids = open_store(f"{bot_name}:photo-ids")
+        self._root = Path(settings.media_root) if settings.media_root else None
+        self._unsaved: list[dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _local_file(self, rel: str) -> Optional[Path]:
+        if not self._root or not rel:
+            return None
+        fp = self._root / rel
+        return fp if fp.exists() else None
+
+    def _key(self, rel: str) -> tuple[str, str]:
+        fp = self._local_file(rel)
+        digest = file_hash(fp) if fp else ""
+        return f"{rel}|{digest}", digest
+
+    async def prefetch(self, paths: Iterable[str]) -> None:
+        """Подтянуть с backend file_id для путей, которых нет в локальном кэше (один запрос)."""
+        keys = {p: self._key(p)[0] for p in dict.fromkeys(paths) if p}
+        cached = await self._ids.get_many(keys.values())
+        missing = [p for p, key in keys.items() if key not in cached]
+        if not missing:
+            return
+        try:
+            resp = await ApiClient().get("/cars/photo-ids/", params={"bot": self.bot_name, "paths": ",".join(missing)})
+        except Exception as e:
+            log.warning("photo-ids lookup failed: %r", e)
+            return
+        for item in resp.get("items") or []:
+            await self._ids.set(f"{item['path']}|{item['hash']}", item["file_id"])
+
+    async def _remember(self, rel: str, digest: str, file_id: str) -> None:
+        await self._ids.set(f"{rel}|{digest}", file_id)
+        self._unsaved.append({"path": rel, "hash": digest, "file_id": file_id})
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self, delay: float = 1.0) -> None:
+        # новые file_id уходят на backend пачкой, не задерживая отправку карточек
+        await asyncio.sleep(delay)
+        items, self._unsaved = self._unsaved[:50], self._unsaved[50:]
+        try:
+            await ApiClient().post("/cars/photo-ids/", json={"bot": self.bot_name, "items": items})
+        except Exception as e:
+            # пачку не теряем: вернём в очередь и повторим позже
+            log.warning("photo-ids save failed: %r", e)
+            self._unsaved = (items + self._unsaved)[-MAX_UNSAVED:]
+            self._flush_task = asyncio.create_task(self._flush(delay=30.0))
+            return
+        if self._unsaved:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def send(self, bot: Bot, chat_id: int, *, rel: Optional[str], url: Optional[str] = None,
+                   **kwargs) -> Optional[Message]:
+        """
+        Отправить фото: file_id из кэша -> локальный файл -> URL (в пределах лимитов LIMITER).
+        None — отправить не удалось (вызывающий код шлёт текст без фото).
+        """
+        def send_photo(photo):
+            return LIMITER.send(chat_id, lambda: bot.send_photo(chat_id, photo=photo, **kwargs))
+
+        if rel:
+            key, digest = self._key(rel)
+            file_id = await self._ids.get(key)
+            if file_id:
+                try:
+                    return await send_photo(file_id)
+                except TelegramBadRequest:
+                    # file_id протух или от другого бота — забываем и грузим заново
+                    await self._ids.delete(key)
+                except Exception as e:
+                    # сеть/ошибка Telegram — file_id не виноват, но пробуем файл или URL
+                    log.warning("photo %s by file_id failed: %r", rel, e)
+
+            fp = self._local_file(rel)
+            sources = [FSInputFile(str(fp))] if fp else []
+            if url:
+                sources.append(url)
+            for source in sources:
+                try:
+                    sent = await send_photo(source)
+                except Exception:
+                    continue
+                if sent.photo:
+                    await self._remember(rel, digest, sent.photo[-1].file_id)
+                return sent
+            return None
+
+        if url:
+            try:
+                return await send_photo(url)
+            except Exception:
+                return None
+        return None
+
+    async def _album_source(self, rel: str):
+        key, digest = self._key(rel)
+        file_id = await self._ids.get(key)
+        if file_id:
+            return file_id, key, digest
+        fp = self._local_file(rel)
+        return (FSInputFile(str(fp)) if fp else None), key, digest
+
+    @staticmethod
+    def _album_chunks(rels: list[str]) -> list[list[str]]:
+        # sendMediaGroup принимает от 2 до 10 фото: делим поровну, чтобы не осталось хвоста из одного
+        if not rels:
+            return []
+        n = -(-len(rels) // 10)
+        size, extra = divmod(len(rels), n)
+        chunks, i = [], 0
+        for k in range(n):
+            step = size + (1 if k < extra else 0)
+            chunks.append(rels[i:i + step])
+            i += step
+        return chunks
+
+    async def _send_each(self, bot: Bot, chat_id: int, rels: list[str]) -> int:
+        sent = 0
+        for rel in rels:
+            if await self.send(bot, chat_id, rel=rel):
+                sent += 1
+        return sent
+
+    async def send_album(self, bot: Bot, chat_id: int, rels: list[str]) -> int:
+        """
+        Фото одним альбомом (send_media_group, 2–10 в пачке). Возвращает число отправленных.
+        Если какой-то file_id отвергнут — забываем кэш альбома и шлём файлами; если
+        Telegram не принял и альбом из файлов — фото уходят по одному через send().
+        Одиночное фото альбомом не шлётся — сразу send().
+        """
+        sent_total = 0
+        for chunk in self._album_chunks(rels):
+            for use_cache in (True, False):
+                items = []
+                for rel in chunk:
+                    source, key, digest = await self._album_source(rel)
+                    if not use_cache and isinstance(source, str):
+                        await self._ids.delete(key)
+                        source, key, digest = await self._album_source(rel)
+                    if source is not None:
+                        items.append((rel, digest, source))
+                if len(items) < 2:
+                    sent_total += await self._send_each(bot, chat_id, [rel for rel, _, _ in items])
+                    break
+                media = [InputMediaPhoto(media=source) for _, _, source in items]
+                try:
+                    messages = await LIMITER.send(
+                        chat_id, lambda: bot.send_media_group(chat_id, media=media), cost=len(media),
+                    )
+                except TelegramBadRequest as e:
+                    if use_cache:
+                        continue
+                    log.warning("album rejected, sending photos one by one: %r", e)
+                    sent_total += await self._send_each(bot, chat_id, [rel for rel, _, _ in items])
+                    break
+                for (rel, digest, source), m in zip(items, messages):
+                    if not isinstance(source, str) and m.photo:
+                        await self._remember(rel, digest, m.photo[-1].file_id)
+                sent_total += len(messages)
+                break
+        return sent_total
@@ -0,0 +1,51 @@
+# bots/shared/pricing.py
+"""
+Расчёт стоимости аренды на стороне ботов.
+
+Зеркало apps/common/pricing.py на бэкенде (боты не импортируют Django):
+сутки аренды — даты от start (включительно) до end (исключая),
+будни -> price_weekday, СБ/ВС -> price_weekend (если пусто — weekday).
+Будние/выходные дни считаются в закрытой форме за O(1).
+"""
+from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal("0.01")
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _weekends_before(x: int) -> int:
+    """Сколько СБ/ВС среди дней 0..x-1, если день 0 — понедельник."""
+    return (x // 7) * 2 + max(0, x % 7 - 5)
+
+
+def count_days(start, end) -> tuple[int, int]:
+    """(будних, выходных) суток аренды в [start, end)."""
+    d0 = _as_date(start)
+    n = max((_as_date(end) - d0).days, 0)
+    w0 = d0.weekday()
+    weekends = _weekends_before(w0 + n) - _weekends_before(w0)
+    return n - weekends, weekends
+
+
+def _to_decimal(value) -> Decimal:
+    if value in (None, ""):
+        return Decimal("0")
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def quote_for_counts(counts: tuple[int, int], price_weekday, price_weekend=None) -> Decimal:
+    weekdays, weekends = counts
+    pw = _to_decimal(price_weekday)
+    we = _to_decimal(price_weekend) or pw
+    return (pw * weekdays + we * weekends).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def quote(start, end, price_weekday, price_weekend=None) -> Decimal:
+    """Стоимость аренды одной машины за [start, end)."""
+    return quote_for_counts(count_days(start, end), price_weekday, price_weekend)
@@ -0,0 +1,144 @@
+"""
+Отправка сообщений бота с учётом лимитов Telegram.
+
+RateLimiter — token bucket: общий (TG_RATE_GLOBAL msg/сек на бота) и по
+чату (TG_RATE_PER_CHAT msg/сек с запасом TG_CHAT_BURST на короткий всплеск,
+например страницу карточек). Все отправки идут через LIMITER.send():
+он выжидает свою очередь и прозрачно повторяет запрос после RetryAfter.
+
+OutboundQueue — очередь фоновых рассылок (уведомления поллеров): один
+воркер отправляет их по порядку через тот же LIMITER, чтобы не упираться
+в лимиты Telegram при всплеске событий. put() возвращает future отправки —
+поллер подтверждает событие только после того, как уведомление ушло.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from .config import settings
+from .logger import setup_logging
+
+log = setup_logging("outbox")
+
+SendFactory = Callable[[], Awaitable]
+
+
+class TokenBucket:
+    """
+    Ведро с резервированием: reserve() сразу списывает токены (баланс может уйти
+    в минус) и возвращает, сколько ждать до своей очереди. Без await между
+    проверкой и списанием — в одном event loop гонок нет.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost: float = 1.0) -> float:
+        self._refill(time.monotonic())
+        self.tokens -= cost
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def block(self, seconds: float):
+        """Никого не пускать ближайшие seconds (ответ RetryAfter)."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    MAX_CHATS = 10_000
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats: Dict[int, TokenBucket] = {}
+
+    def _chat(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHATS:
+                # забываем чаты с полным ведром — для них лимит и так не действует
+                self._chats = {k: v for k, v in self._chats.items() if not v.idle}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def acquire(self, chat_id: int, cost: float = 1.0):
+        wait = max(self.global_bucket.reserve(cost), self._chat(chat_id).reserve(cost))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def send(self, chat_id: int, factory: SendFactory, *, cost: float = 1.0):
+        """Выполнить запрос к Telegram в пределах лимитов; RetryAfter — подождать и повторить."""
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, cost)
+            try:
+                return await factory()
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                log.warning("chat %s: flood control, retry in %ss", chat_id, e.retry_after)
+                self._chat(chat_id).block(e.retry_after)
+
+
+LIMITER = RateLimiter(
+    global_rate=settings.tg_rate_global,
+    chat_rate=settings.tg_rate_per_chat,
+    chat_burst=settings.tg_chat_burst,
+)
+
+
+class OutboundQueue:
+    def __init__(self, limiter: RateLimiter = LIMITER):
+        self.limiter = limiter
+        self._queue: "asyncio.Queue[tuple[int, SendFactory, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    def put(self, chat_id: int, factory: SendFactory) -> asyncio.Future:
+        """
+        Поставить отправку в очередь. factory — функция, возвращающая корутину запроса к Telegram.
+        Возвращает future с результатом запроса (или его ошибкой).
+        """
+        self._ensure_worker()
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((chat_id, factory, fut))
+        return fut
+
+    def send_message(self, bot: Bot, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        return self.put(chat_id, lambda: bot.send_message(chat_id, text, **kwargs))
+
+    async def _worker(self):
+        while True:
+            chat_id, factory, fut = await self._queue.get()
+            try:
+                result = await self.limiter.send(chat_id, factory)
+            except Exception as e:
+                log.warning("outbound send to chat %s failed: %r", chat_id, e)
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                if not fut.done():
+                    fut.set_result(result)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,249 @@
+"""
+Хранилище состояния поллеров (кого уже уведомили, кто подписан и т.п.).
+
+Раньше это были глобальные dict'ы процесса: после деплоя бот забывал
+подписки и заново слал старые заявки, а память росла без ограничений.
+Теперь каждое пространство имён — отдельный StateStore с ограничением
+размера (LRU) и временем жизни записей (TTL).
+
+Бэкенды (BOT_STATE_BACKEND):
+  • memory — LRU+TTL в памяти процесса (не переживает рестарт);
+  • sqlite — файл BOT_STATE_PATH, переживает рестарт (по умолчанию);
+  • redis  — BOT_STATE_REDIS_URL, асинхронный клиент redis.asyncio; подходит
+             любой клиент с async-методами get/mget/set(ex=)/delete/scan_iter
+             (например, fakeredis.aioredis локально).
+
+Ключи — строки, значения — любые JSON-сериализуемые объекты. Методы —
+корутины: хранилище вызывается из поллеров и хэндлеров, и медленный или
+недоступный Redis не должен останавливать цикл событий.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from .config import settings
+
+_MISSING = object()
+
+
+class StateStore:
+    """Общий интерфейс. ttl=0 — записи не истекают (только вытеснение по max_items)."""
+
+    def __init__(self, namespace: str, *, max_items: int, ttl: float):
+        self.namespace = namespace
+        self.max_items = max_items
+        self.ttl = ttl
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    async def get_many(self, keys: Iterable[str]) -> dict[str, Any]:
+        """Значения сразу для нескольких ключей; отсутствующих в ответе нет."""
+        found = {}
+        for key in keys:
+            value = await self.get(key, _MISSING)
+            if value is not _MISSING:
+                found[key] = value
+        return found
+
+    async def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def items(self) -> list[tuple[str, Any]]:
+        raise NotImplementedError
+
+    async def contains(self, key: str) -> bool:
+        return await self.get(key, _MISSING) is not _MISSING
+
+    async def add(self, key: str) -> bool:
+        """Отметить ключ; True — если отметки ещё не было (для «уведомить один раз»)."""
+        if await self.contains(key):
+            return False
+        await self.set(key, 1)
+        return True
+
+    def _expires_at(self) -> float:
+        return time.time() + self.ttl if self.ttl else 0.0
+
+
+class MemoryStore(StateStore):
+    def __init__(self, namespace: str, *, max_items: int, ttl: float):
+        super().__init__(namespace, max_items=max_items, ttl=ttl)
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at and expires_at < time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key, value):
+        self._data[key] = (self._expires_at(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+    async def delete(self, key):
+        return self._data.pop(key, None) is not None
+
+    async def items(self):
+        now = time.time()
+        return [
+            (key, value) for key, (expires_at, value) in self._data.items()
+            if not expires_at or expires_at >= now
+        ]
+
+
+class SqliteStore(StateStore):
+    """
+    Одна таблица на файл, namespace — часть ключа. Старые записи чистятся
+    пачкой раз в PRUNE_EVERY записей: истёкшие по TTL и самые давно
+    обновлённые сверх max_items (LRU по времени записи).
+    Запросы к локальному файлу в WAL-режиме занимают микросекунды, поэтому
+    выполняются прямо в цикле событий.
+    """
+    PRUNE_EVERY = 256
+
+    _conns: dict[str, sqlite3.Connection] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, namespace: str, *, max_items: int, ttl: float, path: str):
+        super().__init__(namespace, max_items=max_items, ttl=ttl)
+        self._conn = self._connect(path)
+        self._writes = 0
+
+    @classmethod
+    def _connect(cls, path: str) -> sqlite3.Connection:
+        with cls._lock:
+            conn = cls._conns.get(path)
+            if conn is None:
+                conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS bot_state ("
+                    " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL, touched_at REAL NOT NULL,"
+                    " PRIMARY KEY (ns, key))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS bot_state_touched ON bot_state (ns, touched_at)")
+                cls._conns[path] = conn
+            return conn
+
+    async def get(self, key, default=None):
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM bot_state WHERE ns = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None or (row[1] and row[1] < time.time()):
+            return default
+        return json.loads(row[0])
+
+    async def set(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO bot_state (ns, key, value, expires_at, touched_at) VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), self._expires_at(), time.time()),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    async def delete(self, key):
+        cur = self._conn.execute(
+            "DELETE FROM bot_state WHERE ns = ? AND key = ?", (self.namespace, key),
+        )
+        return cur.rowcount > 0
+
+    async def items(self):
+        now = time.time()
+        rows = self._conn.execute(
+            "SELECT key, value FROM bot_state WHERE ns = ? AND (expires_at = 0 OR expires_at >= ?)",
+            (self.namespace, now),
+        ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def prune(self) -> None:
+        self._conn.execute(
+            "DELETE FROM bot_state WHERE ns = ? AND expires_at != 0 AND expires_at < ?",
+            (self.namespace, time.time()),
+        )
+        self._conn.execute(
+            "DELETE FROM bot_state WHERE ns = ? AND key IN ("
+            " SELECT key FROM bot_state WHERE ns = ? ORDER BY touched_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_items),
+        )
+
+
+class RedisStore(StateStore):
+    """
+    Ключи `bot-state:<namespace>:<key>`, TTL — средствами Redis (SET ... EX).
+    max_items здесь не применяется: объём ограничивают TTL и maxmemory-policy сервера.
+    Клиент асинхронный (redis.asyncio); items() и get_many() читают пачками
+    SCAN + MGET по SCAN_BATCH ключей, а не GET на каждый ключ.
+    """
+    SCAN_BATCH = 500
+
+    def __init__(self, namespace: str, *, max_items: int, ttl: float, client=None, url: str = ""):
+        super().__init__(namespace, max_items=max_items, ttl=ttl)
+        if client is None:
+            try:
+                from redis import asyncio as aioredis
+            except ImportError as e:  # pragma: no cover - зависит от окружения
+                raise RuntimeError("BOT_STATE_BACKEND=redis требует пакет redis>=4.2") from e
+            client = aioredis.Redis.from_url(url, decode_responses=True)
+        self._client = client
+        self._prefix = f"bot-state:{namespace}:"
+
+    async def get(self, key, default=None):
+        raw = await self._client.get(self._prefix + key)
+        return default if raw is None else json.loads(raw)
+
+    async def _mget(self, full_keys: list[str]) -> dict[str, Any]:
+        found = {}
+        for i in range(0, len(full_keys), self.SCAN_BATCH):
+            batch = full_keys[i:i + self.SCAN_BATCH]
+            for full, raw in zip(batch, await self._client.mget(batch)):
+                if raw is not None:
+                    found[full[len(self._prefix):]] = json.loads(raw)
+        return found
+
+    async def get_many(self, keys):
+        return await self._mget([self._prefix + key for key in dict.fromkeys(keys)])
+
+    async def set(self, key, value):
+        await self._client.set(self._prefix + key, json.dumps(value), ex=int(self.ttl) or None)
+
+    async def delete(self, key):
+        return bool(await self._client.delete(self._prefix + key))
+
+    async def items(self):
+        keys = [
+            full.decode() if isinstance(full, bytes) else full
+            async for full in self._client.scan_iter(match=self._prefix + "*", count=self.SCAN_BATCH)
+        ]
+        return list((await self._mget(list(dict.fromkeys(keys)))).items())
+
+
+def open_store(namespace: str, *, max_items: int | None = None, ttl: float | None = None) -> StateStore:
+    """Хранилище пространства имён namespace на бэкенде из настроек."""
+    backend = settings.state_backend.lower()
+    max_items = settings.state_max_items if max_items is None else max_items
+    ttl = settings.state_ttl if ttl is None else ttl
+    if backend == "sqlite":
+        return SqliteStore(namespace, max_items=max_items, ttl=ttl, path=settings.state_path)
+    if backend == "redis":
+        return RedisStore(namespace, max_items=max_items, ttl=ttl, url=settings.state_redis_url)
+    return MemoryStore(namespace, max_items=max_items, ttl=ttl)